@@ -0,0 +1,106 @@
+"""Measure the lookups done by ACL checks, translations and message handlers.
+
+Each model's ``get()`` method, which executes a pre-built statement, is
+compared with the ``session.query(...).filter_by(...)`` lookup it replaced.
+
+Run it from the repository root:
+
+.. code-block:: bash
+
+    python3 benchmarks/database_lookups.py [--number 5000]
+
+The database is in memory, so the result is dominated by the Python overhead
+of building and compiling the statement, which is what the pre-built
+statements remove.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_STRING"] = "sqlite://"
+
+from pie import database  # noqa: E402
+from pie.database import session  # noqa: E402
+
+database.init_core()
+database.init_modules()
+
+from modules.base.base.database import AutoThread, UserPin  # noqa: E402
+from pie.acl.database import ACDefault, ACLevel, UserOverwrite  # noqa: E402
+from pie.i18n.database import MemberLanguage  # noqa: E402
+
+
+def populate(rows: int = 1000) -> None:
+    """Fill the tables, so the lookups do not run against empty ones."""
+    for i in range(rows):
+        session.add(ACDefault(guild_id=i, command="info", level=ACLevel.MEMBER))
+        session.add(UserOverwrite(guild_id=i, user_id=i, command="info", allow=True))
+        session.add(AutoThread(guild_id=i, channel_id=i, duration=60))
+        session.add(UserPin(guild_id=i, channel_id=i, limit=5))
+        session.add(MemberLanguage(guild_id=i, member_id=i, language="cs"))
+    session.commit()
+
+
+Lookup = Callable[[], object]
+
+LOOKUPS: Dict[str, Tuple[Lookup, Lookup]] = {
+    "ACDefault.get": (
+        lambda: session.query(ACDefault)
+        .filter_by(guild_id=500, command="info")
+        .one_or_none(),
+        lambda: ACDefault.get(500, "info"),
+    ),
+    "UserOverwrite.get": (
+        lambda: session.query(UserOverwrite)
+        .filter_by(guild_id=500, user_id=500, command="info")
+        .one_or_none(),
+        lambda: UserOverwrite.get(500, 500, "info"),
+    ),
+    "AutoThread.get": (
+        lambda: session.query(AutoThread)
+        .filter_by(guild_id=500, channel_id=500)
+        .one_or_none(),
+        lambda: AutoThread.get(500, 500),
+    ),
+    "UserPin.get": (
+        lambda: session.query(UserPin)
+        .filter_by(guild_id=500, channel_id=500)
+        .one_or_none(),
+        lambda: UserPin.get(500, 500),
+    ),
+    "MemberLanguage.get": (
+        lambda: session.query(MemberLanguage)
+        .filter_by(guild_id=500, member_id=500)
+        .one_or_none(),
+        lambda: MemberLanguage.get(500, 500),
+    ),
+}
+
+
+def measure(lookup: Lookup, number: int) -> float:
+    """Return the best time of one lookup, in microseconds."""
+    lookup()
+    times: List[float] = timeit.repeat(lookup, number=number, repeat=3)
+    return min(times) / number * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    populate()
+
+    print(f"{'Lookup':<20} {'query()':>10} {'get()':>10} {'speedup':>8}")
+    for name, (query, get) in LOOKUPS.items():
+        before: float = measure(query, args.number)
+        after: float = measure(get, args.number)
+        print(f"{name:<20} {before:>8.1f}us {after:>8.1f}us {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
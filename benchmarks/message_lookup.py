@@ -0,0 +1,86 @@
+"""Compare lookups in the message cache of the bot.
+
+``get_message`` used to scan the whole ``bot.cached_messages`` sequence for
+every reaction. It now uses an index of message IDs kept next to the message
+store of discord.py, so the lookup takes the same time for any cache size.
+
+Run it from the repository root:
+
+.. code-block:: bash
+
+    python3 benchmarks/message_lookup.py [--lookups 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_STRING"] = "sqlite://"
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+
+from pie import database  # noqa: E402
+
+database.init_core()
+
+from pie import utils  # noqa: E402
+
+
+class Message:
+    def __init__(self, idx: int):
+        self.id = idx
+
+
+def create_bot(size: int) -> commands.Bot:
+    bot = commands.Bot(
+        command_prefix="!", intents=discord.Intents.none(), max_messages=size
+    )
+    for idx in range(size):
+        bot._connection._messages.append(Message(idx))
+    return bot
+
+
+def scan(bot: commands.Bot, message_id: int) -> Optional[Message]:
+    query = [m for m in bot.cached_messages if m.id == message_id]
+    return query[0] if len(query) == 1 else None
+
+
+def index(bot: commands.Bot, message_id: int) -> Optional[Message]:
+    return utils.discord._get_cached_message(bot, message_id)
+
+
+def measure(
+    lookup: Callable[[commands.Bot, int], Optional[Message]],
+    bot: commands.Bot,
+    lookups: int,
+) -> float:
+    size: int = len(bot.cached_messages)
+    # Build the index outside of the measurement
+    lookup(bot, 0)
+    start: float = time.perf_counter()
+    for i in range(lookups):
+        assert lookup(bot, (i * 7919) % size) is not None
+    return (time.perf_counter() - start) / lookups * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    sizes: List[int] = [1000, 10000, 100000]
+    methods: Dict[str, Callable] = {"scan µs": scan, "index µs": index}
+    print(f"{'messages':<10}" + "".join(f"{name:>12}" for name in methods))
+    for size in sizes:
+        results: List[float] = []
+        for lookup in methods.values():
+            results.append(measure(lookup, create_bot(size), args.lookups))
+        print(f"{size:<10}" + "".join(f"{result:>12.2f}" for result in results))
+
+
+if __name__ == "__main__":
+    main()
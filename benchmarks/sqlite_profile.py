@@ -0,0 +1,144 @@
+"""Compare the SQLite engine profile with default SQLAlchemy settings.
+
+Reader threads look rows up by key while writer threads insert rows and
+commit, which is what the bot does when it checks ACL and logs or stores
+data at the same time.
+
+Run it from the repository root:
+
+.. code-block:: bash
+
+    python3 benchmarks/sqlite_profile.py [--seconds 5] [--readers 4] [--writers 2]
+
+The default engine uses rollback journal and opens new connection for every
+transaction. The profile uses WAL, tuned pragmas, pooled connections and the
+writer queue from :mod:`pie.database.sqlite`.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_STRING"] = "sqlite://"
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+import pie.database  # noqa: E402
+from pie.database import sqlite  # noqa: E402
+
+
+def create_default(db_string: str) -> Engine:
+    return create_engine(db_string, future=True)
+
+
+def create_profile(db_string: str) -> Engine:
+    engine = create_engine(db_string, **pie.database._get_engine_options(db_string))
+    sqlite.install(engine, pie.database._get_sqlite_pragmas(), timeout=30)
+    return engine
+
+
+def prepare(engine: Engine, rows: int = 10000) -> None:
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE items (idx INTEGER PRIMARY KEY, key INTEGER, value TEXT)"
+            )
+        )
+        connection.execute(text("CREATE INDEX ix_items_key ON items (key)"))
+        connection.execute(
+            text("INSERT INTO items (key, value) VALUES (:key, :value)"),
+            [{"key": i, "value": str(i) * 8} for i in range(rows)],
+        )
+
+
+def run(engine: Engine, seconds: float, readers: int, writers: int) -> Dict[str, float]:
+    stop = threading.Event()
+    latencies: List[float] = []
+    counters: Dict[str, int] = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader(n: int):
+        key: int = n
+        while not stop.is_set():
+            start: float = time.perf_counter()
+            with engine.connect() as connection:
+                connection.execute(
+                    text("SELECT value FROM items WHERE key = :key"), {"key": key}
+                ).all()
+            duration: float = time.perf_counter() - start
+            with lock:
+                latencies.append(duration)
+                counters["reads"] += 1
+            key = (key + 7919) % 10000
+
+    def writer(n: int):
+        while not stop.is_set():
+            try:
+                with engine.begin() as connection:
+                    connection.execute(
+                        text("INSERT INTO items (key, value) VALUES (:key, :value)"),
+                        {"key": n, "value": "x" * 64},
+                    )
+                    connection.execute(
+                        text("UPDATE items SET value = :value WHERE key = :key"),
+                        {"key": n, "value": "y" * 64},
+                    )
+                with lock:
+                    counters["writes"] += 1
+            except OperationalError:
+                with lock:
+                    counters["errors"] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "reads/s": counters["reads"] / seconds,
+        "read p99 ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "read max ms": latencies[-1] * 1000,
+        "writes/s": counters["writes"] / seconds,
+        "lock errors": counters["errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    profiles: Dict[str, Callable[[str], Engine]] = {
+        "default": create_default,
+        "profile": create_profile,
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, factory in profiles.items():
+            engine = factory(f"sqlite:///{directory}/{name}.db")
+            prepare(engine)
+            results[name] = run(engine, args.seconds, args.readers, args.writers)
+            engine.dispose()
+
+    print(f"{'':<14}" + "".join(f"{name:>12}" for name in profiles))
+    for metric in results["default"].keys():
+        values = "".join(f"{results[name][metric]:>12.1f}" for name in profiles)
+        print(f"{metric:<14}{values}")
+
+
+if __name__ == "__main__":
+    main()
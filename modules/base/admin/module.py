@@ -1,15 +1,19 @@
 import shutil
 import tempfile
+import time
 from pathlib import Path
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set
 
 import discord
 from discord.ext import commands, tasks
 
 import pie.database.config
-from pie import check, i18n, logger, utils
-from pie.repository import RepositoryManager, Repository
-from pie.spamchannel.database import SpamChannel
+import pie.spamchannel
+from pie.database import accounting
+from pie import cache, check, i18n, logger, metrics, utils
+from pie.ratelimit.database import RateLimit
+from pie.repository import RepositoryManager, Repository, RepositorySnapshot
+from pie.spamchannel.database import SpamChannel, SpamLimit
 from .database import BaseAdminModule as Module
 
 _ = i18n.Translator("modules/base").translate
@@ -112,7 +116,7 @@ class Admin(commands.Cog):
         )
 
         class Item:
-            def __init__(self, repository: Repository, line: int):
+            def __init__(self, repository: RepositorySnapshot, line: int):
                 if line == 0:
                     self.name = repository.name
                 else:
@@ -134,19 +138,19 @@ class Admin(commands.Cog):
                     )
                     self.values = ", ".join(modules) if modules else "--"
 
-                commit = repository.head_commit
                 if line == 2:
                     self.key = _(ctx, "commit hash")
-                    self.values = str(commit)[:7]
+                    self.values = repository.head_sha[:7]
 
                 if line == 3:
                     self.key = _(ctx, "commit text")
-                    self.values = commit.summary
+                    self.values = repository.summary
 
         items: List[Item] = []
         for repository in repositories:
+            snapshot: RepositorySnapshot = manager.get_snapshot(repository)
             for line in range(4):
-                items.append(Item(repository, line))
+                items.append(Item(snapshot, line))
 
         table: List[str] = utils.text.create_table(
             items,
@@ -167,10 +171,12 @@ class Admin(commands.Cog):
         """Install module repository."""
         tempdir = tempfile.TemporaryDirectory()
         workdir = Path(tempdir.name) / "pumpkin-module"
+        started: float = time.monotonic()
 
         # download to temporary directory
         async with ctx.typing():
-            stderr: Optional[str] = Repository.git_clone(workdir, url)
+            stderr: Optional[str] = await Repository.clone(workdir, url, branch)
+        cloned: float = time.monotonic()
         if stderr is not None:
             tempdir.cleanup()
             for output in utils.text.split(stderr):
@@ -178,7 +184,8 @@ class Admin(commands.Cog):
             return
 
         try:
-            repository = Repository(workdir, branch)
+            # the requested branch has already been cloned
+            repository = Repository(workdir)
         except Exception as exc:
             tempdir.cleanup()
             await ctx.reply(
@@ -197,11 +204,8 @@ class Admin(commands.Cog):
             return
 
         # install requirements
-        async with ctx.typing():
-            install: Optional[str] = repository.install_requirements()
-            if install is not None:
-                for output in utils.text.split(install):
-                    await ctx.send("```" + output + "```")
+        await self._install_requirements(ctx, repository)
+        installed: float = time.monotonic()
 
         # check if the repository uses database
         has_database: bool = False
@@ -223,12 +227,24 @@ class Admin(commands.Cog):
                 path="modules/" + repository.name,
                 modules=", ".join(f"**{m}**" for m in repository.module_names),
             )
+            + " "
+            + _(
+                ctx,
+                "The download took {clone} s, "
+                "the requirements took {requirements} s.",
+            ).format(
+                clone=f"{cloned - started:.1f}",
+                requirements=f"{installed - cloned:.1f}",
+            )
         )
         tempdir.cleanup()
         await bot_log.info(
             ctx.author,
             ctx.channel,
-            f"Repository {repository.name} installed.",
+            f"Repository {repository.name} installed in "
+            f"{installed - started:.1f} seconds "
+            f"(clone {cloned - started:.1f} s, "
+            f"requirements {installed - cloned:.1f} s).",
         )
 
         if has_database:
@@ -267,10 +283,7 @@ class Admin(commands.Cog):
         requirements_txt_hash: str = repository.requirements_txt_hash
 
         async with ctx.typing():
-            if option == "reset":
-                pull: str = repository.git_reset_pull()
-            else:
-                pull: str = repository.git_pull(option == "force")
+            pull: str = await repository.update(option)
         for output in utils.text.split(pull):
             await ctx.send("```" + output + "```")
 
@@ -281,16 +294,12 @@ class Admin(commands.Cog):
             await ctx.send(_(ctx, "File `requirements.txt` changed, running `pip`."))
             requirements_txt_updated = True
 
-            async with ctx.typing():
-                install: str = repository.install_requirements()
-                if install is not None:
-                    for output in utils.text.split(install):
-                        await ctx.send("```" + output + "```")
+            await self._install_requirements(ctx, repository)
 
         if output == "Already up to date.":
             log_message: str = (
                 f"Repository {name} already up to date: "
-                + str(repository.head_commit)[:7]
+                + manager.get_snapshot(repository).head_sha[:7]
             )
         else:
             log_message: str = f"Repository {name} updated: " + output[10:25]
@@ -300,6 +309,110 @@ class Admin(commands.Cog):
 
         await bot_log.info(ctx.author, ctx.channel, log_message)
 
+    @commands.max_concurrency(1, per=commands.BucketType.default, wait=False)
+    @check.acl2(check.ACLevel.BOT_OWNER)
+    @repository_.command(name="update-all")
+    async def repository_update_all(self, ctx, option: Optional[str]):
+        """Update all module repositories at once.
+
+        Args:
+            option: Optional update type (FORCE = force pull, RESET = hard reset)
+        """
+        if option:
+            option = option.lower()
+            if option not in ["reset", "force"]:
+                await ctx.reply(
+                    _(ctx, "Option variable must be `force`, `reset` or empty.")
+                )
+                return
+
+        requirements_txt_hashes: Dict[str, Optional[str]] = {
+            repository.name: repository.requirements_txt_hash
+            for repository in manager.repositories
+        }
+        count: int = len(requirements_txt_hashes)
+        lines: List[str] = []
+
+        def render() -> str:
+            header: str = _(ctx, "Updating repositories: {done}/{count}").format(
+                done=len(lines), count=count
+            )
+            # Keep the most recent lines if they do not fit into one message
+            body: str = "\n".join(lines)[-1900:]
+            return f"{header}\n```{body or '...'}```"
+
+        progress: discord.Message = await ctx.reply(render())
+        updated: List[Repository] = []
+        failed: List[str] = []
+        async with ctx.typing():
+            async for repository, success, output in manager.update_all(option):
+                # The last line is the summary, e.g. 'Already up to date.'
+                summary: str = (output.strip().splitlines() or ["--"])[-1].strip()
+                if success:
+                    updated.append(repository)
+                    lines.append(f"{repository.name}: {summary[:80]}")
+                else:
+                    failed.append(repository.name)
+                    lines.append(f"{repository.name}: ERROR {summary[:80]}")
+                await progress.edit(content=render())
+
+        manager.refresh()
+
+        for repository in updated:
+            previous_hash = requirements_txt_hashes[repository.name]
+            if repository.requirements_txt_hash == previous_hash:
+                continue
+            await ctx.send(
+                _(
+                    ctx,
+                    "File `requirements.txt` of repository **{name}** changed, "
+                    "running `pip`.",
+                ).format(name=repository.name)
+            )
+            await self._install_requirements(ctx, repository)
+
+        log_message: str = "Repositories updated: " + ", ".join(
+            f"{repository.name} ({manager.get_snapshot(repository).head_sha[:7]})"
+            for repository in updated
+        )
+        if failed:
+            log_message += ". Failed: " + ", ".join(failed)
+        await bot_log.info(ctx.author, ctx.channel, log_message + ".")
+
+    async def _install_requirements(self, ctx, repository: Repository):
+        """Run pip, showing its latest output in one message while it runs."""
+        lines: List[str] = []
+        progress: Optional[discord.Message] = None
+        last_edit: float = 0.0
+
+        async def on_output(line: str):
+            nonlocal progress, last_edit
+            lines.append(line)
+            # Editing the message on every line would hit Discord rate limits
+            if time.monotonic() - last_edit < 2:
+                return
+            last_edit = time.monotonic()
+            content: str = "```" + "\n".join(lines)[-1900:] + "```"
+            if progress is None:
+                progress = await ctx.send(content)
+            else:
+                await progress.edit(content=content)
+
+        async with ctx.typing():
+            install: Optional[str] = await repository.install_requirements(
+                on_output=on_output
+            )
+        if install is None:
+            if (repository.path / "requirements.txt").is_file():
+                await ctx.send(_(ctx, "The requirements are already installed."))
+            return
+
+        pages: List[str] = utils.text.split(install)
+        if progress is not None:
+            await progress.edit(content="```" + pages.pop(0) + "```")
+        for page in pages:
+            await ctx.send("```" + page + "```")
+
     @check.acl2(check.ACLevel.BOT_OWNER)
     @repository_.command(name="checkout")
     async def repository_checkout(self, ctx, name: str, branch: str):
@@ -322,11 +435,7 @@ class Admin(commands.Cog):
         if repository.requirements_txt_hash != requirements_txt_hash:
             await ctx.send(_(ctx, "File `requirements.txt` changed, running `pip`."))
 
-            async with ctx.typing():
-                install: str = repository.install_requirements()
-                if install is not None:
-                    for output in utils.text.split(install):
-                        await ctx.send("```" + output + "```")
+            await self._install_requirements(ctx, repository)
 
         await bot_log.info(
             ctx.author,
@@ -510,6 +619,175 @@ class Admin(commands.Cog):
             self.bot.tree.copy_global_to(guild=ctx.guild)
         await ctx.reply(_(ctx, "Sync complete."))
 
+    @check.acl2(check.ACLevel.BOT_OWNER)
+    @pumpkin_.command(name="metrics")
+    async def pumpkin_metrics(self, ctx, name: Optional[str] = None):
+        """Display runtime metrics.
+
+        Args:
+            name: Optional prefix of metric group, e.g. 'database'.
+        """
+        collected = metrics.collect(name)
+        if not collected:
+            await ctx.reply(_(ctx, "No metrics are available."))
+            return
+
+        class Item:
+            def __init__(self, group: str, key: str, value):
+                self.group = group
+                self.key = key
+                self.value = f"{value:.3f}" if isinstance(value, float) else value
+
+        items: List[Item] = []
+        for group, values in collected.items():
+            if not values:
+                items.append(Item(group, "--", ""))
+                continue
+            for i, (key, value) in enumerate(values.items()):
+                items.append(Item(group if i == 0 else "", key, value))
+
+        table: List[str] = utils.text.create_table(
+            items,
+            header={
+                "group": _(ctx, "Group"),
+                "key": _(ctx, "Key"),
+                "value": _(ctx, "Value"),
+            },
+        )
+
+        for page in table:
+            await ctx.send("```" + page + "```")
+
+    @check.acl2(check.ACLevel.BOT_OWNER)
+    @pumpkin_.command(name="queries")
+    async def pumpkin_queries(self, ctx, limit: int = 20):
+        """Display database queries issued by commands, listeners and tasks.
+
+        Args:
+            limit: How many origins with the most queries to show.
+        """
+        statistics = sorted(
+            accounting.get_statistics().items(),
+            key=lambda item: item[1].queries,
+            reverse=True,
+        )[:limit]
+        if not statistics:
+            await ctx.reply(_(ctx, "No queries have been recorded yet."))
+            return
+
+        class Item:
+            def __init__(self, origin: str, stats: accounting.QueryStatistics):
+                self.origin = origin
+                self.invocations = stats.invocations or "--"
+                self.queries = stats.queries
+                self.average = (
+                    f"{stats.queries / stats.invocations:.1f}"
+                    if stats.invocations
+                    else "--"
+                )
+                self.time = f"{stats.time * 1000:.0f} ms"
+                self.slow = stats.slow
+
+        items = [Item(origin, stats) for origin, stats in statistics]
+        table: List[str] = utils.text.create_table(
+            items,
+            header={
+                "origin": _(ctx, "Origin"),
+                "invocations": _(ctx, "Invocations"),
+                "queries": _(ctx, "Queries"),
+                "average": _(ctx, "Per invocation"),
+                "time": _(ctx, "Time"),
+                "slow": _(ctx, "Slow"),
+            },
+        )
+
+        for page in table:
+            await ctx.send("```" + page + "```")
+
+    @check.acl2(check.ACLevel.BOT_OWNER)
+    @pumpkin_.command(name="cache")
+    async def pumpkin_cache(self, ctx, name: Optional[str] = None, limit: int = 20):
+        """Display in-memory caches.
+
+        Args:
+            name: Name of the cache whose values should be displayed.
+            limit: How many most recently used values to show.
+        """
+        if name is None:
+            await self._pumpkin_cache_list(ctx)
+            return
+
+        selected: Optional[cache.Cache] = cache.get(name)
+        if selected is None:
+            await ctx.reply(
+                _(ctx, "Cache **{name}** does not exist.").format(name=name)
+            )
+            return
+
+        entries = selected.items()[::-1][:limit]
+        if not entries:
+            await ctx.reply(_(ctx, "Cache **{name}** is empty.").format(name=name))
+            return
+
+        def shorten(value) -> str:
+            text = str(value)
+            return text if len(text) <= 40 else text[:39] + "…"
+
+        class Item:
+            def __init__(self, key, value, expires: Optional[float], tags):
+                self.key = shorten(key)
+                self.value = shorten(value)
+                self.expires = "--" if expires is None else f"{max(expires, 0):.0f} s"
+                self.tags = ", ".join(tags)
+
+        items = [Item(*entry) for entry in entries]
+        table: List[str] = utils.text.create_table(
+            items,
+            header={
+                "key": _(ctx, "Key"),
+                "value": _(ctx, "Value"),
+                "expires": _(ctx, "Expires in"),
+                "tags": _(ctx, "Tags"),
+            },
+        )
+
+        for page in table:
+            await ctx.send("```" + page + "```")
+
+    async def _pumpkin_cache_list(self, ctx):
+        caches: List[cache.Cache] = cache.get_all()
+        if not caches:
+            await ctx.reply(_(ctx, "No caches are available."))
+            return
+
+        class Item:
+            def __init__(self, cache_: cache.Cache):
+                statistics = cache_.get_statistics()
+                self.name = cache_.name
+                self.size = f"{statistics['size']}/{statistics['maxsize']}"
+                self.ttl = "--" if cache_.ttl is None else f"{cache_.ttl:.0f} s"
+                self.hits = statistics["hits"]
+                self.misses = statistics["misses"]
+                self.evictions = statistics["evictions"]
+                self.hit_rate = f"{statistics['hit_rate'] * 100:.1f} %"
+
+        items = [Item(cache_) for cache_ in caches]
+        table: List[str] = utils.text.create_table(
+            items,
+            header={
+                "name": _(ctx, "Name"),
+                "size": _(ctx, "Size"),
+                "ttl": "TTL",
+                "hits": _(ctx, "Hits"),
+                "misses": _(ctx, "Misses"),
+                "evictions": _(ctx, "Evictions"),
+                "hit_rate": _(ctx, "Hit rate"),
+            },
+        )
+
+        for page in table:
+            await ctx.send("```" + page + "```")
+
     @check.acl2(check.ACLevel.BOT_OWNER)
     @pumpkin_.command(name="restart")
     async def pumpkin_restart(self, ctx):
@@ -634,6 +912,190 @@ class Admin(commands.Cog):
             f"Channel #{channel.name} set as primary spam channel.",
         )
 
+    @check.acl2(check.ACLevel.MOD)
+    @spamchannel_.group(name="limit", invoke_without_command=True)
+    async def spamchannel_limit(
+        self, ctx, message_limit: int = None, time_limit: int = None
+    ):
+        """Set how many commands can be run outside of spam channels.
+
+        Args:
+            message_limit: Number of commands allowed in each channel.
+            time_limit: Number of seconds the commands are counted for.
+
+        When the arguments are omitted, current limit is displayed.
+        Use 'spamchannel limit unset' to go back to the default limit.
+        """
+        if message_limit is None or time_limit is None:
+            message_limit, time_limit = pie.spamchannel.get_limits(ctx.guild.id)
+            await ctx.reply(
+                _(
+                    ctx,
+                    "Outside of spam channels, {messages} commands can be run "
+                    "in {seconds} seconds.",
+                ).format(messages=message_limit, seconds=time_limit)
+            )
+            return
+
+        if message_limit < 1 or time_limit < 1:
+            await ctx.reply(_(ctx, "The limits have to be positive numbers."))
+            return
+
+        SpamLimit.set(ctx.guild.id, message_limit, time_limit)
+        await ctx.reply(
+            _(
+                ctx,
+                "Outside of spam channels, {messages} commands can be run "
+                "in {seconds} seconds.",
+            ).format(messages=message_limit, seconds=time_limit)
+        )
+        await guild_log.info(
+            ctx.author,
+            ctx.channel,
+            f"Spam channel limit set to {message_limit} commands "
+            f"in {time_limit} seconds.",
+        )
+
+    @check.acl2(check.ACLevel.MOD)
+    @spamchannel_limit.command(name="unset")
+    async def spamchannel_limit_unset(self, ctx):
+        """Go back to the default limit of commands outside of spam channels."""
+        if not SpamLimit.remove(ctx.guild.id):
+            await ctx.reply(_(ctx, "This server already uses the default limit."))
+            return
+
+        message_limit, time_limit = pie.spamchannel.get_limits(ctx.guild.id)
+        await ctx.reply(
+            _(
+                ctx,
+                "The default limit was restored: outside of spam channels, "
+                "{messages} commands can be run in {seconds} seconds.",
+            ).format(messages=message_limit, seconds=time_limit)
+        )
+        await guild_log.info(
+            ctx.author,
+            ctx.channel,
+            f"Spam channel limit reset to the default {message_limit} commands "
+            f"in {time_limit} seconds.",
+        )
+
+    @commands.guild_only()
+    @check.acl2(check.ACLevel.SUBMOD)
+    @commands.group(name="ratelimit")
+    async def ratelimit_(self, ctx):
+        """Manage rate limits of commands."""
+        await utils.discord.send_help(ctx)
+
+    @check.acl2(check.ACLevel.SUBMOD)
+    @ratelimit_.command(name="list")
+    async def ratelimit_list(self, ctx):
+        """List rate limits set on this server."""
+        limits = RateLimit.get_all(ctx.guild.id)
+        if not limits:
+            await ctx.reply(_(ctx, "This server has no custom rate limits."))
+            return
+
+        class Item:
+            def __init__(self, limit: RateLimit):
+                self.command = limit.command
+                self.scope = limit.scope
+                self.rate = limit.rate
+                self.per = limit.per
+
+        items = [
+            Item(limit) for limit in sorted(limits, key=lambda limit: limit.command)
+        ]
+        table: List[str] = utils.text.create_table(
+            items,
+            header={
+                "command": _(ctx, "Command"),
+                "scope": _(ctx, "Scope"),
+                "rate": _(ctx, "Invocations"),
+                "per": _(ctx, "Seconds"),
+            },
+        )
+
+        for page in table:
+            await ctx.send("```" + page + "```")
+
+    @check.acl2(check.ACLevel.MOD)
+    @ratelimit_.command(name="set")
+    async def ratelimit_set(self, ctx, command: str, scope: str, rate: int, per: int):
+        """Set how often a command can be run.
+
+        Args:
+            command: Qualified name of the command.
+            scope: Whether the invocations are counted per 'user', 'channel',
+                'guild', or for the whole 'command'.
+            rate: Number of invocations allowed.
+            per: Number of seconds they are allowed in.
+        """
+        bot_command: Optional[commands.Command] = self.bot.get_command(command)
+        if bot_command is None:
+            await ctx.reply(_(ctx, "I don't know this command."))
+            return
+        command = bot_command.qualified_name
+
+        try:
+            scope: check.Scope = check.Scope(scope)
+        except ValueError:
+            await ctx.reply(
+                _(ctx, "Invalid scope. Possible options are: {keys}.").format(
+                    keys=", ".join(f"'{s.value}'" for s in check.Scope)
+                )
+            )
+            return
+
+        if rate < 1 or per < 1:
+            await ctx.reply(_(ctx, "The limits have to be positive numbers."))
+            return
+
+        RateLimit.set(ctx.guild.id, command, scope.value, rate, per)
+        await ctx.reply(
+            _(ctx, "Rate limit of **{command}** set.").format(command=command)
+        )
+        await guild_log.info(
+            ctx.author,
+            ctx.channel,
+            f"Rate limit of '{command}' set to {rate} invocations "
+            f"per {scope.value} in {per} seconds.",
+        )
+
+    @check.acl2(check.ACLevel.MOD)
+    @ratelimit_.command(name="unset")
+    async def ratelimit_unset(self, ctx, command: str):
+        """Use the default rate limit of a command again.
+
+        Args:
+            command: Qualified name of the command.
+        """
+        bot_command: Optional[commands.Command] = self.bot.get_command(command)
+        if bot_command is not None:
+            command = bot_command.qualified_name
+        else:
+            # The limit may belong to a command of an unloaded module
+            command = " ".join(command.split())
+
+        if not RateLimit.remove(ctx.guild.id, command):
+            if bot_command is None:
+                await ctx.reply(_(ctx, "I don't know this command."))
+                return
+            await ctx.reply(
+                _(ctx, "**{command}** has no custom rate limit.").format(
+                    command=command
+                )
+            )
+            return
+
+        await ctx.reply(
+            _(ctx, "Rate limit of **{command}** unset.").format(command=command)
+        )
+        await guild_log.info(
+            ctx.author,
+            ctx.channel,
+            f"Rate limit of '{command}' unset.",
+        )
+
 
 async def setup(bot) -> None:
     await bot.add_cog(Admin(bot))
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from sqlalchemy import BigInteger, Boolean, Column, Integer
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, bindparam, select
+from sqlalchemy.engine import Connection
 
-from pie.database import database, session
+from pie.database import (
+    database,
+    invalidation,
+    migrations,
+    primary,
+    read_only,
+    session,
+)
 
 
 class UserPin(database.base):
@@ -15,24 +23,30 @@ class UserPin(database.base):
     channel_id = Column(BigInteger, default=None)
     limit = Column(Integer, default=0)
 
+    __table_args__ = (
+        Index("ix_base_base_userpin_guild_channel", guild_id, channel_id, unique=True),
+    )
+
     @staticmethod
     def add(guild_id: int, channel_id: Optional[int], limit: int = 0) -> UserPin:
         """Add userpin preference."""
-        if UserPin.get(guild_id, channel_id) is not None:
-            UserPin.remove(guild_id, channel_id)
-        query = UserPin(guild_id=guild_id, channel_id=channel_id, limit=limit)
+        query = UserPin.get(guild_id, channel_id)
+        if query:
+            query.limit = limit
+        else:
+            query = UserPin(guild_id=guild_id, channel_id=channel_id, limit=limit)
         session.add(query)
+        invalidation.publish(UserPin.__tablename__, guild_id)
         session.commit()
         return query
 
     @staticmethod
     def get(guild_id: int, channel_id: Optional[int]) -> Optional[UserPin]:
         """Get userpin preferences for the guild."""
-        query = (
-            session.query(UserPin)
-            .filter_by(guild_id=guild_id, channel_id=channel_id)
-            .one_or_none()
-        )
+        statement = _GET_USER_PIN_GUILD if channel_id is None else _GET_USER_PIN
+        query = session.execute(
+            statement, {"guild_id": guild_id, "channel_id": channel_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -40,6 +54,17 @@ class UserPin(database.base):
         query = session.query(UserPin).filter_by(guild_id=guild_id).all()
         return query
 
+    @staticmethod
+    @read_only
+    def get_limits(guild_id: int) -> Dict[Optional[int], int]:
+        """Get userpin preferences of the guild.
+
+        :return: Mapping of channel IDs to reaction limits, ``None`` being
+            the guild.
+        """
+        query = session.execute(_GET_USER_PIN_GUILD_ALL, {"guild_id": guild_id})
+        return {channel_id: limit for channel_id, limit in query}
+
     @staticmethod
     def remove(guild_id: int, channel_id: Optional[int]) -> int:
         query = (
@@ -47,6 +72,8 @@ class UserPin(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id)
             .delete()
         )
+        invalidation.publish(UserPin.__tablename__, guild_id)
+        session.commit()
         return query
 
     def __repr__(self) -> str:
@@ -63,6 +90,23 @@ class UserPin(database.base):
         }
 
 
+# Reaction and message handlers look the preferences up for every event, so the
+# statements are built once and SQLAlchemy only binds the parameters. Guild-wide
+# preferences have no channel and need their own statement, as NULL is never
+# equal to anything.
+_GET_USER_PIN = select(UserPin).where(
+    UserPin.guild_id == bindparam("guild_id"),
+    UserPin.channel_id == bindparam("channel_id"),
+)
+_GET_USER_PIN_GUILD = select(UserPin).where(
+    UserPin.guild_id == bindparam("guild_id"),
+    UserPin.channel_id.is_(None),
+)
+_GET_USER_PIN_GUILD_ALL = select(UserPin.channel_id, UserPin.limit).where(
+    UserPin.guild_id == bindparam("guild_id")
+)
+
+
 class UserThread(database.base):
     __tablename__ = "base_base_userthread"
 
@@ -71,24 +115,32 @@ class UserThread(database.base):
     channel_id = Column(BigInteger, default=None)
     limit = Column(Integer, default=0)
 
+    __table_args__ = (
+        Index(
+            "ix_base_base_userthread_guild_channel", guild_id, channel_id, unique=True
+        ),
+    )
+
     @staticmethod
     def add(guild_id: int, channel_id: Optional[int], limit: int = 0) -> UserThread:
         """Add userthread preference."""
-        if UserThread.get(guild_id, channel_id) is not None:
-            UserThread.remove(guild_id, channel_id)
-        query = UserThread(guild_id=guild_id, channel_id=channel_id, limit=limit)
+        query = UserThread.get(guild_id, channel_id)
+        if query:
+            query.limit = limit
+        else:
+            query = UserThread(guild_id=guild_id, channel_id=channel_id, limit=limit)
         session.add(query)
+        invalidation.publish(UserThread.__tablename__, guild_id)
         session.commit()
         return query
 
     @staticmethod
     def get(guild_id: int, channel_id: Optional[int]) -> Optional[UserThread]:
         """Get userthread preference for the guild."""
-        query = (
-            session.query(UserThread)
-            .filter_by(guild_id=guild_id, channel_id=channel_id)
-            .one_or_none()
-        )
+        statement = _GET_USER_THREAD_GUILD if channel_id is None else _GET_USER_THREAD
+        query = session.execute(
+            statement, {"guild_id": guild_id, "channel_id": channel_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -96,6 +148,17 @@ class UserThread(database.base):
         query = session.query(UserThread).filter_by(guild_id=guild_id).all()
         return query
 
+    @staticmethod
+    @read_only
+    def get_limits(guild_id: int) -> Dict[Optional[int], int]:
+        """Get userthread preferences of the guild.
+
+        :return: Mapping of channel IDs to reaction limits, ``None`` being
+            the guild.
+        """
+        query = session.execute(_GET_USER_THREAD_GUILD_ALL, {"guild_id": guild_id})
+        return {channel_id: limit for channel_id, limit in query}
+
     @staticmethod
     def remove(guild_id: int, channel_id: Optional[int]) -> int:
         query = (
@@ -103,6 +166,8 @@ class UserThread(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id)
             .delete()
         )
+        invalidation.publish(UserThread.__tablename__, guild_id)
+        session.commit()
         return query
 
     def __repr__(self) -> str:
@@ -119,6 +184,19 @@ class UserThread(database.base):
         }
 
 
+_GET_USER_THREAD = select(UserThread).where(
+    UserThread.guild_id == bindparam("guild_id"),
+    UserThread.channel_id == bindparam("channel_id"),
+)
+_GET_USER_THREAD_GUILD = select(UserThread).where(
+    UserThread.guild_id == bindparam("guild_id"),
+    UserThread.channel_id.is_(None),
+)
+_GET_USER_THREAD_GUILD_ALL = select(UserThread.channel_id, UserThread.limit).where(
+    UserThread.guild_id == bindparam("guild_id")
+)
+
+
 class Bookmark(database.base):
     __tablename__ = "base_base_bookmarks"
 
@@ -127,24 +205,32 @@ class Bookmark(database.base):
     channel_id = Column(BigInteger, default=None)
     enabled = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index(
+            "ix_base_base_bookmarks_guild_channel", guild_id, channel_id, unique=True
+        ),
+    )
+
     @staticmethod
     def add(
         guild_id: int, channel_id: Optional[int], enabled: bool = False
     ) -> Bookmark:
-        if Bookmark.get(guild_id, channel_id) is not None:
-            Bookmark.remove(guild_id, channel_id)
-        query = Bookmark(guild_id=guild_id, channel_id=channel_id, enabled=enabled)
+        query = Bookmark.get(guild_id, channel_id)
+        if query:
+            query.enabled = enabled
+        else:
+            query = Bookmark(guild_id=guild_id, channel_id=channel_id, enabled=enabled)
         session.add(query)
+        invalidation.publish(Bookmark.__tablename__, guild_id)
         session.commit()
         return query
 
     @staticmethod
     def get(guild_id: int, channel_id: Optional[int]) -> Optional[Bookmark]:
-        query = (
-            session.query(Bookmark)
-            .filter_by(guild_id=guild_id, channel_id=channel_id)
-            .one_or_none()
-        )
+        statement = _GET_BOOKMARK_GUILD if channel_id is None else _GET_BOOKMARK
+        query = session.execute(
+            statement, {"guild_id": guild_id, "channel_id": channel_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -152,6 +238,16 @@ class Bookmark(database.base):
         query = session.query(Bookmark).filter_by(guild_id=guild_id).all()
         return query
 
+    @staticmethod
+    @read_only
+    def get_states(guild_id: int) -> Dict[Optional[int], bool]:
+        """Get bookmark preferences of the guild.
+
+        :return: Mapping of channel IDs to states, ``None`` being the guild.
+        """
+        query = session.execute(_GET_BOOKMARK_GUILD_ALL, {"guild_id": guild_id})
+        return {channel_id: enabled for channel_id, enabled in query}
+
     @staticmethod
     def remove(guild_id: int, channel_id: Optional[int]) -> int:
         query = (
@@ -159,6 +255,8 @@ class Bookmark(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id)
             .delete()
         )
+        invalidation.publish(Bookmark.__tablename__, guild_id)
+        session.commit()
         return query
 
     def __repr__(self) -> str:
@@ -175,6 +273,19 @@ class Bookmark(database.base):
         }
 
 
+_GET_BOOKMARK = select(Bookmark).where(
+    Bookmark.guild_id == bindparam("guild_id"),
+    Bookmark.channel_id == bindparam("channel_id"),
+)
+_GET_BOOKMARK_GUILD = select(Bookmark).where(
+    Bookmark.guild_id == bindparam("guild_id"),
+    Bookmark.channel_id.is_(None),
+)
+_GET_BOOKMARK_GUILD_ALL = select(Bookmark.channel_id, Bookmark.enabled).where(
+    Bookmark.guild_id == bindparam("guild_id")
+)
+
+
 class AutoThread(database.base):
     __tablename__ = "base_base_autothread"
 
@@ -183,9 +294,17 @@ class AutoThread(database.base):
     channel_id = Column(BigInteger)
     duration = Column(Integer)
 
+    __table_args__ = (
+        Index(
+            "ix_base_base_autothread_guild_channel", guild_id, channel_id, unique=True
+        ),
+    )
+
     @staticmethod
     def add(guild_id: int, channel_id: int, duration: int) -> AutoThread:
-        query = AutoThread.get(guild_id, channel_id)
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            query = AutoThread.get(guild_id, channel_id)
         if query:
             query.duration = duration
         else:
@@ -193,16 +312,16 @@ class AutoThread(database.base):
                 guild_id=guild_id, channel_id=channel_id, duration=duration
             )
         session.add(query)
+        invalidation.publish(AutoThread.__tablename__, guild_id)
         session.commit()
         return query
 
     @staticmethod
+    @read_only
     def get(guild_id: int, channel_id: int) -> Optional[AutoThread]:
-        query = (
-            session.query(AutoThread)
-            .filter_by(guild_id=guild_id, channel_id=channel_id)
-            .one_or_none()
-        )
+        query = session.execute(
+            _GET_AUTO_THREAD, {"guild_id": guild_id, "channel_id": channel_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -210,6 +329,23 @@ class AutoThread(database.base):
         query = session.query(AutoThread).filter_by(guild_id=guild_id).all()
         return query
 
+    @staticmethod
+    @read_only
+    def get_channels(guild_id: int) -> Dict[int, int]:
+        """Get autothread channels of the guild.
+
+        :return: Mapping of channel IDs to thread durations.
+        """
+        query = session.execute(_GET_AUTO_THREAD_CHANNELS, {"guild_id": guild_id})
+        return {channel_id: duration for channel_id, duration in query}
+
+    @staticmethod
+    @read_only
+    def get_channel_ids() -> List[int]:
+        """Get autothread channels of all guilds."""
+        query = session.execute(_GET_AUTO_THREAD_CHANNEL_IDS).scalars().all()
+        return query
+
     @staticmethod
     def remove(guild_id: int, channel_id: int) -> int:
         query = (
@@ -217,6 +353,9 @@ class AutoThread(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id)
             .delete()
         )
+        invalidation.publish(AutoThread.__tablename__, guild_id)
+        # Commit, so the channel index of other processes is updated as well
+        session.commit()
         return query
 
     def __repr__(self) -> str:
@@ -224,3 +363,25 @@ class AutoThread(database.base):
             f"<{self.__class__.__name__} "
             f"guild_id='{self.guild_id} channel_id='{self.channel_id} duration='{self.duration}'>"
         )
+
+
+_GET_AUTO_THREAD = select(AutoThread).where(
+    AutoThread.guild_id == bindparam("guild_id"),
+    AutoThread.channel_id == bindparam("channel_id"),
+)
+_GET_AUTO_THREAD_CHANNEL_IDS = select(AutoThread.channel_id)
+_GET_AUTO_THREAD_CHANNELS = select(AutoThread.channel_id, AutoThread.duration).where(
+    AutoThread.guild_id == bindparam("guild_id")
+)
+
+
+@migrations.migration(1)
+def add_lookup_indexes(connection: Connection) -> None:
+    """Index the columns used by reaction and message handlers."""
+    migrations.create_indexes(
+        connection,
+        UserPin.__table__,
+        UserThread.__table__,
+        Bookmark.__table__,
+        AutoThread.__table__,
+    )
@@ -1,10 +1,24 @@
+import asyncio
+import collections
+import time
 from math import ceil
-from typing import List, Tuple, Dict, Set
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Dict,
+    Union,
+)
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
-from pie import check, i18n, logger, utils
+from pie import cache, check, events, i18n, logger, metrics, utils
+from pie.database import invalidation
 
 from .database import AutoThread, UserPin, UserThread, Bookmark
 
@@ -13,6 +27,262 @@ bot_log = logger.Bot.logger()
 guild_log = logger.Guild.logger()
 
 
+class ReactionCounter:
+    """Counts of tracked reactions on messages.
+
+    :param emojis: Emojis whose reactions are counted.
+    :param maxsize: Maximal number of tracked messages.
+    :param ttl: Seconds after which the message is seeded again.
+
+    The counts of a message are seeded from the message when its tracked
+    reaction is seen for the first time. After that they are only updated
+    from the raw reaction events, so the message does not have to be fetched
+    for every reaction. A reaction that is already in the seed is counted
+    again when its raw event arrives after the message was fetched, so the
+    counts may be higher than the real ones. They only tell when to look at
+    the message: before acting, refresh them from the fetched message with
+    :meth:`refresh`.
+    """
+
+    def __init__(self, emojis: Iterable[str], *, maxsize: int, ttl: float):
+        self.emojis: Tuple[str, ...] = tuple(emojis)
+        self._counts = cache.Cache("base.reactions", maxsize=maxsize, ttl=ttl)
+
+    def add(self, message_id: int, emoji: str) -> Optional[int]:
+        """Count added reaction.
+
+        :return: New count, or ``None`` if the message has to be seeded.
+        """
+        counts: Optional[Dict[str, int]] = self._counts.get(message_id)
+        if counts is None:
+            return None
+        counts[emoji] = counts.get(emoji, 0) + 1
+        return counts[emoji]
+
+    def remove(self, message_id: int, emoji: str) -> None:
+        """Count removed reaction."""
+        counts: Optional[Dict[str, int]] = self._counts.get(message_id)
+        if counts is not None and counts.get(emoji, 0) > 0:
+            counts[emoji] -= 1
+
+    def seed(self, message: discord.Message) -> Dict[str, int]:
+        """Start counting reactions of the message, unless it is counted.
+
+        :return: Counts of the tracked reactions.
+        """
+        counts: Optional[Dict[str, int]] = self._counts.get(message.id)
+        if counts is None:
+            counts = self.refresh(message)
+        return counts
+
+    def refresh(self, message: discord.Message) -> Dict[str, int]:
+        """Replace the counts of the message with its real reactions.
+
+        :return: Counts of the tracked reactions.
+        """
+        counts: Dict[str, int] = {
+            str(reaction.emoji): reaction.count
+            for reaction in message.reactions
+            if str(reaction.emoji) in self.emojis
+        }
+        self._counts.set(message.id, counts)
+        return counts
+
+    def reset(self, message_id: int, emoji: Optional[str] = None) -> None:
+        """Set the count of the reaction to zero.
+
+        :param emoji: The reaction. ``None`` resets all of them.
+        """
+        counts: Optional[Dict[str, int]] = self._counts.get(message_id)
+        if counts is None:
+            return
+        if emoji is None:
+            counts.clear()
+        else:
+            counts.pop(emoji, None)
+
+    def forget(self, message_id: int) -> None:
+        """Stop counting reactions of the message."""
+        self._counts.invalidate(message_id)
+
+
+class GuildSettings:
+    """Userpin, userthread and bookmark preferences of a guild.
+
+    Channel preferences take precedence over the guild ones.
+    """
+
+    def __init__(self, guild_id: int):
+        self.userpins: Dict[Optional[int], int] = UserPin.get_limits(guild_id)
+        self.userthreads: Dict[Optional[int], int] = UserThread.get_limits(guild_id)
+        self.bookmarks: Dict[Optional[int], bool] = Bookmark.get_states(guild_id)
+
+    @staticmethod
+    def _get_limit(limits: Dict[Optional[int], int], channel_id: int) -> int:
+        limit: int = limits.get(channel_id, -1)
+        # overwrite for channel doesn't exist, use guild preference
+        if limit < 0:
+            limit = limits.get(None, 0)
+        return limit
+
+    def get_userpin_limit(self, channel_id: int) -> int:
+        """Get number of reactions needed to pin a message in the channel."""
+        return self._get_limit(self.userpins, channel_id)
+
+    def get_userthread_limit(self, channel_id: int) -> int:
+        """Get number of reactions needed to open a thread in the channel."""
+        return self._get_limit(self.userthreads, channel_id)
+
+    def get_bookmarks_enabled(self, channel_id: int) -> bool:
+        """Get whether messages in the channel can be bookmarked."""
+        if channel_id in self.bookmarks:
+            return self.bookmarks[channel_id]
+        return self.bookmarks.get(None, False)
+
+
+class ThreadQueue:
+    """Queue of messages that get an automatic thread.
+
+    :param create: Coroutine function creating the thread of a message.
+    :param report: Coroutine function called with the message and the
+        exception when the thread could not be created.
+    :param maxsize: Maximal number of waiting messages in a channel. When a
+        channel gets more of them, the oldest one is skipped.
+    :param max_lag: Seconds after which a waiting message is skipped.
+    :param merge_window: Messages of the same author sent within this many
+        seconds after their message with a thread do not get another one.
+        ``0`` disables merging.
+
+    Each channel has a worker creating the threads one by one, so they follow
+    the rate limit bucket of the channel instead of failing all at once. The
+    worker stops when its channel has nothing to do.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[discord.Message], Awaitable[None]],
+        report: Callable[[discord.Message, Exception], Awaitable[None]],
+        *,
+        maxsize: int = 50,
+        max_lag: float = 300.0,
+        merge_window: float = 0.0,
+    ):
+        self.create = create
+        self.report = report
+        self.maxsize: int = maxsize
+        self.max_lag: float = max_lag
+        self.merge_window: float = merge_window
+
+        self._queues: Dict[int, Deque[Tuple[float, discord.Message]]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # channel ID: (author ID, time) of the last message with a thread
+        self._last: Dict[int, Tuple[int, float]] = {}
+        self._last_lag: float = 0.0
+        self.statistics: Dict[str, int] = {
+            "queued": 0,
+            "created": 0,
+            "failed": 0,
+            "skipped": 0,
+            "merged": 0,
+        }
+
+    def put(self, message: discord.Message) -> None:
+        """Queue the message and return immediately."""
+        now: float = time.monotonic()
+        channel_id: int = message.channel.id
+
+        last: Optional[Tuple[int, float]] = self._last.get(channel_id)
+        if (
+            last is not None
+            and last[0] == message.author.id
+            and now - last[1] < self.merge_window
+        ):
+            self.statistics["merged"] += 1
+            return
+        self._last[channel_id] = (message.author.id, now)
+
+        queue = self._queues.setdefault(channel_id, collections.deque())
+        if len(queue) >= self.maxsize:
+            queue.popleft()
+            self.statistics["skipped"] += 1
+        queue.append((now, message))
+        self.statistics["queued"] += 1
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(
+                self._work(channel_id), name=f"base.base.autothread.{channel_id}"
+            )
+
+    async def _work(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                queued, message = queue.popleft()
+                self._last_lag = time.monotonic() - queued
+                if self._last_lag > self.max_lag:
+                    self.statistics["skipped"] += 1
+                    continue
+
+                try:
+                    await self.create(message)
+                    self.statistics["created"] += 1
+                except discord.HTTPException as exc:
+                    self.statistics["failed"] += 1
+                    await self._report(message, exc)
+                    if exc.status == 429:
+                        # discord.py gave up waiting for the bucket, give it
+                        # some rest before trying the next message
+                        await asyncio.sleep(5)
+                except Exception as exc:
+                    # Keep the worker alive for the other messages
+                    self.statistics["failed"] += 1
+                    await self._log_error(message, exc)
+        finally:
+            self._workers.pop(channel_id, None)
+            if not queue and self._queues.get(channel_id) is queue:
+                del self._queues[channel_id]
+
+    async def _report(self, message: discord.Message, exc: Exception) -> None:
+        try:
+            await self.report(message, exc)
+        except Exception as report_exc:
+            await self._log_error(message, report_exc)
+
+    async def _log_error(self, message: discord.Message, exc: Exception) -> None:
+        try:
+            await bot_log.error(
+                None,
+                None,
+                "Automatic thread of message "
+                f"{message.id} in channel {message.channel.id} failed: {exc}",
+                exception=exc,
+            )
+        except Exception:
+            # The log must not stop the worker either
+            pass
+
+    def get_lag(self) -> float:
+        """Get seconds the oldest waiting message has been waiting for."""
+        now: float = time.monotonic()
+        oldest: List[float] = [queue[0][0] for queue in self._queues.values() if queue]
+        return now - min(oldest) if oldest else 0.0
+
+    def get_statistics(self) -> Dict[str, Union[int, float]]:
+        """Get number of processed messages and the current lag."""
+        return {
+            **self.statistics,
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+            "lag": self.get_lag(),
+            "last_lag": self._last_lag,
+        }
+
+    def stop(self) -> None:
+        """Cancel the workers and drop waiting messages."""
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        self._queues.clear()
+
+
 class Base(commands.Cog):
     """Basic bot functions."""
 
@@ -21,22 +291,79 @@ class Base(commands.Cog):
 
         self.durations = {"1h": 60, "1d": 1440, "3d": 4320, "7d": 10080}
 
-        # intended structure: {message_id : {user_ids,}}
-        self.bookmark_cache: Dict[int, Set[int]] = {}
-        self.dump_cache.start()
+        self.reactions = ReactionCounter(("📌", "🧵"), maxsize=10000, ttl=86400)
+        # Autothread channels and their durations, per guild. Every message is
+        # checked against them, so they are only read once per guild.
+        self.autothreads = cache.Cache(
+            "base.autothread", maxsize=10000, tables=(AutoThread.__tablename__,)
+        )
+        # Reaction preferences of guilds, so reactions do not hit the database
+        self.settings = cache.Cache(
+            "base.settings",
+            maxsize=10000,
+            tables=(
+                UserPin.__tablename__,
+                UserThread.__tablename__,
+                Bookmark.__tablename__,
+            ),
+        )
+        # Users that have recently bookmarked a message, as (message ID, user ID)
+        self.bookmarked = cache.Cache("base.bookmarks", maxsize=10000, ttl=900)
+
+        self.thread_queue = ThreadQueue(
+            self._create_autothread, self._report_autothread, maxsize=50, max_lag=300
+        )
+        metrics.register("base.base.autothread", self.thread_queue.get_statistics)
+
+        # Only messages in autothread channels and the handled reactions are
+        # dispatched to the cog
+        self.autothread_subscription = events.subscribe_message(
+            "base.base.autothread",
+            self.on_autothread_message,
+            channels=AutoThread.get_channel_ids(),
+        )
+        invalidation.subscribe(AutoThread.__tablename__, self._on_autothread_change)
+        self.reaction_subscription = events.subscribe_reaction(
+            "base.base.reactions",
+            self.on_reaction_add,
+            emojis=("📌", "📍", "🔖", "🧵", "🗑️"),
+        )
+
+    def cog_unload(self):
+        self.thread_queue.stop()
+        events.unsubscribe(self.autothread_subscription)
+        events.unsubscribe(self.reaction_subscription)
+        invalidation.unsubscribe(AutoThread.__tablename__, self._on_autothread_change)
+
+    def _on_autothread_change(self, table: str, key: Optional[str]):
+        # The session may be in the middle of a commit, read the channels after
+        # it is done
+        asyncio.get_running_loop().call_soon(
+            lambda: self.autothread_subscription.set_channels(
+                AutoThread.get_channel_ids()
+            )
+        )
 
     #
 
-    @tasks.loop(minutes=15)
-    async def dump_cache(self):
-        self.bookmark_cache = {}
+    def _get_autothread_duration(self, guild_id: int, channel_id: int) -> Optional[int]:
+        """Get duration of automatic threads in the channel.
 
-    @dump_cache.before_loop
-    async def before_dump_cache(self):
-        await self.bot.wait_until_ready()
+        :return: Duration in minutes, or ``None`` if the threads are not created
+            automatically there.
+        """
+        channels: Dict[int, int] = self.autothreads.get_or_load(
+            guild_id,
+            lambda: AutoThread.get_channels(guild_id),
+            tags=(str(guild_id),),
+        )
+        return channels.get(channel_id)
 
-    def cog_unload(self):
-        self.dump_cache.cancel()
+    def _get_settings(self, guild_id: int) -> GuildSettings:
+        """Get userpin, userthread and bookmark preferences of the guild."""
+        return self.settings.get_or_load(
+            guild_id, lambda: GuildSettings(guild_id), tags=(str(guild_id),)
+        )
 
     @commands.guild_only()
     @check.acl2(check.ACLevel.SUBMOD)
@@ -390,48 +717,60 @@ class Base(commands.Cog):
 
     #
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
+    async def on_autothread_message(self, message: discord.Message):
         if message.author.bot:
             return
         if isinstance(message.channel, discord.abc.PrivateChannel):
             return
-        thread_settings = AutoThread.get(message.guild.id, message.channel.id)
-        if thread_settings is None:
+        duration = self._get_autothread_duration(message.guild.id, message.channel.id)
+        if duration is None:
+            return
+
+        # the threads are created in the background, so bursts of messages
+        # do not hit the rate limits
+        self.thread_queue.put(message)
+
+    async def _create_autothread(self, message: discord.Message):
+        """Create automatic thread on the message."""
+        duration = self._get_autothread_duration(message.guild.id, message.channel.id)
+        if duration is None:
+            # autothread has been disabled while the message was waiting
             return
 
         utx = i18n.TranslationContext(message.guild.id, message.author.id)
 
         # ensure we're creating thread that does not take longer than
         # the current guild level allows us to
-        duration = thread_settings.duration
         if message.guild.premium_tier < 3 and duration > self.durations["3d"]:
             duration = self.durations["3d"]
         if message.guild.premium_tier < 2 and duration > self.durations["1d"]:
             duration = self.durations["1d"]
 
-        try:
-            await message.create_thread(
-                name=_(utx, "Automatic thread"), auto_archive_duration=duration
-            )
-            await guild_log.debug(
-                message.author,
-                message.channel,
-                "A new thread created automatically.",
-            )
-        except discord.HTTPException as exc:
-            await guild_log.error(
-                message.author,
-                message.channel,
-                f"Could not create a thread automatically: {exc}",
-            )
+        await message.create_thread(
+            name=_(utx, "Automatic thread"), auto_archive_duration=duration
+        )
+        await guild_log.debug(
+            message.author,
+            message.channel,
+            "A new thread created automatically.",
+        )
+
+    async def _report_autothread(
+        self, message: discord.Message, exc: discord.HTTPException
+    ):
+        await guild_log.error(
+            message.author,
+            message.channel,
+            f"Could not create a thread automatically: {exc}",
+        )
 
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
         """Handle thread deletion if parental message is deleted."""
+        self.reactions.forget(payload.message_id)
         if payload.guild_id is None:
             return
-        if AutoThread.get(payload.guild_id, payload.channel_id) is None:
+        if self._get_autothread_duration(payload.guild_id, payload.channel_id) is None:
             # only handle channels where the threads are created automatically
             return
         channel = self.bot.get_guild(payload.guild_id).get_channel(payload.channel_id)
@@ -457,18 +796,66 @@ class Base(commands.Cog):
                     )
                 return
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+    async def on_reaction_add(self, payload: discord.RawReactionActionEvent):
         """Handle message pinning."""
         emoji = getattr(payload.emoji, "name", None)
-        if emoji not in ("📌", "📍", "🔖", "🧵", "🗑️"):
-            return
 
         if payload.guild_id is None and emoji != "🗑️":
             return
         if payload.guild_id is not None and emoji == "🗑️":
             return
 
+        # userpins and userthreads only need the message when the limit is hit
+        if emoji == "📌" or emoji == "📍":
+            await self._userpin(payload, emoji)
+            return
+        if emoji == "🧵":
+            await self._userthread(payload)
+            return
+
+        if emoji == "🔖":
+            settings = self._get_settings(payload.guild_id)
+            if not settings.get_bookmarks_enabled(payload.channel_id):
+                return
+
+        message = await self._get_message(payload, emoji)
+        if message is None:
+            return
+
+        if emoji == "🔖":
+            await self._bookmark(payload, message)
+        elif emoji == "🗑️":
+            await self._remove_bot_dm(payload, message)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """Update reaction counts of userpins and userthreads."""
+        emoji = getattr(payload.emoji, "name", None)
+        if emoji in self.reactions.emojis:
+            self.reactions.remove(payload.message_id, emoji)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        """Update reaction counts of userpins and userthreads."""
+        self.reactions.reset(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(
+        self, payload: discord.RawReactionClearEmojiEvent
+    ):
+        """Update reaction counts of userpins and userthreads."""
+        emoji = getattr(payload.emoji, "name", None)
+        if emoji in self.reactions.emojis:
+            self.reactions.reset(payload.message_id, emoji)
+
+    async def _get_message(
+        self, payload: discord.RawReactionActionEvent, emoji: str
+    ) -> Optional[discord.Message]:
+        """Get message the reaction was added to.
+
+        :return: The message, or ``None`` if it could not be found or if it
+            is a system message.
+        """
         message = await utils.discord.get_message(
             self.bot,
             payload.guild_id or payload.user_id,
@@ -483,44 +870,66 @@ class Base(commands.Cog):
                 + utils.discord.message_url_from_reaction_payload(payload)
                 + f", functionality '{emoji}' not triggered.",
             )
-            return
+            return None
 
         # do not allow the actions on system messages (boost announcements etc.)
         if message.type not in (
             discord.MessageType.default,
             discord.MessageType.reply,
         ):
-            return
+            return None
+        return message
 
-        if emoji == "📌" or emoji == "📍":
-            await self._userpin(payload, message, emoji)
-        elif emoji == "🔖":
-            await self._bookmark(payload, message)
-        elif emoji == "🧵":
-            await self._userthread(payload, message)
-        elif emoji == "🗑️":
-            await self._remove_bot_dm(payload, message)
+    async def _count_reaction(
+        self, payload: discord.RawReactionActionEvent, emoji: str
+    ) -> Tuple[int, Optional[discord.Message]]:
+        """Count the added reaction.
 
-    async def _userpin(
-        self,
-        payload: discord.RawReactionActionEvent,
-        message: discord.Message,
-        emoji: str,
-    ):
+        :return: Count of the reaction on the message, and the message if it
+            had to be fetched to seed the counts.
+        """
+        count: Optional[int] = self.reactions.add(payload.message_id, emoji)
+        if count is not None:
+            return count, None
+
+        message = await self._get_message(payload, emoji)
+        if message is None:
+            return 0, None
+        return self.reactions.seed(message).get(emoji, 0), message
+
+    async def _get_reacted_by(
+        self, message: discord.Message, emoji: str, limit: int = 20
+    ) -> str:
+        """Get names of users that reacted, for logging.
+
+        Only first ``limit`` users are read, popular messages would need
+        several API calls otherwise.
+        """
+        reaction = discord.utils.find(
+            lambda r: str(r.emoji) == emoji, message.reactions
+        )
+        if reaction is None:
+            return "unknown"
+        names = [user.name async for user in reaction.users(limit=limit)]
+        if reaction.count > len(names):
+            names.append(f"and {reaction.count - len(names)} more")
+        return ", ".join(names)
+
+    async def _userpin(self, payload: discord.RawReactionActionEvent, emoji: str):
         """Handle userpin functionality."""
         # Has this feature been even activated in this channel?
-        limit: int = getattr(
-            UserPin.get(payload.guild_id, payload.channel_id), "limit", -1
-        )
-        # overwrite for channel doesn't exist, use guild preference
-        if limit < 0:
-            limit = getattr(UserPin.get(payload.guild_id, None), "limit", 0)
+        settings = self._get_settings(payload.guild_id)
+        limit: int = settings.get_userpin_limit(payload.channel_id)
         if limit < 1:
             return
 
-        utx = i18n.TranslationContext(payload.guild_id, payload.user_id)
-
-        if emoji == "📍" and not payload.member.bot:
+        if emoji == "📍":
+            if payload.member.bot:
+                return
+            message = await self._get_message(payload, emoji)
+            if message is None:
+                return
+            utx = i18n.TranslationContext(payload.guild_id, payload.user_id)
             await utils.discord.send_dm(
                 payload.member,
                 _(utx, "I'm using 📍 to mark the pinned message, use 📌."),
@@ -528,64 +937,61 @@ class Base(commands.Cog):
             await utils.discord.remove_reaction(message, emoji, payload.member)
             return
 
-        for reaction in message.reactions:
-            if reaction.emoji != "📌":
-                continue
-
-            # remove if the message is pinned or is in unpinnable channel
-            if message.pinned:
-                await guild_log.debug(
-                    payload.member,
-                    message.channel,
-                    f"Removing {payload.user_id}'s pin: Message is already pinned.",
-                )
-                await reaction.clear()
+        count, message = await self._count_reaction(payload, "📌")
+        # stop if there isn't enough pins, unless the message has just been
+        # fetched and can be checked for free
+        if count < limit and message is None:
+            return
+        if message is None:
+            message = await self._get_message(payload, "📌")
+            if message is None:
                 return
+        # the counted events may include reactions that were in the seed
+        count = self.reactions.refresh(message).get("📌", 0)
 
-            # stop if there isn't enough pins
-            if limit == 0 or reaction.count < limit:
-                return
+        # remove if the message is pinned or is in unpinnable channel
+        if message.pinned:
+            await guild_log.debug(
+                payload.member,
+                message.channel,
+                f"Removing {payload.user_id}'s pin: Message is already pinned.",
+            )
+            await message.clear_reaction("📌")
+            return
 
-            try:
-                users = [user async for user in reaction.users()]
-                await message.pin()
-                await guild_log.info(
-                    payload.member,
-                    message.channel,
-                    f"Pinned message {message.jump_url}. "
-                    f"Reacted by users: {', '.join(user.name for user in users)}",
-                )
-            except discord.errors.HTTPException:
-                await guild_log.error(
-                    payload.member, message.channel, "Could not pin message."
-                )
-                return
+        if count < limit:
+            return
 
-            await reaction.clear()
-            await message.add_reaction("📍")
+        # other reactions must not pin the message again
+        self.reactions.reset(message.id, "📌")
+        try:
+            users: str = await self._get_reacted_by(message, "📌")
+            await message.pin()
+            await guild_log.info(
+                payload.member,
+                message.channel,
+                f"Pinned message {message.jump_url}. Reacted by users: {users}",
+            )
+        except discord.errors.HTTPException:
+            await guild_log.error(
+                payload.member, message.channel, "Could not pin message."
+            )
+            # count the reactions again on the next attempt
+            self.reactions.forget(message.id)
+            return
+
+        await message.clear_reaction("📌")
+        await message.add_reaction("📍")
 
     async def _bookmark(
         self, payload: discord.RawReactionActionEvent, message: discord.Message
     ):
         """Handle bookmark functionality."""
         # antispam cache check and update
-        current_users_on_msg: set = self.bookmark_cache.get(message.id)
-        if current_users_on_msg is not None:
-            if payload.member.id in current_users_on_msg:
-                await utils.discord.remove_reaction(
-                    message, payload.emoji, payload.member
-                )
-                return
-        else:
-            current_users_on_msg = set()
-        current_users_on_msg.add(payload.member.id)
-        self.bookmark_cache.update({message.id: current_users_on_msg})
-
-        bookmark = Bookmark.get(payload.guild_id, payload.channel_id)
-        if bookmark is None:
-            bookmark = Bookmark.get(payload.guild_id, None)
-        if not bookmark or not bookmark.enabled:
+        if self.bookmarked.get((message.id, payload.member.id)) is not None:
+            await utils.discord.remove_reaction(message, payload.emoji, payload.member)
             return
+        self.bookmarked.set((message.id, payload.member.id), True)
 
         utx = i18n.TranslationContext(payload.guild_id, payload.user_id)
 
@@ -640,82 +1046,88 @@ class Base(commands.Cog):
         if message.author.id == self.bot.user.id:
             await utils.discord.delete_message(message)
 
-    async def _userthread(
-        self,
-        payload: discord.RawReactionActionEvent,
-        message: discord.Message,
-    ):
+    async def _userthread(self, payload: discord.RawReactionActionEvent):
         """Handle userthread functionality."""
-        utx = i18n.TranslationContext(payload.guild_id, payload.user_id)
+        # get emoji limit for channel
+        settings = self._get_settings(payload.guild_id)
+        limit: int = settings.get_userthread_limit(payload.channel_id)
+        if limit < 1:
+            return
 
-        for reaction in message.reactions:
-            if reaction.emoji != "🧵":
-                continue
+        count, message = await self._count_reaction(payload, "🧵")
+        # messages with archived thread need fewer reactions, they have to be
+        # checked from the lower limit on, or when they have just been fetched
+        if count < ceil(limit * 0.75) and message is None:
+            return
+        if message is None:
+            message = await self._get_message(payload, "🧵")
+            if message is None:
+                return
+        # the counted events may include reactions that were in the seed
+        count = self.reactions.refresh(message).get("🧵", 0)
+
+        # we can't open threads inside of threads
+        if isinstance(message.channel, discord.Thread):
+            await message.clear_reaction("🧵")
+            return
 
-            # we can't open threads inside of threads
-            if isinstance(message.channel, discord.Thread):
-                await reaction.clear()
+        # get message's existing thread
+        thread_of_message: discord.Thread = None
+        if message.flags.has_thread:
+            for thread in message.channel.threads:
+                if thread.id == message.id:
+                    thread_of_message = thread
+                    break
+            # check if the given message has an archived thread
+            if thread_of_message.archived:
+                # lower emoji limit
+                limit = ceil(limit * 0.75)
+            else:
+                await message.clear_reaction("🧵")
                 return
 
-            # get emoji limit for channel
-            limit: int = getattr(
-                UserThread.get(payload.guild_id, payload.channel_id), "limit", -1
+        # stop if there isn't enough thread reactions
+        if count < limit:
+            return
+
+        # other reactions must not open the thread again
+        self.reactions.reset(message.id, "🧵")
+
+        # unarchive thread if exists and is archived (filtered out previously)
+        if thread_of_message is not None:
+            await thread_of_message.edit(archived=False)
+            await guild_log.info(
+                payload.member,
+                message.channel,
+                f"Thread unarchived on a message {message.jump_url}.",
             )
-            # overwrite for channel doesn't exist, use guild preference
-            if limit < 0:
-                limit = getattr(UserThread.get(payload.guild_id, None), "limit", 0)
-
-            # get message's existing thread
-            thread_of_message: discord.Thread = None  # used globally in this loop
-            if message.flags.has_thread:
-                for thread in message.channel.threads:
-                    if thread.id == message.id:
-                        thread_of_message = thread
-                        break
-                # check if the given message has an archived thread
-                if message.flags.has_thread:
-                    if thread_of_message.archived:
-                        # lower emoji limit
-                        limit = ceil(limit * 0.75)
-                    else:
-                        await reaction.clear()
-                        return
-
-            # stop if there isn't enough thread reactions
-            if limit == 0 or reaction.count < limit:
-                return
-            # unarchive thread if exists and is archived (filtered out previously)
-            if thread_of_message is not None:
-                await thread_of_message.edit(archived=False)
-                await guild_log.info(
-                    payload.member,
-                    message.channel,
-                    f"Thread unarchived on a message {message.jump_url}.",
-                )
-                await reaction.clear()
-                return
-            # create a new thread
-            try:
-                users = [user async for user in reaction.users()]
-                thread_name = _(utx, "Thread by {author}").format(
-                    author=message.author.name
-                )
-                await message.create_thread(name=thread_name)
-                await guild_log.info(
-                    payload.member,
-                    message.channel,
-                    f"Thread opened on a message {message.jump_url}. "
-                    f"Reacted by users: {', '.join(user.name for user in users)}",
-                )
-            except discord.errors.HTTPException:
-                await guild_log.error(
-                    payload.member,
-                    message.channel,
-                    f"Could not open a thread on a message {message.jump_url}.",
-                )
-                return
+            await message.clear_reaction("🧵")
+            return
+        # create a new thread
+        try:
+            users: str = await self._get_reacted_by(message, "🧵")
+            utx = i18n.TranslationContext(payload.guild_id, payload.user_id)
+            thread_name = _(utx, "Thread by {author}").format(
+                author=message.author.name
+            )
+            await message.create_thread(name=thread_name)
+            await guild_log.info(
+                payload.member,
+                message.channel,
+                f"Thread opened on a message {message.jump_url}. "
+                f"Reacted by users: {users}",
+            )
+        except discord.errors.HTTPException:
+            await guild_log.error(
+                payload.member,
+                message.channel,
+                f"Could not open a thread on a message {message.jump_url}.",
+            )
+            # count the reactions again on the next attempt
+            self.reactions.forget(message.id)
+            return
 
-            await reaction.clear()
+        await message.clear_reaction("🧵")
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
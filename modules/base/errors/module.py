@@ -1,4 +1,5 @@
 import datetime
+import math
 from io import BytesIO
 from pathlib import Path
 from typing import List, Tuple
@@ -612,6 +613,14 @@ class Errors(commands.Cog):
                 ReportTraceback.NO,
             )
 
+        if isinstance(error, pie.exceptions.RateLimitExceeded):
+            time: str = utils.time.format_seconds(math.ceil(error.retry_after))
+            return (
+                _(ctx, "Check failure"),
+                _(ctx, "Slow down. Wait **{time}**").format(time=time),
+                ReportTraceback.NO,
+            )
+
         if isinstance(error, pie.exceptions.InsufficientACLevel):
             return (
                 _(ctx, "Check failure"),
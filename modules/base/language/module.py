@@ -81,8 +81,6 @@ class Language(commands.Cog):
             _(ctx, "I'll remember the preference of **{language}**.").format(
                 language=language,
             )
-            + " "
-            + _(ctx, "You may need to wait two minutes for the change to take effect.")
         )
 
     @check.acl2(check.ACLevel.MEMBER)
@@ -98,7 +96,7 @@ class Language(commands.Cog):
             return
         await guild_log.debug(ctx.author, ctx.channel, "Language preference unset.")
         await ctx.reply(
-            _(ctx, "You may need to wait two minutes for the change to take effect.")
+            _(ctx, "I'll be using the server or global settings from now on.")
         )
 
     @check.acl2(check.ACLevel.MOD)
@@ -124,8 +122,6 @@ class Language(commands.Cog):
             _(ctx, "I'll be using **{language}** on this server now.").format(
                 language=language,
             )
-            + " "
-            + _(ctx, "You may need to wait two minutes for the change to take effect.")
         )
 
     @check.acl2(check.ACLevel.MOD)
@@ -139,11 +135,7 @@ class Language(commands.Cog):
         await guild_log.info(
             ctx.author, ctx.channel, "Guild language preference unset."
         )
-        await ctx.reply(
-            _(ctx, "I'll be using the global settings from now on.")
-            + " "
-            + _(ctx, "You may need to wait two minutes for the change to take effect.")
-        )
+        await ctx.reply(_(ctx, "I'll be using the global settings from now on."))
 
     @check.acl2(check.ACLevel.MOD)
     @language_.command(name="audit")
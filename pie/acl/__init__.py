@@ -4,13 +4,11 @@ import inspect
 import re
 from typing import Callable, Optional, Set, TypeVar, Union
 
-import ring
-
 import discord
 from discord.ext import commands
 
 import pie._tracing
-from pie import i18n
+from pie import cache, i18n
 
 from pie.acl.database import ACDefault, ACLevel, ACLevelMappping
 from pie.exceptions import (
@@ -28,14 +26,30 @@ _ = i18n.Translator(__file__).translate
 T = TypeVar("T")
 
 
-@ring.lru(expire=10)
+# Member's roles may change at any time, keep their level only for a while
+_levels = cache.Cache(
+    "pie.acl.levels", maxsize=4096, ttl=10, tables=("pie_acl_aclevel_mapping",)
+)
+
+
 def map_member_to_ACLevel(
     *,
     bot: commands.Bot,
     member: discord.Member,
 ):
     """Map member to their ACLevel."""
+    return _levels.get_or_load(
+        (member.guild.id, member.id),
+        lambda: _map_member_to_ACLevel(bot=bot, member=member),
+        tags=(str(member.guild.id),),
+    )
 
+
+def _map_member_to_ACLevel(
+    *,
+    bot: commands.Bot,
+    member: discord.Member,
+):
     _acl_trace = lambda message: _trace(f"[acl(mapping)] {message}")  # noqa: E731
 
     # Gather information
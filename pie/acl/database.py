@@ -3,9 +3,18 @@ from __future__ import annotations
 import enum
 from typing import Any, Dict, Optional, List
 
-from sqlalchemy import BigInteger, Boolean, Column, Enum, String, Integer
+from sqlalchemy import BigInteger, Boolean, Column, Enum, Index, String, Integer
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Connection
 
-from pie.database import database, session
+from pie.database import (
+    database,
+    invalidation,
+    migrations,
+    primary,
+    read_only,
+    session,
+)
 
 
 class ACLevel(enum.IntEnum):
@@ -25,23 +34,29 @@ class ACDefault(database.base):
     command = Column(String)
     level = Column(Enum(ACLevel))
 
+    __table_args__ = (
+        Index("ix_pie_acl_acdefault_guild_command", guild_id, command, unique=True),
+    )
+
     @staticmethod
     def add(guild_id: int, command: str, level: ACLevel) -> Optional[ACDefault]:
-        if ACDefault.get(guild_id, command):
-            return None
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            if ACDefault.get(guild_id, command):
+                return None
 
         default = ACDefault(guild_id=guild_id, command=command, level=level)
         session.add(default)
+        invalidation.publish(ACDefault.__tablename__, guild_id)
         session.commit()
         return default
 
     @staticmethod
+    @read_only
     def get(guild_id: int, command: str) -> Optional[ACDefault]:
-        default = (
-            session.query(ACDefault)
-            .filter_by(guild_id=guild_id, command=command)
-            .one_or_none()
-        )
+        default = session.execute(
+            _GET_ACDEFAULT, {"guild_id": guild_id, "command": command}
+        ).scalar_one_or_none()
         return default
 
     @staticmethod
@@ -56,6 +71,7 @@ class ACDefault(database.base):
             .filter_by(guild_id=guild_id, command=command)
             .delete()
         )
+        invalidation.publish(ACDefault.__tablename__, guild_id)
         return query > 0
 
     def __repr__(self) -> str:
@@ -73,6 +89,14 @@ class ACDefault(database.base):
         }
 
 
+# Lookups done on every command invocation use statements that are built once,
+# SQLAlchemy then only binds the parameters and reuses the compiled query.
+_GET_ACDEFAULT = select(ACDefault).where(
+    ACDefault.guild_id == bindparam("guild_id"),
+    ACDefault.command == bindparam("command"),
+)
+
+
 class RoleOverwrite(database.base):
     __tablename__ = "pie_acl_role_overwrite"
 
@@ -82,26 +106,39 @@ class RoleOverwrite(database.base):
     command = Column(String)
     allow = Column(Boolean)
 
+    __table_args__ = (
+        Index(
+            "ix_pie_acl_role_overwrite_guild_command_role",
+            guild_id,
+            command,
+            role_id,
+            unique=True,
+        ),
+    )
+
     @staticmethod
     def add(
         guild_id: int, role_id: int, command: str, allow: bool
     ) -> Optional[RoleOverwrite]:
-        if RoleOverwrite.get(guild_id, role_id, command):
-            return None
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            if RoleOverwrite.get(guild_id, role_id, command):
+                return None
         ro = RoleOverwrite(
             guild_id=guild_id, role_id=role_id, command=command, allow=allow
         )
         session.add(ro)
+        invalidation.publish(RoleOverwrite.__tablename__, guild_id)
         session.commit()
         return ro
 
     @staticmethod
+    @read_only
     def get(guild_id: int, role_id: int, command: str) -> Optional[RoleOverwrite]:
-        ro = (
-            session.query(RoleOverwrite)
-            .filter_by(guild_id=guild_id, role_id=role_id, command=command)
-            .one_or_none()
-        )
+        ro = session.execute(
+            _GET_ROLE_OVERWRITE,
+            {"guild_id": guild_id, "role_id": role_id, "command": command},
+        ).scalar_one_or_none()
         return ro
 
     @staticmethod
@@ -116,6 +153,7 @@ class RoleOverwrite(database.base):
             .filter_by(guild_id=guild_id, role_id=role_id, command=command)
             .delete()
         )
+        invalidation.publish(RoleOverwrite.__tablename__, guild_id)
         return query > 0
 
     def __repr__(self) -> str:
@@ -133,6 +171,13 @@ class RoleOverwrite(database.base):
         }
 
 
+_GET_ROLE_OVERWRITE = select(RoleOverwrite).where(
+    RoleOverwrite.guild_id == bindparam("guild_id"),
+    RoleOverwrite.role_id == bindparam("role_id"),
+    RoleOverwrite.command == bindparam("command"),
+)
+
+
 class UserOverwrite(database.base):
     __tablename__ = "pie_acl_user_overwrite"
 
@@ -142,26 +187,39 @@ class UserOverwrite(database.base):
     command = Column(String)
     allow = Column(Boolean)
 
+    __table_args__ = (
+        Index(
+            "ix_pie_acl_user_overwrite_guild_command_user",
+            guild_id,
+            command,
+            user_id,
+            unique=True,
+        ),
+    )
+
     @staticmethod
     def add(
         guild_id: int, user_id: int, command: str, allow: bool
     ) -> Optional[UserOverwrite]:
-        if UserOverwrite.get(guild_id, user_id, command):
-            return None
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            if UserOverwrite.get(guild_id, user_id, command):
+                return None
         uo = UserOverwrite(
             guild_id=guild_id, user_id=user_id, command=command, allow=allow
         )
         session.add(uo)
+        invalidation.publish(UserOverwrite.__tablename__, guild_id)
         session.commit()
         return uo
 
     @staticmethod
+    @read_only
     def get(guild_id: int, user_id: int, command: str) -> Optional[UserOverwrite]:
-        uo = (
-            session.query(UserOverwrite)
-            .filter_by(guild_id=guild_id, user_id=user_id, command=command)
-            .one_or_none()
-        )
+        uo = session.execute(
+            _GET_USER_OVERWRITE,
+            {"guild_id": guild_id, "user_id": user_id, "command": command},
+        ).scalar_one_or_none()
         return uo
 
     @staticmethod
@@ -176,6 +234,7 @@ class UserOverwrite(database.base):
             .filter_by(guild_id=guild_id, user_id=user_id, command=command)
             .delete()
         )
+        invalidation.publish(UserOverwrite.__tablename__, guild_id)
         return query > 0
 
     def __repr__(self) -> str:
@@ -193,6 +252,13 @@ class UserOverwrite(database.base):
         }
 
 
+_GET_USER_OVERWRITE = select(UserOverwrite).where(
+    UserOverwrite.guild_id == bindparam("guild_id"),
+    UserOverwrite.user_id == bindparam("user_id"),
+    UserOverwrite.command == bindparam("command"),
+)
+
+
 class ChannelOverwrite(database.base):
     __tablename__ = "pie_acl_channel_overwrite"
 
@@ -202,26 +268,39 @@ class ChannelOverwrite(database.base):
     command = Column(String)
     allow = Column(Boolean)
 
+    __table_args__ = (
+        Index(
+            "ix_pie_acl_channel_overwrite_guild_command_channel",
+            guild_id,
+            command,
+            channel_id,
+            unique=True,
+        ),
+    )
+
     @staticmethod
     def add(
         guild_id: int, channel_id: int, command: str, allow: bool
     ) -> Optional[ChannelOverwrite]:
-        if ChannelOverwrite.get(guild_id, channel_id, command):
-            return None
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            if ChannelOverwrite.get(guild_id, channel_id, command):
+                return None
         co = ChannelOverwrite(
             guild_id=guild_id, channel_id=channel_id, command=command, allow=allow
         )
         session.add(co)
+        invalidation.publish(ChannelOverwrite.__tablename__, guild_id)
         session.commit()
         return co
 
     @staticmethod
+    @read_only
     def get(guild_id: int, channel_id: int, command: str) -> Optional[ChannelOverwrite]:
-        co = (
-            session.query(ChannelOverwrite)
-            .filter_by(guild_id=guild_id, channel_id=channel_id, command=command)
-            .one_or_none()
-        )
+        co = session.execute(
+            _GET_CHANNEL_OVERWRITE,
+            {"guild_id": guild_id, "channel_id": channel_id, "command": command},
+        ).scalar_one_or_none()
         return co
 
     @staticmethod
@@ -236,6 +315,7 @@ class ChannelOverwrite(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id, command=command)
             .delete()
         )
+        invalidation.publish(ChannelOverwrite.__tablename__, guild_id)
         return query > 0
 
     def __repr__(self) -> str:
@@ -253,6 +333,13 @@ class ChannelOverwrite(database.base):
         }
 
 
+_GET_CHANNEL_OVERWRITE = select(ChannelOverwrite).where(
+    ChannelOverwrite.guild_id == bindparam("guild_id"),
+    ChannelOverwrite.channel_id == bindparam("channel_id"),
+    ChannelOverwrite.command == bindparam("command"),
+)
+
+
 class ACLevelMappping(database.base):
     __tablename__ = "pie_acl_aclevel_mapping"
 
@@ -261,20 +348,26 @@ class ACLevelMappping(database.base):
     role_id = Column(BigInteger)
     level = Column(Enum(ACLevel))
 
+    __table_args__ = (
+        Index("ix_pie_acl_aclevel_mapping_guild_role", guild_id, role_id, unique=True),
+    )
+
     def add(guild_id: int, role_id: int, level: ACLevel) -> Optional[ACLevelMappping]:
-        if ACLevelMappping.get(guild_id, role_id):
-            return None
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            if ACLevelMappping.get(guild_id, role_id):
+                return None
         m = ACLevelMappping(guild_id=guild_id, role_id=role_id, level=level)
         session.add(m)
+        invalidation.publish(ACLevelMappping.__tablename__, guild_id)
         session.commit()
         return m
 
+    @read_only
     def get(guild_id: int, role_id: int) -> Optional[ACLevelMappping]:
-        m = (
-            session.query(ACLevelMappping)
-            .filter_by(guild_id=guild_id, role_id=role_id)
-            .one_or_none()
-        )
+        m = session.execute(
+            _GET_ACLEVEL_MAPPING, {"guild_id": guild_id, "role_id": role_id}
+        ).scalar_one_or_none()
         return m
 
     def get_all(guild_id: int) -> List[ACLevelMappping]:
@@ -287,6 +380,7 @@ class ACLevelMappping(database.base):
             .filter_by(guild_id=guild_id, role_id=role_id)
             .delete()
         )
+        invalidation.publish(ACLevelMappping.__tablename__, guild_id)
         return query > 0
 
     def __repr__(self) -> str:
@@ -302,3 +396,22 @@ class ACLevelMappping(database.base):
             "role_id": self.role_id,
             "level": self.level,
         }
+
+
+_GET_ACLEVEL_MAPPING = select(ACLevelMappping).where(
+    ACLevelMappping.guild_id == bindparam("guild_id"),
+    ACLevelMappping.role_id == bindparam("role_id"),
+)
+
+
+@migrations.migration(1)
+def add_lookup_indexes(connection: Connection) -> None:
+    """Index the columns used by the ACL checks."""
+    migrations.create_indexes(
+        connection,
+        ACDefault.__table__,
+        RoleOverwrite.__table__,
+        UserOverwrite.__table__,
+        ChannelOverwrite.__table__,
+        ACLevelMappping.__table__,
+    )
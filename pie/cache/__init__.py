@@ -0,0 +1,371 @@
+import asyncio
+import collections
+import contextlib
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    OrderedDict,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pie import metrics
+
+# Marks missing values, so ``None`` can be cached as well
+_MISSING = object()
+
+
+class CacheStatistics:
+    """Usage of one cache.
+
+    :param hits: Number of lookups that found a valid value.
+    :param misses: Number of lookups that did not.
+    :param loads: Number of values produced by loaders.
+    :param evictions: Number of values dropped because the cache was full.
+    :param expirations: Number of values dropped because they were too old.
+    :param invalidations: Number of values dropped by invalidation.
+    """
+
+    __slots__ = ("hits", "misses", "loads", "evictions", "expirations", "invalidations")
+
+    def __init__(self):
+        self.hits: int = 0
+        self.misses: int = 0
+        self.loads: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+        self.invalidations: int = 0
+
+    def dump(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "tags")
+
+    def __init__(self, value: Any, expires: Optional[float], tags: Tuple[str, ...]):
+        self.value = value
+        self.expires: Optional[float] = expires
+        self.tags: Tuple[str, ...] = tags
+
+
+class Cache:
+    """Bounded in-memory cache.
+
+    :param name: Unique name of the cache, e.g. ``pie.acl.levels``. It is
+        used by the ``pumpkin cache`` command and in the metrics.
+    :param maxsize: Maximal number of values. When the cache is full, the
+        least recently used value is dropped.
+    :param ttl: Seconds after which the values expire. ``None`` keeps them
+        until they are evicted or invalidated.
+    :param tables: Database tables whose changes invalidate the cache, see
+        :mod:`pie.database.invalidation`. When a table announces a change
+        with a key, values tagged with the key are dropped; changes without
+        a key clear the whole cache. Values of such caches are always loaded
+        from the primary database, never from the read replica.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie import cache
+
+        reminders = cache.Cache(
+            "fun.reminder", maxsize=1000, ttl=3600, tables=("fun_reminder_reminders",)
+        )
+
+        def get_reminders(guild_id: int) -> List[Reminder]:
+            return reminders.get_or_load(
+                guild_id,
+                lambda: Reminder.get_all(guild_id),
+                tags=(str(guild_id),),
+            )
+
+    Creating a cache with the same name again replaces the previous one, so it
+    is safe to create caches in cog constructors.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        tables: Iterable[str] = (),
+    ):
+        self.name: str = name
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        self.tables: Tuple[str, ...] = tuple(tables)
+        self.statistics = CacheStatistics()
+
+        self._entries: OrderedDict[Hashable, _Entry] = collections.OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+
+        _register(self)
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} name='{self.name}' "
+            f"size='{len(self)}' maxsize='{self.maxsize}' ttl='{self.ttl}'>"
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get cached value.
+
+        :param key: Key of the value.
+        :param default: Value returned when the key is not cached.
+        """
+        entry: Optional[_Entry] = self._entries.get(key)
+        if entry is not None and entry.expires is not None:
+            if entry.expires <= time.monotonic():
+                self._remove(key)
+                self.statistics.expirations += 1
+                entry = None
+        if entry is None:
+            self.statistics.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.statistics.hits += 1
+        return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        *,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None,
+    ) -> None:
+        """Cache the value.
+
+        :param key: Key of the value.
+        :param value: The value, ``None`` included.
+        :param tags: Tags that can be used to invalidate the value together
+            with others, e.g. the guild ID.
+        :param ttl: Seconds after which the value expires, defaults to the
+            TTL of the cache.
+        """
+        if key in self._entries:
+            self._remove(key)
+
+        ttl = self.ttl if ttl is None else ttl
+        expires: Optional[float] = None if ttl is None else time.monotonic() + ttl
+        entry = _Entry(value, expires, tuple(str(tag) for tag in tags))
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.statistics.evictions += 1
+
+    def get_or_load(
+        self, key: Hashable, loader: Callable[[], Any], *, tags: Iterable[str] = ()
+    ) -> Any:
+        """Get cached value, or load and cache it.
+
+        :param key: Key of the value.
+        :param loader: Function producing the value when it is not cached.
+        :param tags: Tags of the loaded value.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._loading_context():
+            value = loader()
+        self.statistics.loads += 1
+        self.set(key, value, tags=tags)
+        return value
+
+    async def aget_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        *,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Get cached value, or load and cache it with coroutine.
+
+        :param key: Key of the value.
+        :param loader: Coroutine function producing the value when it is not
+            cached.
+        :param tags: Tags of the loaded value.
+
+        Concurrent calls for the same missing key share one load: only the
+        first one calls the loader, the others wait for its result. When the
+        loader raises, all of them get the exception and nothing is cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        pending: Optional[asyncio.Future] = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            with self._loading_context():
+                value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Do not complain about the exception if nobody else waits for it
+            future.exception()
+            raise
+        else:
+            self.statistics.loads += 1
+            # The value may have been invalidated while it was loading
+            if self._loading.get(key) is future:
+                self.set(key, value, tags=tags)
+            future.set_result(value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def _loading_context(self) -> ContextManager:
+        if not self.tables:
+            return contextlib.nullcontext()
+        # Loads usually follow an invalidation, the replica may not have
+        # the change yet
+        from pie.database import routing
+
+        return routing.primary()
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop the value.
+
+        :return: Whether the value was cached.
+        """
+        self._loading.pop(key, None)
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        self.statistics.invalidations += 1
+        return True
+
+    def invalidate_tag(self, tag: Union[int, str]) -> int:
+        """Drop all values with the tag.
+
+        :return: Number of dropped values.
+        """
+        keys: Set[Hashable] = set(self._tags.get(str(tag), ()))
+        for key in keys:
+            self._remove(key)
+        # Values being loaded would be cached with old data
+        self._loading.clear()
+        self.statistics.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> int:
+        """Drop all values.
+
+        :return: Number of dropped values.
+        """
+        count: int = len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+        self._loading.clear()
+        self.statistics.invalidations += count
+        return count
+
+    def items(self) -> List[Tuple[Hashable, Any, Optional[float], Tuple[str, ...]]]:
+        """Get cached values without affecting their order or statistics.
+
+        :return: List of keys, values, seconds until they expire and tags,
+            starting with the least recently used.
+        """
+        now: float = time.monotonic()
+        return [
+            (
+                key,
+                entry.value,
+                None if entry.expires is None else entry.expires - now,
+                entry.tags,
+            )
+            for key, entry in self._entries.items()
+        ]
+
+    def get_statistics(self) -> Dict[str, Union[int, float]]:
+        """Get size and usage of the cache."""
+        lookups: int = self.statistics.hits + self.statistics.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            **self.statistics.dump(),
+            "hit_rate": self.statistics.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry: _Entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys: Optional[Set[Hashable]] = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def _on_change(self, table: str, key: Optional[str]) -> None:
+        if key is None:
+            self.clear()
+        else:
+            self.invalidate_tag(key)
+
+
+_caches: Dict[str, Cache] = {}
+
+
+def _register(cache: Cache) -> None:
+    previous: Optional[Cache] = _caches.get(cache.name)
+    _caches[cache.name] = cache
+    metrics.register(f"cache.{cache.name}", cache.get_statistics)
+
+    if not cache.tables and (previous is None or not previous.tables):
+        return
+
+    # Imported here, so caches that are not bound to tables can be used
+    # without the database
+    from pie.database import invalidation
+
+    if previous is not None:
+        for table in previous.tables:
+            invalidation.unsubscribe(table, previous._on_change)
+    for table in cache.tables:
+        invalidation.subscribe(table, cache._on_change)
+
+
+def get(name: str) -> Optional[Cache]:
+    """Get cache by its name."""
+    return _caches.get(name)
+
+
+def get_all() -> List[Cache]:
+    """Get all caches, sorted by their name."""
+    return [_caches[name] for name in sorted(_caches.keys())]
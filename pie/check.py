@@ -1,2 +1,3 @@
 from pie.acl import acl2, ACLevel
+from pie.ratelimit import ratelimit, Scope
 from pie.spamchannel import spamchannel_soft, spamchannel_hard
@@ -1,11 +1,171 @@
 import importlib
 import os
-from typing import List
+import time
+from typing import Any, Dict, List, Optional, Union
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 
+from pie import metrics
 from pie.cli import COLOR
+from pie.database import accounting, sqlite
+from pie.database.routing import RoutingSession, primary, read_only  # noqa: F401
+from pie.exceptions import DotEnvException
+
+
+class PoolStatistics:
+    """Checkout statistics of the connection pool."""
+
+    __slots__ = ("waits", "wait_time")
+
+    def __init__(self):
+        self.waits: int = 0
+        self.wait_time: float = 0.0
+
+
+class MeasuredQueuePool(QueuePool):
+    """Queue pool that keeps track of checkouts that had to wait.
+
+    A checkout waits when there is no idle connection and the overflow limit
+    has already been reached.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statistics = PoolStatistics()
+
+    def _do_get(self):
+        exhausted: bool = (
+            self._max_overflow > -1
+            and self.checkedin() == 0
+            and self.overflow() >= self._max_overflow
+        )
+        if not exhausted:
+            return super()._do_get()
+
+        start: float = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            self.statistics.waits += 1
+            self.statistics.wait_time += time.monotonic() - start
+
+    def recreate(self):
+        # The pool gets recreated when the engine is disposed or when the
+        # database connection is invalidated, keep the statistics.
+        pool = super().recreate()
+        pool.statistics = self.statistics
+        return pool
+
+
+def _getenv_int(name: str, default: int) -> int:
+    value: Optional[str] = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise DotEnvException(f"{name} has to be an integer, got '{value}'.")
+
+
+def _getenv_bool(name: str, default: bool) -> bool:
+    value: Optional[str] = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise DotEnvException(f"{name} has to be a boolean, got '{value}'.")
+
+
+def _get_engine_options(db_string: str) -> Dict[str, Any]:
+    """Get engine options for the connection string.
+
+    Pool of the connections can be tuned with environment variables:
+
+    * ``DB_POOL_SIZE``: Number of kept connections, defaults to ``5``.
+    * ``DB_POOL_MAX_OVERFLOW``: Number of connections that may be opened above
+      the pool size, defaults to ``10``.
+    * ``DB_POOL_TIMEOUT``: Seconds to wait for a free connection, defaults
+      to ``30``.
+    * ``DB_POOL_RECYCLE``: Seconds after which the connection is replaced,
+      defaults to ``1800``. Set to ``-1`` to disable.
+    * ``DB_POOL_PRE_PING``: Test the connection before it is used, defaults
+      to ``1``. This prevents errors after the database server restarts.
+
+    SQLite databases stored in a file use the pool too, so the connections
+    keep their page cache, but they ignore the recycle and pre-ping options.
+    In-memory databases keep the default SQLAlchemy pool.
+    """
+    options: Dict[str, Any] = {
+        # This forces the SQLAlchemy 1.4 to use the 2.0 syntax
+        "future": True,
+    }
+    url = make_url(db_string)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return options
+        options.update(
+            poolclass=MeasuredQueuePool,
+            pool_size=_getenv_int("DB_POOL_SIZE", 5),
+            max_overflow=_getenv_int("DB_POOL_MAX_OVERFLOW", 10),
+            pool_timeout=_getenv_int("DB_POOL_TIMEOUT", 30),
+            connect_args={
+                "timeout": _getenv_int("DB_SQLITE_BUSY_TIMEOUT", 30),
+                # Pooled connections may be used by other threads later
+                "check_same_thread": False,
+            },
+        )
+        return options
+
+    options.update(
+        poolclass=MeasuredQueuePool,
+        pool_size=_getenv_int("DB_POOL_SIZE", 5),
+        max_overflow=_getenv_int("DB_POOL_MAX_OVERFLOW", 10),
+        pool_timeout=_getenv_int("DB_POOL_TIMEOUT", 30),
+        pool_recycle=_getenv_int("DB_POOL_RECYCLE", 1800),
+        pool_pre_ping=_getenv_bool("DB_POOL_PRE_PING", True),
+    )
+    return options
+
+
+def _get_sqlite_pragmas() -> Dict[str, str]:
+    """Get pragmas applied to every SQLite connection.
+
+    They can be tuned with environment variables:
+
+    * ``DB_SQLITE_JOURNAL_MODE``: Defaults to ``WAL``, which lets readers
+      run while other connection writes.
+    * ``DB_SQLITE_SYNCHRONOUS``: Defaults to ``NORMAL``. In WAL mode this
+      only syncs on checkpoints and cannot corrupt the database.
+    * ``DB_SQLITE_CACHE_SIZE``: Page cache of each connection in KiB,
+      defaults to ``65536``.
+    * ``DB_SQLITE_MMAP_SIZE``: Size of memory-mapped I/O in MiB, defaults
+      to ``256``. Set to ``0`` to disable.
+    """
+    journal_mode: str = os.getenv("DB_SQLITE_JOURNAL_MODE") or "WAL"
+    if journal_mode.upper() not in ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL"):
+        raise DotEnvException(
+            f"DB_SQLITE_JOURNAL_MODE has unsupported value '{journal_mode}'."
+        )
+    synchronous: str = os.getenv("DB_SQLITE_SYNCHRONOUS") or "NORMAL"
+    if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise DotEnvException(
+            f"DB_SQLITE_SYNCHRONOUS has unsupported value '{synchronous}'."
+        )
+    cache_size: int = _getenv_int("DB_SQLITE_CACHE_SIZE", 65536)
+    mmap_size: int = _getenv_int("DB_SQLITE_MMAP_SIZE", 256)
+
+    return {
+        "journal_mode": journal_mode.upper(),
+        "synchronous": synchronous.upper(),
+        # Negative value is the size in KiB instead of number of pages
+        "cache_size": str(-cache_size),
+        "mmap_size": str(mmap_size * 1024 * 1024),
+    }
 
 
 class Database:
@@ -13,15 +173,78 @@ class Database:
 
     def __init__(self):
         self.base = declarative_base()
-        self.db = create_engine(
-            os.getenv("DB_STRING"),
-            # This forces the SQLAlchemy 1.4 to use the 2.0 syntax
-            future=True,
-        )
+        db_string: str = os.getenv("DB_STRING")
+        self.db = create_engine(db_string, **_get_engine_options(db_string))
+        accounting.install(self.db)
+
+        self.writer_queue: Optional[sqlite.WriterQueue] = None
+        if self.db.dialect.name == "sqlite":
+            self.writer_queue = sqlite.install(
+                self.db,
+                _get_sqlite_pragmas(),
+                _getenv_int("DB_SQLITE_BUSY_TIMEOUT", 30),
+            )
+
+        # Optional read replica, see pie.database.routing
+        self.replica: Optional[Engine] = None
+        read_string: Optional[str] = os.getenv("DB_READ_STRING")
+        if read_string:
+            self.replica = create_engine(
+                read_string, **_get_engine_options(read_string)
+            )
+            accounting.install(self.replica)
+            if self.replica.dialect.name == "sqlite":
+                sqlite.install(
+                    self.replica,
+                    _get_sqlite_pragmas(),
+                    _getenv_int("DB_SQLITE_BUSY_TIMEOUT", 30),
+                )
+
+    def get_writer_statistics(self) -> Dict[str, Union[int, float]]:
+        """Get statistics of the SQLite writer queue.
+
+        :return: Number of write transactions, number of them that had to wait
+            for other writer and total time spent waiting, in seconds. Empty
+            dictionary is returned if the database is not SQLite.
+        """
+        if self.writer_queue is None:
+            return {}
+        return self.writer_queue.get_statistics()
+
+    def get_pool_statistics(self) -> Dict[str, Union[int, float]]:
+        """Get current state of the connection pool.
+
+        :return: Pool size, number of idle and checked out connections, current
+            overflow, number of checkouts that had to wait for a connection and
+            total time spent waiting, in seconds. Empty dictionary is returned
+            if the engine does not use :class:`MeasuredQueuePool`.
+        """
+        pool = self.db.pool
+        if not isinstance(pool, MeasuredQueuePool):
+            return {}
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "waits": pool.statistics.waits,
+            "wait_time": pool.statistics.wait_time,
+        }
 
 
 database = Database()
-session: Session = sessionmaker(database.db, future=True)()
+session: RoutingSession = sessionmaker(
+    database.db,
+    class_=RoutingSession,
+    future=True,
+    replica=database.replica,
+    stickiness=_getenv_int("DB_READ_STICKINESS", 5),
+)()
+
+metrics.register("database.pool", database.get_pool_statistics)
+metrics.register("database.queries", accounting.get_totals)
+metrics.register("database.sqlite", database.get_writer_statistics)
+metrics.register("database.routing", session.get_routing_statistics)
 
 
 def init_core():
@@ -31,9 +254,12 @@ def init_core():
     """
     # Everything depends on config, we have to initiate it first
     importlib.import_module("pie.database.config")
-    database.base.metadata.create_all(database.db)
+    importlib.import_module("pie.database.migrations")
+    importlib.import_module("pie.database.fingerprint")
+    importlib.import_module("pie.database.invalidation")
+    _create_tables("config")
 
-    for module in ("acl", "i18n", "logger", "storage", "spamchannel"):
+    for module in ("acl", "i18n", "logger", "storage", "spamchannel", "ratelimit"):
         import_stub: str = f"pie.{module}.database"
         try:
             importlib.import_module(import_stub)
@@ -47,9 +273,11 @@ def init_core():
             )  # noqa: T001
             raise
 
-    database.base.metadata.create_all(database.db)
+    _create_tables("core")
     session.commit()
 
+    _upgrade()
+
 
 def init_modules():
     """Load all database models and create their tables.
@@ -58,9 +286,31 @@ def init_modules():
     """
     _import_database_tables()
 
-    database.base.metadata.create_all(database.db)
+    _create_tables("modules")
     session.commit()
 
+    _upgrade()
+
+
+def _create_tables(stage: str):
+    """Create tables of imported models, unless they did not change.
+
+    See :func:`pie.database.fingerprint.create_tables` for details.
+    """
+    from pie.database import fingerprint
+
+    fingerprint.create_tables(stage)
+
+
+def _upgrade():
+    """Apply pending migrations of imported models.
+
+    See :func:`pie.database.migrations.migration` for details.
+    """
+    from pie.database import migrations
+
+    migrations.upgrade()
+
 
 def _list_directory_directories(directory: str) -> List[str]:
     """Return filtered list of directories.
@@ -0,0 +1,228 @@
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Invocation:
+    """Queries issued by one run of a command, listener or task.
+
+    :param name: Name of the origin, e.g. ``command:help``.
+    :param queries: Number of executed statements.
+    :param time: Time spent executing them, in seconds.
+    """
+
+    __slots__ = ("name", "queries", "time")
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.queries: int = 0
+        self.time: float = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} name='{self.name}' "
+            f"queries='{self.queries}' time='{self.time:.3f}'>"
+        )
+
+
+class QueryStatistics:
+    """Aggregated queries of one origin.
+
+    :param invocations: Number of finished invocations.
+    :param queries: Number of executed statements.
+    :param time: Time spent executing them, in seconds.
+    :param max_queries: Highest number of statements in one invocation.
+    :param slow: Number of statements over the slow query threshold.
+    """
+
+    __slots__ = ("invocations", "queries", "time", "max_queries", "slow")
+
+    def __init__(self):
+        self.invocations: int = 0
+        self.queries: int = 0
+        self.time: float = 0.0
+        self.max_queries: int = 0
+        self.slow: int = 0
+
+    def dump(self) -> Dict[str, Union[int, float]]:
+        return {
+            "invocations": self.invocations,
+            "queries": self.queries,
+            "time": self.time,
+            "max_queries": self.max_queries,
+            "slow": self.slow,
+        }
+
+
+_invocation: contextvars.ContextVar = contextvars.ContextVar(
+    "pie_database_invocation", default=None
+)
+_statistics: Dict[str, QueryStatistics] = {}
+# Name asyncio gives to tasks created without one
+_UNNAMED_TASK: re.Pattern = re.compile(r"Task-\d+")
+
+
+def _get_slow_query_threshold() -> float:
+    """Get slow query threshold in seconds.
+
+    It is set by the ``DB_SLOW_QUERY_MS`` environment variable and defaults
+    to 200 milliseconds. Set it to ``0`` to disable the slow query log.
+
+    :raises DotEnvException: The value is not an integer.
+    """
+    # pie.database imports this module, it is complete only at runtime
+    from pie.database import _getenv_int
+
+    return _getenv_int("DB_SLOW_QUERY_MS", 200) / 1000
+
+
+# Set when the engine is installed
+SLOW_QUERY_THRESHOLD: float = 0.2
+
+
+def _get_origin() -> str:
+    """Get the name of code that is executing current statement."""
+    invocation: Optional[Invocation] = _invocation.get()
+    if invocation is not None:
+        return invocation.name
+
+    try:
+        task: Optional[asyncio.Task] = asyncio.current_task()
+    except RuntimeError:
+        # No event loop is running, e.g. during the startup
+        task = None
+    if task is None:
+        return "main"
+    name: str = task.get_name()
+    if _UNNAMED_TASK.fullmatch(name):
+        # Automatic names are unique, they would add an origin for each task
+        return "task"
+    return f"task:{name}"
+
+
+def _get_statistics(origin: str) -> QueryStatistics:
+    if origin not in _statistics:
+        _statistics[origin] = QueryStatistics()
+    return _statistics[origin]
+
+
+@contextlib.contextmanager
+def track(name: str) -> Iterator[Invocation]:
+    """Attribute statements executed inside the block to given name.
+
+    :param name: Name of the origin, e.g. ``command:help``.
+
+    Commands and listeners are tracked automatically. Use this in long running
+    tasks, otherwise their queries are reported under the name of the asyncio
+    task, or under ``task`` if it was not given any:
+
+    .. code-block:: python
+        :linenos:
+
+        from pie.database import accounting
+
+        @tasks.loop(minutes=1)
+        async def reminder_loop(self):
+            with accounting.track("task:Reminder.reminder_loop"):
+                ...
+
+    Blocks can be nested, the statements are always attributed to the
+    innermost one.
+    """
+    invocation = Invocation(name)
+    token = _invocation.set(invocation)
+    try:
+        yield invocation
+    finally:
+        _invocation.reset(token)
+
+        statistics = _get_statistics(name)
+        statistics.invocations += 1
+        statistics.max_queries = max(statistics.max_queries, invocation.queries)
+
+
+def _log_slow_query(origin: str, statement: str, duration: float) -> None:
+    """Write the statement to the slow query log.
+
+    The log is stored next to the bot logs, one JSON object per line.
+    """
+    timestamp = datetime.datetime.now()
+    entry = {
+        "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-5],
+        "origin": origin,
+        "duration": round(duration * 1000, 1),
+        "statement": " ".join(statement.split()),
+    }
+
+    filename: str = f"slow_query_{timestamp.strftime('%Y-%m-%d')}.log"
+    if not os.path.isdir("logs"):
+        os.mkdir("logs")
+    with open(f"logs/{filename}", "a+") as handle:
+        handle.write(json.dumps(entry, ensure_ascii=False))
+        handle.write("\n")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The context belongs to one statement, so nothing is left behind when
+    # the statement fails
+    context._pie_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration: float = time.perf_counter() - context._pie_query_start
+
+    invocation: Optional[Invocation] = _invocation.get()
+    origin: str = _get_origin()
+    if invocation is not None:
+        invocation.queries += 1
+        invocation.time += duration
+
+    statistics = _get_statistics(origin)
+    statistics.queries += 1
+    statistics.time += duration
+
+    if SLOW_QUERY_THRESHOLD and duration >= SLOW_QUERY_THRESHOLD:
+        statistics.slow += 1
+        _log_slow_query(origin, statement, duration)
+
+
+def install(engine: Engine) -> None:
+    """Start measuring statements executed by the engine.
+
+    :raises DotEnvException: ``DB_SLOW_QUERY_MS`` is not an integer.
+    """
+    global SLOW_QUERY_THRESHOLD
+    SLOW_QUERY_THRESHOLD = _get_slow_query_threshold()
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def get_statistics() -> Dict[str, QueryStatistics]:
+    """Get query statistics of all origins."""
+    return dict(_statistics)
+
+
+def get_totals() -> Dict[str, Union[int, float]]:
+    """Get query statistics summed over all origins."""
+    values: List[QueryStatistics] = list(_statistics.values())
+    return {
+        "origins": len(values),
+        "queries": sum(s.queries for s in values),
+        "time": sum(s.time for s in values),
+        "slow": sum(s.slow for s in values),
+    }
+
+
+def reset() -> None:
+    """Forget all collected statistics."""
+    _statistics.clear()
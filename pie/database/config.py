@@ -3,7 +3,7 @@ from typing import Dict, Union
 
 from sqlalchemy import Column, String, Integer
 
-from pie.database import database, session
+from pie.database import database, invalidation, session
 
 
 class Config(database.base):
@@ -49,6 +49,7 @@ class Config(database.base):
     def save(self) -> None:
         """Save global settings."""
         session.merge(self)
+        invalidation.publish(Config.__tablename__)
         session.commit()
 
     def __repr__(self) -> str:
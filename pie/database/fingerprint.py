@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, MetaData, String, Table, delete, select
+from sqlalchemy.engine import Dialect
+from sqlalchemy.exc import DBAPIError
+
+from pie.cli import COLOR
+from pie.database import database
+
+
+class SchemaFingerprint(database.base):
+    """Fingerprint of the declared tables at the time they were created.
+
+    Table creation is skipped when the declared models did not change since
+    the last start. If you drop or alter the tables by hand, delete the rows
+    of this table to make the bot check and create them again.
+    """
+
+    __tablename__ = "pie_database_fingerprints"
+
+    stage = Column(String, primary_key=True)
+    fingerprint = Column(String)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} stage="{self.stage}" '
+            f'fingerprint="{self.fingerprint}">'
+        )
+
+    def dump(self) -> Dict[str, str]:
+        return {
+            "stage": self.stage,
+            "fingerprint": self.fingerprint,
+        }
+
+
+def _describe_table(table: Table, dialect: Dialect) -> List[str]:
+    """Describe the parts of the table that are created by ``create_all``."""
+    lines: List[str] = [f"table {table.name}"]
+    for column in table.columns:
+        lines.append(
+            f"column {column.name} {column.type.compile(dialect=dialect)} "
+            f"nullable={column.nullable} primary_key={column.primary_key}"
+        )
+    for index in sorted(table.indexes, key=lambda i: i.name or ""):
+        columns: str = ",".join(c.name for c in index.columns)
+        lines.append(f"index {index.name} ({columns}) unique={index.unique}")
+    for constraint in sorted(table.constraints, key=lambda c: repr(c)):
+        columns: str = ",".join(c.name for c in constraint.columns)
+        lines.append(f"constraint {type(constraint).__name__} ({columns})")
+    return lines
+
+
+def get_fingerprint(metadata: MetaData, dialect: Dialect) -> str:
+    """Compute fingerprint of declared tables.
+
+    :param metadata: Metadata containing the declared tables.
+    :param dialect: Dialect used to render the column types.
+    :return: SHA-256 of the description of all tables.
+    """
+    h = hashlib.sha256()
+    for name in sorted(metadata.tables.keys()):
+        for line in _describe_table(metadata.tables[name], dialect):
+            h.update(line.encode("utf-8"))
+            h.update(b"\n")
+    return h.hexdigest()
+
+
+def _get_stored(stage: str) -> Optional[str]:
+    """Get stored fingerprint.
+
+    :return: The fingerprint or ``None`` if it is not known, e.g. because the
+        fingerprint table does not exist yet.
+    """
+    table: Table = SchemaFingerprint.__table__
+    try:
+        with database.db.connect() as connection:
+            return connection.execute(
+                select(table.c.fingerprint).where(table.c.stage == stage)
+            ).scalar_one_or_none()
+    except DBAPIError:
+        return None
+
+
+def _store(stage: str, fingerprint: str) -> None:
+    table: Table = SchemaFingerprint.__table__
+    with database.db.begin() as connection:
+        connection.execute(delete(table).where(table.c.stage == stage))
+        connection.execute(table.insert().values(stage=stage, fingerprint=fingerprint))
+
+
+def create_tables(stage: str) -> bool:
+    """Create declared tables if they changed since the last start.
+
+    :param stage: Name of the startup stage. Each stage has a different set of
+        declared tables, so their fingerprints are stored separately.
+    :return: Whether the tables had to be created.
+
+    ``create_all`` checks every table in the database before it creates the
+    missing ones, which is slow on PostgreSQL with many modules. When the
+    fingerprint of the declared tables matches the stored one, nothing could
+    have changed and the check is skipped.
+    """
+    fingerprint: str = get_fingerprint(database.base.metadata, database.db.dialect)
+    if _get_stored(stage) == fingerprint:
+        return False
+
+    database.base.metadata.create_all(database.db)
+    _store(stage, fingerprint)
+    print(
+        f"Database tables of stage {COLOR.green}{stage}{COLOR.none} "
+        "created or verified."
+    )  # noqa: T001
+    return True
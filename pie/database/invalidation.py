@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    String,
+    delete,
+    event,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.exc import DBAPIError
+
+from pie import metrics
+from pie.cli import COLOR
+from pie.database import _getenv_int, database, session
+
+Subscriber = Callable[[str, Optional[str]], None]
+
+# Name of the PostgreSQL notification channel
+CHANNEL: str = "pie_invalidation"
+
+# Identifier of this process, so it does not receive its own changes twice
+ORIGIN: str = uuid.uuid4().hex
+
+_subscribers: Dict[str, List[Subscriber]] = {}
+_statistics: Dict[str, int] = {"published": 0, "received": 0, "reconnects": 0}
+
+
+class Change(database.base):
+    """Change of a table, used to notify other processes on SQLite.
+
+    PostgreSQL delivers the changes with ``NOTIFY`` and does not use this
+    table.
+    """
+
+    __tablename__ = "pie_database_changes"
+
+    idx = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String)
+    table = Column(String)
+    key = Column(String, default=None)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} idx="{self.idx}" origin="{self.origin}" '
+            f'table="{self.table}" key="{self.key}" timestamp="{self.timestamp}">'
+        )
+
+    def dump(self) -> Dict[str, Union[int, str, datetime.datetime]]:
+        return {
+            "idx": self.idx,
+            "origin": self.origin,
+            "table": self.table,
+            "key": self.key,
+            "timestamp": self.timestamp,
+        }
+
+
+def subscribe(table: str, subscriber: Subscriber) -> None:
+    """Call the function when the table changes in any process.
+
+    :param table: Name of the table.
+    :param subscriber: Function taking the table name and the key of the
+        change. The key is ``None`` when anything in the table may have
+        changed.
+
+    The function is called from the event loop right after the change is
+    committed. It should only drop cached values; it must not use the
+    database session, which may be in the middle of a commit.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie.database import invalidation
+
+        invalidation.subscribe(
+            "language_members", lambda table, key: cache.clear()
+        )
+    """
+    subscribers = _subscribers.setdefault(table, [])
+    if subscriber not in subscribers:
+        subscribers.append(subscriber)
+
+
+def unsubscribe(table: str, subscriber: Subscriber) -> None:
+    """Stop calling the function on changes of the table."""
+    if subscriber in _subscribers.get(table, []):
+        _subscribers[table].remove(subscriber)
+
+
+def publish(table: str, key: Optional[Union[int, str]] = None) -> None:
+    """Announce a change of the table.
+
+    :param table: Name of the table.
+    :param key: What changed, e.g. the guild ID. Use ``None`` if the change
+        may affect anything in the table.
+
+    The change is announced when the current transaction of the session is
+    committed, and dropped when it is rolled back. Call it from model methods
+    that write, before they commit:
+
+    .. code-block:: python
+        :linenos:
+
+        @staticmethod
+        def set(guild_id: int, language: str):
+            ...
+            invalidation.publish(GuildLanguage.__tablename__, guild_id)
+            session.commit()
+    """
+    if not session.in_transaction():
+        # Bind the change to a transaction, so rollback drops it
+        session.begin()
+    changes: Set[Tuple[str, Optional[str]]] = session.info.setdefault(
+        "pie_invalidation", set()
+    )
+    changes.add((table, None if key is None else str(key)))
+
+
+def _deliver(table: str, key: Optional[str]) -> None:
+    for subscriber in list(_subscribers.get(table, [])):
+        try:
+            subscriber(table, key)
+        except Exception as exc:
+            print(
+                f"Invalidation subscriber of {COLOR.red}{table}{COLOR.none} failed: "
+                f"{COLOR.cursive}{exc}{COLOR.none}."
+            )  # noqa: T001
+
+
+def _deliver_all() -> None:
+    """Invalidate everything, used when some changes may have been missed."""
+    for table in list(_subscribers.keys()):
+        _deliver(table, None)
+
+
+def _before_commit(session_) -> None:
+    changes: Set[Tuple[str, Optional[str]]] = session_.info.get("pie_invalidation")
+    if not changes:
+        return
+
+    # The announcements are part of the transaction, so other processes
+    # receive them only if the changes are committed.
+    if database.db.dialect.name == "postgresql":
+        for table, key in changes:
+            payload = json.dumps({"origin": ORIGIN, "table": table, "key": key})
+            session_.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": payload},
+            )
+    else:
+        session_.execute(
+            Change.__table__.insert(),
+            [{"origin": ORIGIN, "table": table, "key": key} for table, key in changes],
+        )
+
+
+def _after_commit(session_) -> None:
+    changes: Set[Tuple[str, Optional[str]]] = session_.info.pop(
+        "pie_invalidation", set()
+    )
+    for table, key in changes:
+        _statistics["published"] += 1
+        _deliver(table, key)
+
+
+def _after_rollback(session_) -> None:
+    session_.info.pop("pie_invalidation", None)
+
+
+event.listen(session, "before_commit", _before_commit)
+event.listen(session, "after_commit", _after_commit)
+event.listen(session, "after_rollback", _after_rollback)
+
+
+def _receive(origin: str, table: str, key: Optional[str]) -> None:
+    if origin == ORIGIN:
+        return
+    _statistics["received"] += 1
+    _deliver(table, key)
+
+
+class _PostgresListener:
+    """Receive changes with PostgreSQL ``LISTEN``.
+
+    The listener uses its own connection outside of the pool and waits for
+    notifications on the event loop, without polling the database.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, retry: float):
+        self.loop = loop
+        self.retry: float = retry
+        self.connection = None
+
+    def connect(self) -> None:
+        connection = database.db.raw_connection()
+        # Keep the connection for the whole lifetime of the listener
+        connection.detach()
+        connection.dbapi_connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute(f"LISTEN {CHANNEL}")
+        cursor.close()
+
+        self.connection = connection
+        self.loop.add_reader(connection.dbapi_connection.fileno(), self.read)
+
+    def read(self) -> None:
+        dbapi_connection = self.connection.dbapi_connection
+        try:
+            dbapi_connection.poll()
+        except Exception as exc:
+            print(
+                "Invalidation listener lost its connection: "
+                f"{COLOR.cursive}{exc}{COLOR.none}."
+            )  # noqa: T001
+            self.disconnect()
+            self.loop.call_later(self.retry, self.reconnect)
+            return
+
+        while dbapi_connection.notifies:
+            notify = dbapi_connection.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+                _receive(payload["origin"], payload["table"], payload["key"])
+            except (ValueError, KeyError):
+                continue
+
+    def reconnect(self) -> None:
+        try:
+            self.connect()
+        except DBAPIError:
+            self.loop.call_later(self.retry, self.reconnect)
+            return
+        _statistics["reconnects"] += 1
+        # Changes made while the connection was down were not delivered
+        _deliver_all()
+
+    def disconnect(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            self.loop.remove_reader(self.connection.dbapi_connection.fileno())
+            self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+
+
+class _ChangePoller:
+    """Receive changes by reading the change table periodically.
+
+    :param interval: Seconds between the reads.
+    :param retention: Seconds after which the changes are deleted.
+    """
+
+    def __init__(self, interval: float, retention: float):
+        self.interval: float = interval
+        self.retention: float = retention
+        self.last_idx: int = 0
+        self.last_cleanup: float = 0.0
+
+    def start(self) -> None:
+        with database.db.connect() as connection:
+            self.last_idx = (
+                connection.execute(select(func.max(Change.__table__.c.idx))).scalar()
+                or 0
+            )
+
+    def poll(self) -> None:
+        table = Change.__table__
+        with database.db.connect() as connection:
+            rows = connection.execute(
+                select(table.c.idx, table.c.origin, table.c.table, table.c.key)
+                .where(table.c.idx > self.last_idx)
+                .order_by(table.c.idx)
+            ).all()
+        for idx, origin, table_name, key in rows:
+            self.last_idx = idx
+            _receive(origin, table_name, key)
+
+        if time.monotonic() - self.last_cleanup > self.retention / 10:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        table = Change.__table__
+        threshold = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=self.retention
+        )
+        with database.db.begin() as connection:
+            connection.execute(delete(table).where(table.c.timestamp < threshold))
+        self.last_cleanup = time.monotonic()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.poll()
+            except DBAPIError as exc:
+                print(
+                    "Invalidation poller failed: " f"{COLOR.cursive}{exc}{COLOR.none}."
+                )  # noqa: T001
+
+
+_listener: Optional[_PostgresListener] = None
+_poller_task: Optional[asyncio.Task] = None
+
+
+def start() -> None:
+    """Start receiving changes from other processes.
+
+    It has to be called from the running event loop. PostgreSQL delivers the
+    changes immediately, SQLite reads them every ``DB_INVALIDATION_INTERVAL``
+    seconds (``2`` by default) and keeps them for
+    ``DB_INVALIDATION_RETENTION`` seconds (``3600`` by default).
+    """
+    global _listener, _poller_task
+
+    loop = asyncio.get_running_loop()
+    if database.db.dialect.name == "postgresql":
+        _listener = _PostgresListener(loop, retry=5)
+        _listener.connect()
+        return
+
+    poller = _ChangePoller(
+        interval=_getenv_int("DB_INVALIDATION_INTERVAL", 2),
+        retention=_getenv_int("DB_INVALIDATION_RETENTION", 3600),
+    )
+    poller.start()
+    _poller_task = loop.create_task(poller.run(), name="pie.database.invalidation")
+
+
+def get_statistics() -> Dict[str, int]:
+    """Get number of published and received changes."""
+    return dict(_statistics)
+
+
+metrics.register("database.invalidation", get_statistics)
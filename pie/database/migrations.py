@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import Column, Integer, String, Table, delete, func, select
+from sqlalchemy.engine import Connection
+
+from pie.cli import COLOR
+from pie.database import database, session
+
+MigrationFunction = Callable[[Connection], None]
+
+
+class SchemaVersion(database.base):
+    """Version of the schema of core package or module.
+
+    The version is the number of the last applied migration, see
+    :func:`migration`.
+    """
+
+    __tablename__ = "pie_database_migrations"
+
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} scope="{self.scope}" '
+            f'version="{self.version}">'
+        )
+
+    def dump(self) -> Dict[str, object]:
+        return {
+            "scope": self.scope,
+            "version": self.version,
+        }
+
+
+class Migration:
+    """Registered migration.
+
+    :param scope: Package or module the migration belongs to.
+    :param version: Version of the schema after the migration is applied.
+    :param function: Function performing the migration.
+    """
+
+    __slots__ = ("scope", "version", "function")
+
+    def __init__(self, scope: str, version: int, function: MigrationFunction):
+        self.scope: str = scope
+        self.version: int = version
+        self.function: MigrationFunction = function
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} scope='{self.scope}' "
+            f"version='{self.version}' function='{self.function.__name__}'>"
+        )
+
+
+_migrations: Dict[str, Dict[int, Migration]] = {}
+
+
+def _get_scope(module_name: str) -> str:
+    """Translate the Python module name to the migration scope.
+
+    ``pie.acl.database`` becomes ``pie.acl`` and
+    ``modules.base.base.database`` becomes ``base.base``.
+    """
+    if module_name.startswith("modules."):
+        module_name = module_name[len("modules.") :]
+    if module_name.endswith(".database"):
+        module_name = module_name[: -len(".database")]
+    return module_name
+
+
+def migration(
+    version: int, *, scope: Optional[str] = None
+) -> Callable[[MigrationFunction], MigrationFunction]:
+    """Register a schema migration.
+
+    :param version: Version of the schema after the migration is applied.
+        The first migration of each scope has version ``1``, the following
+        ones increment it by one.
+    :param scope: Package or module the migration belongs to. It is derived
+        from the name of the Python module by default, so migrations defined
+        in ``modules/base/base/database.py`` have the scope ``base.base``.
+
+    Migrations are run when the bot starts, after the tables have been
+    created. Each of them runs in its own transaction and is applied only
+    once, the version is remembered in the database.
+
+    The migrations have to be safe to run against freshly created tables as
+    well, because new installations apply all of them too.
+
+    .. code-block:: python
+        :linenos:
+
+        from sqlalchemy import Index
+
+        from pie.database import database, migrations
+
+
+        class Reminder(database.base):
+            __tablename__ = "fun_reminder_reminders"
+            ...
+            __table_args__ = (Index("ix_fun_reminder_reminders_date", date),)
+
+
+        @migrations.migration(1)
+        def add_date_index(connection):
+            migrations.create_indexes(connection, Reminder.__table__)
+    """
+
+    def decorator(function: MigrationFunction) -> MigrationFunction:
+        migration_scope: str = scope or _get_scope(function.__module__)
+        migrations = _migrations.setdefault(migration_scope, {})
+        if version in migrations and migrations[version].function is not function:
+            raise ValueError(
+                f"Migration {version} of '{migration_scope}' is already registered."
+            )
+        migrations[version] = Migration(migration_scope, version, function)
+        return function
+
+    return decorator
+
+
+def _get_versions() -> Dict[str, int]:
+    query = session.query(SchemaVersion).all()
+    return {item.scope: item.version for item in query}
+
+
+def _get_pending(scope: str, version: int) -> List[Migration]:
+    migrations: Dict[int, Migration] = _migrations.get(scope, {})
+    pending = [m for v, m in sorted(migrations.items()) if v > version]
+
+    expected: int = version + 1
+    for item in pending:
+        if item.version != expected:
+            raise ValueError(
+                f"Migrations of '{scope}' are not continuous: "
+                f"expected version {expected}, got {item.version}."
+            )
+        expected += 1
+    return pending
+
+
+def upgrade() -> None:
+    """Apply all registered migrations that have not been applied yet."""
+    versions: Dict[str, int] = _get_versions()
+    session.commit()
+
+    for scope in sorted(_migrations.keys()):
+        for item in _get_pending(scope, versions.get(scope, 0)):
+            try:
+                with database.db.begin() as connection:
+                    item.function(connection)
+                    connection.execute(
+                        delete(SchemaVersion.__table__).where(
+                            SchemaVersion.__table__.c.scope == scope
+                        )
+                    )
+                    connection.execute(
+                        SchemaVersion.__table__.insert().values(
+                            scope=scope, version=item.version
+                        )
+                    )
+            except Exception as exc:
+                print(
+                    f"Database migration {COLOR.red}{scope} {item.version}{COLOR.none} "
+                    f"failed: {COLOR.cursive}{exc}{COLOR.none}."
+                )  # noqa: T001
+                raise
+            print(
+                f"Database migration {COLOR.green}{scope} {item.version}{COLOR.none} "
+                f"({item.function.__name__}) applied."
+            )  # noqa: T001
+
+
+# Helper functions for migrations
+
+
+def create_indexes(connection: Connection, *tables: Table) -> None:
+    """Create indexes declared on the tables that do not exist yet.
+
+    :param connection: Connection of the migration.
+    :param tables: Tables whose indexes should be created.
+
+    Duplicate rows are removed before a unique index is created, the oldest
+    row (the one with the lowest primary key) is kept.
+    """
+    for table in tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.unique:
+                remove_duplicates(connection, table, [c.name for c in index.columns])
+            index.create(connection, checkfirst=True)
+
+
+def remove_duplicates(
+    connection: Connection, table: Table, columns: Sequence[str]
+) -> int:
+    """Remove rows that share values of the columns.
+
+    :param connection: Connection of the migration.
+    :param table: Table to be cleaned.
+    :param columns: Names of columns that should be unique together.
+    :return: Number of removed rows.
+
+    The table has to have single-column primary key. The row with the lowest
+    primary key is kept, the others are deleted.
+    """
+    primary_key = list(table.primary_key.columns)[0]
+    keep = select(func.min(primary_key)).group_by(*[table.c[name] for name in columns])
+    result = connection.execute(delete(table).where(primary_key.not_in(keep)))
+    return result.rowcount
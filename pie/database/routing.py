@@ -0,0 +1,160 @@
+import contextlib
+import contextvars
+import functools
+import time
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+F = TypeVar("F", bound=Callable)
+
+_read_only: contextvars.ContextVar = contextvars.ContextVar(
+    "pie_database_read_only", default=False
+)
+_primary: contextvars.ContextVar = contextvars.ContextVar(
+    "pie_database_primary", default=False
+)
+
+
+def read_only(function: F) -> F:
+    """Allow statements of the function to be sent to the read replica.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie.database import read_only
+
+        class Reminder(database.base):
+            ...
+
+            @staticmethod
+            @read_only
+            def get(guild_id: int, idx: int) -> Optional[Reminder]:
+                ...
+
+    Only use it for methods that do not write and whose callers can live with
+    data that is a few moments old. Statements are still sent to the primary
+    database while the session has uncommitted writes and shortly after they
+    are committed, see :class:`RoutingSession`.
+
+    Values loaded into a :class:`~pie.cache.Cache` bound to tables are always
+    read from the primary database, see :func:`primary`.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary() -> Iterator[None]:
+    """Send all statements of the block to the primary database.
+
+    :func:`read_only` methods called inside the block do not use the replica.
+    Caches use it when they load values: the load usually follows an
+    invalidation announced by another process, and a lagging replica could
+    still return the old row, which would then stay cached.
+    """
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class RoutingSession(Session):
+    """Session that sends reads of :func:`read_only` methods to a replica.
+
+    :param replica: Engine of the read replica. When it is ``None``, all
+        statements go to the primary database.
+    :param stickiness: Seconds after a committed write during which the reads
+        stay on the primary database, so the code reads its own writes even
+        if the replica lags behind.
+
+    Flushes, writes, reads outside of :func:`read_only` methods and reads in
+    transactions that already wrote something always use the primary
+    database.
+    """
+
+    def __init__(
+        self,
+        *args,
+        replica: Optional[Engine] = None,
+        stickiness: float = 0.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.replica: Optional[Engine] = replica
+        self.stickiness: float = stickiness
+
+        self._write_pending: bool = False
+        self._last_write: Optional[float] = None
+        self.routed_to_replica: int = 0
+        self.routed_to_primary: int = 0
+
+        event.listen(self, "after_flush", self._after_write)
+        event.listen(self, "do_orm_execute", self._do_orm_execute)
+        event.listen(self, "after_commit", self._after_commit)
+        event.listen(self, "after_rollback", self._after_rollback)
+
+    def _after_write(self, *args) -> None:
+        self._write_pending = True
+
+    def _do_orm_execute(self, orm_execute_state) -> None:
+        if not orm_execute_state.is_select:
+            self._write_pending = True
+
+    def _after_commit(self, session: Session) -> None:
+        if self._write_pending:
+            self._last_write = time.monotonic()
+        self._write_pending = False
+
+    def _after_rollback(self, session: Session) -> None:
+        self._write_pending = False
+
+    def is_sticky(self) -> bool:
+        """Whether the reads have to stay on the primary database."""
+        if self._write_pending:
+            return True
+        if self._last_write is None:
+            return False
+        return time.monotonic() - self._last_write < self.stickiness
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.replica is None or not _read_only.get():
+            return primary
+
+        if (
+            _primary.get()
+            or self._flushing
+            or getattr(clause, "is_dml", False)
+            or self.is_sticky()
+        ):
+            self.routed_to_primary += 1
+            return primary
+
+        self.routed_to_replica += 1
+        return self.replica
+
+    def get_routing_statistics(self) -> Dict[str, int]:
+        """Get number of reads of :func:`read_only` methods per database.
+
+        :return: Reads sent to the replica and reads kept on the primary
+            database because of recent writes. Empty dictionary is returned
+            if there is no replica.
+        """
+        if self.replica is None:
+            return {}
+        return {
+            "replica": self.routed_to_replica,
+            "primary": self.routed_to_primary,
+        }
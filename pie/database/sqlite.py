@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements that take the SQLite write lock
+WRITE_STATEMENTS = (
+    "INSERT",
+    "UPDATE",
+    "DELETE",
+    "REPLACE",
+    "CREATE",
+    "DROP",
+    "ALTER",
+)
+
+
+class WriterQueue:
+    """Serialize write transactions of the process.
+
+    SQLite allows only one writer at a time. When two connections try to
+    write, the second one sleeps and retries until the busy timeout expires.
+    The queue makes writers wait for each other in Python instead, so the
+    lock is handed over as soon as the previous transaction ends.
+
+    The lock is taken by the first write statement of a transaction and
+    released when the connection is returned to the pool, which the ORM
+    session does after every commit and rollback. It is also released when
+    the connection is reset, invalidated, detached or closed.
+
+    All coroutines of the bot use the one ORM session, and thus one connection
+    at a time, so their writes are serialized by the session itself. The
+    queue orders them with writers in worker threads. The event loop never
+    waits for the lock, because that would stop the whole bot: when a worker
+    thread holds it, the write goes on and SQLite's own locking takes over.
+
+    :param timeout: Seconds to wait for the lock. When it expires, the write
+        continues and SQLite's own locking takes over.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout: float = timeout
+        self._lock = threading.Lock()
+        # DBAPI connection holding the lock
+        self._owner: Optional[Any] = None
+
+        self.writes: int = 0
+        self.waits: int = 0
+        self.wait_time: float = 0.0
+        self.skipped: int = 0
+
+    def acquire(self, connection: Any) -> bool:
+        """Take the writer lock for the connection.
+
+        :param connection: DBAPI connection that is going to write.
+        :return: Whether the lock was taken by this call.
+        """
+        if self._owner is connection:
+            return False
+
+        if not self._lock.acquire(blocking=False):
+            if _is_event_loop_thread():
+                self.skipped += 1
+                return False
+
+            start: float = time.monotonic()
+            acquired: bool = self._lock.acquire(timeout=self.timeout)
+            self.waits += 1
+            self.wait_time += time.monotonic() - start
+            if not acquired:
+                return False
+
+        self._owner = connection
+        self.writes += 1
+        return True
+
+    def release(self, connection: Any) -> None:
+        """Hand the writer lock over to the next transaction.
+
+        :param connection: DBAPI connection that has finished its transaction.
+            Nothing happens if it does not hold the lock.
+        """
+        if connection is None or self._owner is not connection:
+            return
+        self._owner = None
+        self._lock.release()
+
+    def get_statistics(self) -> Dict[str, Union[int, float]]:
+        return {
+            "writes": self.writes,
+            "waits": self.waits,
+            "wait_time": self.wait_time,
+            "skipped": self.skipped,
+        }
+
+
+def _is_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _is_write(statement: str) -> bool:
+    return statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+def install(engine: Engine, pragmas: Dict[str, str], timeout: float) -> WriterQueue:
+    """Apply SQLite pragmas and serialize writes of the engine.
+
+    :param engine: Engine connected to SQLite database.
+    :param pragmas: Pragmas to be set on every new connection, e.g.
+        ``{"journal_mode": "WAL"}``.
+    :param timeout: Seconds to wait for other writers.
+    :return: The writer queue of the engine.
+    """
+    queue = WriterQueue(timeout)
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    def acquire(conn, cursor, statement, parameters, context, executemany):
+        if _is_write(statement):
+            queue.acquire(cursor.connection)
+
+    def release(dbapi_connection, *args):
+        queue.release(dbapi_connection)
+
+    event.listen(engine, "connect", set_pragmas)
+    event.listen(engine, "before_cursor_execute", acquire)
+    for name in (
+        "checkin",
+        "reset",
+        "invalidate",
+        "soft_invalidate",
+        "detach",
+        "close",
+    ):
+        event.listen(engine, name, release)
+    return queue
@@ -0,0 +1,274 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import discord
+from discord.ext import commands
+
+from pie import metrics
+
+MessageHandler = Callable[[discord.Message], Awaitable[None]]
+ReactionHandler = Callable[[discord.RawReactionActionEvent], Awaitable[None]]
+
+
+class Subscription:
+    """Handler of messages or reactions and the events it is interested in.
+
+    :param kind: ``message`` or ``reaction``.
+    :param name: Name used in the metrics.
+    :param handler: Coroutine function taking the event.
+    :param channels: IDs of channels the events have to come from.
+    :param emojis: Names of the reaction emojis.
+    :param prefixes: Prefixes of the message content.
+
+    Filters that are ``None`` match everything. The event has to match all
+    filters of the subscription.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        handler: Callable[..., Awaitable[None]],
+        *,
+        channels: Optional[Iterable[int]] = None,
+        emojis: Optional[Iterable[str]] = None,
+        prefixes: Optional[Iterable[str]] = None,
+    ):
+        self.kind: str = kind
+        self.name: str = name
+        self.handler = handler
+        self.channels: Optional[Set[int]] = None if channels is None else set(channels)
+        self.emojis: Optional[Set[str]] = None if emojis is None else set(emojis)
+        self.prefixes: Optional[Set[str]] = None if prefixes is None else set(prefixes)
+        self.dispatched: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} kind='{self.kind}' name='{self.name}' "
+            f"dispatched='{self.dispatched}'>"
+        )
+
+    def set_channels(self, channels: Optional[Iterable[int]]) -> None:
+        """Change channels the events have to come from.
+
+        :param channels: Channel IDs, or ``None`` to receive events from all
+            channels.
+        """
+        subscribed: bool = _router.subscriptions.get(self.name) is self
+        if subscribed:
+            _router.remove(self)
+        self.channels = None if channels is None else set(channels)
+        if subscribed:
+            _router.add(self)
+
+    def matches(self, channel_id: int, emoji: Optional[str], content: str) -> bool:
+        if self.channels is not None and channel_id not in self.channels:
+            return False
+        if self.emojis is not None and emoji not in self.emojis:
+            return False
+        if self.prefixes is not None and not any(
+            content.startswith(prefix) for prefix in self.prefixes
+        ):
+            return False
+        return True
+
+
+class _Index:
+    """Subscriptions of one kind, indexed by their most selective filter."""
+
+    def __init__(self):
+        self.by_channel: Dict[int, List[Subscription]] = {}
+        self.by_emoji: Dict[str, List[Subscription]] = {}
+        # Prefixes are indexed by their first character
+        self.by_prefix: Dict[str, List[Subscription]] = {}
+        self.other: List[Subscription] = []
+
+    def _buckets(self, subscription: Subscription) -> List[List[Subscription]]:
+        if subscription.channels is not None:
+            return [
+                self.by_channel.setdefault(channel, [])
+                for channel in subscription.channels
+            ]
+        if subscription.emojis is not None:
+            return [
+                self.by_emoji.setdefault(emoji, []) for emoji in subscription.emojis
+            ]
+        if subscription.prefixes is not None:
+            return [
+                self.by_prefix.setdefault(prefix[:1], [])
+                for prefix in subscription.prefixes
+            ]
+        return [self.other]
+
+    def add(self, subscription: Subscription) -> None:
+        for bucket in self._buckets(subscription):
+            if subscription not in bucket:
+                bucket.append(subscription)
+
+    def remove(self, subscription: Subscription) -> None:
+        for index in (self.by_channel, self.by_emoji, self.by_prefix):
+            for key in list(index.keys()):
+                if subscription in index[key]:
+                    index[key].remove(subscription)
+                if not index[key]:
+                    del index[key]
+        if subscription in self.other:
+            self.other.remove(subscription)
+
+    def find(
+        self, channel_id: int, emoji: Optional[str], content: str
+    ) -> List[Subscription]:
+        candidates: List[Subscription] = list(self.other)
+        candidates += self.by_channel.get(channel_id, [])
+        if emoji is not None:
+            candidates += self.by_emoji.get(emoji, [])
+        if content:
+            candidates += self.by_prefix.get(content[:1], [])
+        # A subscription may be in more buckets, e.g. with more prefixes
+        unique: Dict[int, Subscription] = {id(s): s for s in candidates}
+        return [s for s in unique.values() if s.matches(channel_id, emoji, content)]
+
+
+class _Router:
+    def __init__(self):
+        self.bot: Optional[commands.Bot] = None
+        self.indexes: Dict[str, _Index] = {"message": _Index(), "reaction": _Index()}
+        self.subscriptions: Dict[str, Subscription] = {}
+
+    def add(self, subscription: Subscription) -> None:
+        self.indexes[subscription.kind].add(subscription)
+
+    def remove(self, subscription: Subscription) -> None:
+        self.indexes[subscription.kind].remove(subscription)
+
+    def schedule(self, subscription: Subscription, event) -> None:
+        subscription.dispatched += 1
+        asyncio.get_running_loop().create_task(
+            self.run(subscription, event), name=f"pie.events:{subscription.name}"
+        )
+
+    async def run(self, subscription: Subscription, event) -> None:
+        try:
+            await subscription.handler(event)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            if self.bot is not None:
+                await self.bot.on_error(f"pie.events:{subscription.name}", event)
+
+    async def on_message(self, message: discord.Message) -> None:
+        for subscription in self.indexes["message"].find(
+            message.channel.id, None, message.content
+        ):
+            self.schedule(subscription, message)
+
+    async def on_raw_reaction_add(
+        self, payload: discord.RawReactionActionEvent
+    ) -> None:
+        emoji: Optional[str] = getattr(payload.emoji, "name", None)
+        for subscription in self.indexes["reaction"].find(
+            payload.channel_id, emoji, ""
+        ):
+            self.schedule(subscription, payload)
+
+
+_router = _Router()
+
+
+def setup(bot: commands.Bot) -> None:
+    """Start routing the events of the bot.
+
+    It is called by ``pumpkin.py`` right after the bot is created.
+    """
+    _router.bot = bot
+    bot.add_listener(_router.on_message, "on_message")
+    bot.add_listener(_router.on_raw_reaction_add, "on_raw_reaction_add")
+
+
+def _subscribe(subscription: Subscription) -> Subscription:
+    previous: Optional[Subscription] = _router.subscriptions.get(subscription.name)
+    if previous is not None:
+        _router.remove(previous)
+    _router.subscriptions[subscription.name] = subscription
+    _router.add(subscription)
+    return subscription
+
+
+def subscribe_message(
+    name: str,
+    handler: MessageHandler,
+    *,
+    channels: Optional[Iterable[int]] = None,
+    prefixes: Optional[Iterable[str]] = None,
+) -> Subscription:
+    """Call the handler for new messages.
+
+    :param name: Unique name of the handler, e.g. ``base.base.autothread``.
+    :param handler: Coroutine function taking the message.
+    :param channels: Only call the handler for messages in these channels.
+    :param prefixes: Only call the handler for messages starting with one of
+        these strings.
+
+    Unlike ``commands.Cog.listener``, the handler is only scheduled when the
+    message matches the filters, so the bot does not start a task for every
+    module and every message. Subscribing with the same name again replaces
+    the previous subscription, so it is safe to subscribe from cog
+    constructors.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie import events
+
+        class Reminder(commands.Cog):
+            def __init__(self, bot):
+                self.subscription = events.subscribe_message(
+                    "fun.reminder", self.on_remind, prefixes=("remind me",)
+                )
+
+            def cog_unload(self):
+                events.unsubscribe(self.subscription)
+    """
+    return _subscribe(
+        Subscription("message", name, handler, channels=channels, prefixes=prefixes)
+    )
+
+
+def subscribe_reaction(
+    name: str,
+    handler: ReactionHandler,
+    *,
+    channels: Optional[Iterable[int]] = None,
+    emojis: Optional[Iterable[str]] = None,
+) -> Subscription:
+    """Call the handler for added reactions.
+
+    :param name: Unique name of the handler.
+    :param handler: Coroutine function taking the
+        :class:`~discord.RawReactionActionEvent`.
+    :param channels: Only call the handler for reactions in these channels.
+    :param emojis: Only call the handler for reactions with these emoji names.
+
+    See :func:`subscribe_message`.
+    """
+    return _subscribe(
+        Subscription("reaction", name, handler, channels=channels, emojis=emojis)
+    )
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    """Stop calling the handler of the subscription."""
+    _router.remove(subscription)
+    if _router.subscriptions.get(subscription.name) is subscription:
+        del _router.subscriptions[subscription.name]
+
+
+def get_statistics() -> Dict[str, int]:
+    """Get number of events dispatched to each handler."""
+    return {
+        name: subscription.dispatched
+        for name, subscription in sorted(_router.subscriptions.items())
+    }
+
+
+metrics.register("pie.events", get_statistics)
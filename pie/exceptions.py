@@ -136,3 +136,21 @@ class InsufficientACLevel(ACLFailure):
             f"You need access permissions at least at level {self.required.name}. "
             f"You only have {self.actual.name}."
         )
+
+
+class RateLimitExceeded(CheckFailure):
+    """Raised by rate limit when the command was run too often.
+
+    :param scope: Name of the exhausted scope, e.g. ``user``.
+    :param retry_after: Seconds until the command can be run again.
+    """
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope: str = scope
+        self.retry_after: float = retry_after
+
+    def __str__(self) -> str:
+        return (
+            f"Rate limit of scope {self.scope} reached, "
+            f"retry after {self.retry_after:.1f} seconds."
+        )
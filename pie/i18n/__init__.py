@@ -1,9 +1,9 @@
-import ring
 from pathlib import Path
 from typing import Dict, Optional, Union
 
 import discord
 
+from pie import cache
 from pie.database.config import Config
 from pie.i18n.database import GuildLanguage, MemberLanguage
 
@@ -11,6 +11,15 @@ config = Config.get()
 
 LANGUAGES = ("cs", "sk")
 
+# Language preferences are shared by all translators. They are invalidated
+# when they change, so they can be kept for a long time.
+_user_languages = cache.Cache(
+    "pie.i18n.members", maxsize=10000, ttl=3600, tables=("language_members",)
+)
+_guild_languages = cache.Cache(
+    "pie.i18n.guilds", maxsize=1000, ttl=3600, tables=("language_guilds",)
+)
+
 
 class TranslationContext:
     """Fake class used for translation.
@@ -145,30 +154,18 @@ class Translator:
 
         return Config.get().language
 
-    # While we could be using just functools.lru_cache(), using ring
-    # is a better option, because it allows us to add automatic deletion
-    # into the mix. Because the member can change their preferred language
-    # dynamically, invalidation is a preferred behavior.
-    # In case this expiration value gets changed you should also change
-    # the text in the language module under '[caching]' section.
-    @ring.lru(expire=120)
     def _get_user_language(self, guild_id: int, user_id: int) -> Optional[str]:
-        """Get user's language preference.
-
-        This value may be out-of-sync for two minues after change because of
-        caching.
-        """
-        user = MemberLanguage.get(guild_id, user_id)
-        if getattr(user, "language", None) is not None:
-            return user.language
+        """Get user's language preference."""
+        return _user_languages.get_or_load(
+            (guild_id, user_id),
+            lambda: getattr(MemberLanguage.get(guild_id, user_id), "language", None),
+            tags=(str(guild_id),),
+        )
 
-    @ring.lru(expire=120)
     def _get_guild_language(self, guild_id: int) -> Optional[str]:
-        """Get guild's language preference.
-
-        This value may be out-of-sync for two minues after change because of
-        caching.
-        """
-        guild = GuildLanguage.get(guild_id)
-        if getattr(guild, "language", None) is not None:
-            return guild.language
+        """Get guild's language preference."""
+        return _guild_languages.get_or_load(
+            guild_id,
+            lambda: getattr(GuildLanguage.get(guild_id), "language", None),
+            tags=(str(guild_id),),
+        )
@@ -1,9 +1,17 @@
 from __future__ import annotations
 from typing import Dict, Optional, Union
 
-from sqlalchemy import BigInteger, Column, Integer, String
+from sqlalchemy import BigInteger, Column, Index, Integer, String, bindparam, select
+from sqlalchemy.engine import Connection
 
-from pie.database import database, session
+from pie.database import (
+    database,
+    invalidation,
+    migrations,
+    primary,
+    read_only,
+    session,
+)
 
 
 class GuildLanguage(database.base):
@@ -52,17 +60,21 @@ class GuildLanguage(database.base):
         session.query(GuildLanguage).filter_by(guild_id=guild_id).delete()
 
         session.add(preference)
+        invalidation.publish(GuildLanguage.__tablename__, guild_id)
         session.commit()
         return preference
 
     @staticmethod
+    @read_only
     def get(guild_id: int) -> Optional[GuildLanguage]:
         """Get guild language preference.
 
         :param guild_id: Guild ID.
         :return: Guild language preference or ``None``.
         """
-        query = session.query(GuildLanguage).filter_by(guild_id=guild_id).one_or_none()
+        query = session.execute(
+            _GET_GUILD_LANGUAGE, {"guild_id": guild_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -73,10 +85,18 @@ class GuildLanguage(database.base):
         :return: Number of deleted preferences, always ``0`` or ``1``.
         """
         query = session.query(GuildLanguage).filter_by(guild_id=guild_id).delete()
+        invalidation.publish(GuildLanguage.__tablename__, guild_id)
         session.commit()
         return query
 
 
+# Language is resolved for every translated string, so the lookups use statements
+# that are built once and SQLAlchemy only binds the parameters.
+_GET_GUILD_LANGUAGE = select(GuildLanguage).where(
+    GuildLanguage.guild_id == bindparam("guild_id"),
+)
+
+
 class MemberLanguage(database.base):
     """Language preference of the user.
 
@@ -93,6 +113,10 @@ class MemberLanguage(database.base):
     member_id = Column(BigInteger)
     language = Column(String)
 
+    __table_args__ = (
+        Index("ix_language_members_guild_member", guild_id, member_id, unique=True),
+    )
+
     def __repr__(self) -> str:
         return (
             f'<MemberLanguage idx="{self.idx}" guild_id="{self.guild_id}" '
@@ -124,7 +148,9 @@ class MemberLanguage(database.base):
             responsibility to make sure it has correct value.
         :return: Created member language preference.
         """
-        preference = MemberLanguage.get(guild_id, member_id)
+        # Decides what to write, a lagging replica could miss the row
+        with primary():
+            preference = MemberLanguage.get(guild_id, member_id)
         if preference:
             preference.language = language
         else:
@@ -133,10 +159,12 @@ class MemberLanguage(database.base):
             )
             session.add(preference)
 
+        invalidation.publish(MemberLanguage.__tablename__, guild_id)
         session.commit()
         return preference
 
     @staticmethod
+    @read_only
     def get(guild_id: int, member_id: int) -> Optional[MemberLanguage]:
         """Get member language preference.
 
@@ -144,11 +172,9 @@ class MemberLanguage(database.base):
         :param member_id: Member ID.
         :return: Member language preference or ``None``.
         """
-        query = (
-            session.query(MemberLanguage)
-            .filter_by(guild_id=guild_id, member_id=member_id)
-            .one_or_none()
-        )
+        query = session.execute(
+            _GET_MEMBER_LANGUAGE, {"guild_id": guild_id, "member_id": member_id}
+        ).scalar_one_or_none()
         return query
 
     @staticmethod
@@ -164,5 +190,18 @@ class MemberLanguage(database.base):
             .filter_by(guild_id=guild_id, member_id=member_id)
             .delete()
         )
+        invalidation.publish(MemberLanguage.__tablename__, guild_id)
         session.commit()
         return query
+
+
+_GET_MEMBER_LANGUAGE = select(MemberLanguage).where(
+    MemberLanguage.guild_id == bindparam("guild_id"),
+    MemberLanguage.member_id == bindparam("member_id"),
+)
+
+
+@migrations.migration(1)
+def add_lookup_indexes(connection: Connection) -> None:
+    """Index the columns used to find member language preference."""
+    migrations.create_indexes(connection, MemberLanguage.__table__)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 from typing import Optional, List, Dict
 
-from sqlalchemy import BigInteger, Column, String, Integer
+from sqlalchemy import BigInteger, Column, Index, String, Integer
+from sqlalchemy.engine import Connection
 
-from pie.database import database, session
+from pie.database import database, migrations, session
 
 
 class LogConf(database.base):
@@ -58,6 +59,8 @@ class LogConf(database.base):
     level = Column(Integer)  # integer representation of logging levels
     module = Column(String, default=None)
 
+    __table_args__ = (Index("ix_logging_scope_module_level", scope, module, level),)
+
     @staticmethod
     def _get_subscriptions(
         scope: str,
@@ -221,3 +224,9 @@ class LogConf(database.base):
             f'guild_id="{self.guild_id}" channel_id="{self.channel_id}" '
             f'level="{self.level}" scope="{self.scope}" module="{self.module}">'
         )
+
+
+@migrations.migration(1)
+def add_lookup_indexes(connection: Connection) -> None:
+    """Index the columns used to find log subscriptions."""
+    migrations.create_indexes(connection, LogConf.__table__)
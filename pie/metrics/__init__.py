@@ -0,0 +1,50 @@
+from typing import Callable, Dict, Optional, Union
+
+MetricValue = Union[int, float]
+MetricCollector = Callable[[], Dict[str, MetricValue]]
+
+_collectors: Dict[str, MetricCollector] = {}
+
+
+def register(name: str, collector: MetricCollector) -> None:
+    """Register metric collector.
+
+    :param name: Dotted name of the metric group, e.g. ``database.pool``.
+    :param collector: Function returning the current values of the group.
+
+    The collector is called every time the metrics are requested, so it should
+    only read values that are already computed.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie import metrics
+
+        metrics.register("base.base.autothread", lambda: {"queued": len(queue)})
+
+    Registering the same name again replaces the previous collector, so it is
+    safe to call this from cog constructors that run again on module reload.
+    """
+    _collectors[name] = collector
+
+
+def unregister(name: str) -> None:
+    """Remove metric collector.
+
+    :param name: Name of the metric group.
+    """
+    _collectors.pop(name, None)
+
+
+def collect(prefix: Optional[str] = None) -> Dict[str, Dict[str, MetricValue]]:
+    """Collect current values of registered metrics.
+
+    :param prefix: Only include groups whose name starts with this string.
+    :return: Mapping of group names to their values, sorted by the group name.
+    """
+    result: Dict[str, Dict[str, MetricValue]] = {}
+    for name in sorted(_collectors.keys()):
+        if prefix is not None and not name.startswith(prefix):
+            continue
+        result[name] = _collectors[name]()
+    return result
@@ -0,0 +1,313 @@
+import collections
+import enum
+import time
+from typing import Callable, Dict, Hashable, Optional, OrderedDict, Tuple, TypeVar
+
+from discord.ext import commands
+
+import pie._tracing
+from pie import cache, metrics
+from pie.exceptions import RateLimitExceeded
+from pie.ratelimit.database import RateLimit
+
+T = TypeVar("T")
+
+_trace: Callable = pie._tracing.register("pie_ratelimit")
+
+
+class Scope(enum.Enum):
+    """What shares one bucket of tokens."""
+
+    USER = "user"
+    CHANNEL = "channel"
+    GUILD = "guild"
+    COMMAND = "command"
+
+    def get_key(self, ctx: commands.Context) -> int:
+        """Get ID of the user, channel or guild the invocation is counted to."""
+        if self is Scope.USER:
+            return ctx.author.id
+        if self is Scope.CHANNEL:
+            return ctx.channel.id
+        if self is Scope.GUILD:
+            # Direct messages are limited per channel
+            return ctx.guild.id if ctx.guild is not None else ctx.channel.id
+        return 0
+
+
+class Limit:
+    """Number of invocations allowed in a period.
+
+    :param scope: What shares the invocations.
+    :param rate: Number of invocations.
+    :param per: Number of seconds.
+    """
+
+    __slots__ = ("scope", "rate", "per")
+
+    def __init__(self, scope: Scope, rate: int, per: float):
+        self.scope: Scope = scope
+        self.rate: int = rate
+        self.per: float = per
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} scope='{self.scope.value}' "
+            f"rate='{self.rate}' per='{self.per}'>"
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Limit):
+            return NotImplemented
+        return (self.scope, self.rate, self.per) == (other.scope, other.rate, other.per)
+
+
+class TokenBucket:
+    """Tokens of one scope key.
+
+    The bucket holds up to ``rate`` tokens and gets one back every
+    ``per / rate`` seconds. Each invocation takes one token.
+    """
+
+    __slots__ = ("rate", "per", "tokens", "updated")
+
+    def __init__(self, rate: int, per: float, now: float):
+        self.rate: int = rate
+        self.per: float = per
+        self.tokens: float = float(rate)
+        self.updated: float = now
+
+    def refill(self, now: float) -> None:
+        elapsed: float = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.rate, self.tokens + elapsed * self.rate / self.per)
+        self.updated = now
+
+    def consume(self, now: float) -> float:
+        """Take one token.
+
+        :return: ``0`` if the token was taken, otherwise the number of seconds
+            until there is one.
+        """
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * self.per / self.rate
+
+    def is_idle(self, now: float) -> bool:
+        """Whether the bucket would be full, so it can be forgotten."""
+        return now - self.updated >= self.per
+
+
+class Limiter:
+    """Token buckets of all commands.
+
+    :param maxsize: Maximal number of buckets. When it is reached, the least
+        recently used bucket is dropped.
+    :param sweep_interval: Seconds between removals of idle buckets.
+
+    Idle buckets are full again, so dropping them does not change anything:
+    a new bucket would be full as well.
+    """
+
+    def __init__(self, *, maxsize: int = 100000, sweep_interval: float = 60):
+        self.maxsize: int = maxsize
+        self.sweep_interval: float = sweep_interval
+        self.buckets: OrderedDict[Hashable, TokenBucket] = collections.OrderedDict()
+        self.statistics: Dict[str, int] = {
+            "hits": 0,
+            "limited": 0,
+            "evictions": 0,
+            "idle": 0,
+        }
+        self.limited: Dict[str, int] = {}
+        self._last_sweep: float = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def hit(
+        self, command: str, limit: Limit, key: Hashable, now: Optional[float] = None
+    ) -> float:
+        """Count the invocation.
+
+        :param command: Qualified name of the command.
+        :param limit: Limit of the command.
+        :param key: Key of the bucket, see :meth:`Scope.get_key`.
+        :return: ``0`` if the invocation is allowed, otherwise the number of
+            seconds until it is.
+        """
+        now = time.monotonic() if now is None else now
+        self._sweep(now)
+
+        bucket_key: Tuple[str, str, Hashable] = (command, limit.scope.value, key)
+        bucket: Optional[TokenBucket] = self.buckets.get(bucket_key)
+        if bucket is None or bucket.rate != limit.rate or bucket.per != limit.per:
+            bucket = TokenBucket(limit.rate, limit.per, now)
+            self.buckets[bucket_key] = bucket
+            while len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+                self.statistics["evictions"] += 1
+        else:
+            self.buckets.move_to_end(bucket_key)
+
+        self.statistics["hits"] += 1
+        retry_after: float = bucket.consume(now)
+        if retry_after:
+            self.statistics["limited"] += 1
+            self.limited[command] = self.limited.get(command, 0) + 1
+        return retry_after
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for bucket_key, bucket in list(self.buckets.items()):
+            if bucket.is_idle(now):
+                del self.buckets[bucket_key]
+                self.statistics["idle"] += 1
+        _trace(f"Swept idle buckets, {len(self.buckets)} left.")
+
+    def clear(self) -> None:
+        self.buckets.clear()
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Get number of buckets and invocations."""
+        return {"buckets": len(self.buckets), **self.statistics}
+
+
+_LIMITER = Limiter()
+
+_limits = cache.Cache(
+    "pie.ratelimit.limits", maxsize=10000, tables=(RateLimit.__tablename__,)
+)
+
+
+def get_limits(guild_id: int) -> Dict[str, Limit]:
+    """Get limits set in the guild.
+
+    :return: Mapping of qualified command names to their limits.
+    """
+
+    def load() -> Dict[str, Limit]:
+        return {
+            limit.command: Limit(Scope(limit.scope), limit.rate, limit.per)
+            for limit in RateLimit.get_all(guild_id)
+        }
+
+    return _limits.get_or_load(guild_id, load, tags=(str(guild_id),))
+
+
+def get_limit(
+    guild_id: Optional[int], command: str, default: Optional[Limit]
+) -> Optional[Limit]:
+    """Get limit of the command in the guild.
+
+    :param guild_id: Guild ID, or ``None`` in direct messages.
+    :param command: Qualified name of the command.
+    :param default: Limit of the command decorator, or ``None`` if the command
+        does not have it.
+    """
+    if guild_id is None:
+        return default
+    return get_limits(guild_id).get(command, default)
+
+
+def _run(ctx: commands.Context, default: Optional[Limit]) -> bool:
+    # Do not count invocations in help
+    if ctx.invoked_with == "help":
+        return True
+
+    if getattr(ctx.bot, "owner_id", 0) == ctx.author.id:
+        _trace("Owner, invocation allowed.")
+        return True
+    if ctx.author.id in getattr(ctx.bot, "owner_ids", set()):
+        _trace("Owners, invocation allowed.")
+        return True
+
+    command: str = ctx.command.qualified_name
+    guild_id: Optional[int] = getattr(ctx.guild, "id", None)
+    limit: Optional[Limit] = get_limit(guild_id, command, default)
+    if limit is None:
+        return True
+    retry_after: float = _LIMITER.hit(
+        command, limit, (guild_id, limit.scope.get_key(ctx))
+    )
+    if retry_after:
+        _trace(f"[{command}] Blocked for {retry_after:.1f} seconds.")
+        raise RateLimitExceeded(limit.scope.value, retry_after)
+
+    _trace(f"[{command}] Invocation allowed.")
+    return True
+
+
+def ratelimit(rate: int, per: float, scope: Scope = Scope.USER) -> Callable[[T], T]:
+    """A decorator that limits how often the command can be run.
+
+    :param rate: Number of invocations allowed.
+    :param per: Number of seconds.
+    :param scope: Whether the invocations are counted per user, channel,
+        guild, or for the whole command.
+
+    Guilds can change the limit with the ``ratelimit set`` command. When the
+    limit is exceeded, :class:`~pie.exceptions.RateLimitExceeded` is raised.
+    Commands without the decorator are only limited when the guild sets their
+    limit, see :func:`setup`.
+
+    The checks run from the top, put the decorator below ``check.acl2``, so
+    invocations that are not allowed anyway do not take tokens.
+
+    .. code-block:: python
+        :linenos:
+
+        from pie import check
+
+        ...
+
+        @check.acl2(check.ACLevel.MEMBER)
+        @check.ratelimit(2, 60, check.Scope.CHANNEL)
+        @commands.command()
+        async def meme(self, ctx):
+            ...
+    """
+    default = Limit(scope, rate, per)
+
+    def predicate(ctx: commands.Context) -> bool:
+        return _run(ctx, default)
+
+    # Commands with the decorator are skipped by the hook of the bot
+    predicate.ratelimit = default
+    return commands.check(predicate)
+
+
+def _has_decorator(command: commands.Command) -> bool:
+    return any(
+        isinstance(getattr(check, "ratelimit", None), Limit) for check in command.checks
+    )
+
+
+async def _before_invoke(ctx: commands.Context) -> None:
+    if _has_decorator(ctx.command):
+        return
+    _run(ctx, None)
+
+
+def setup(bot: commands.Bot) -> None:
+    """Enforce limits set by guilds on all commands.
+
+    It is called by ``pumpkin.py`` right after the bot is created.
+
+    The limits are checked just before the command is run, after all its
+    checks passed, so invocations that are denied by ACL do not take tokens.
+    """
+    bot.before_invoke(_before_invoke)
+
+
+def get_command_statistics() -> Dict[str, int]:
+    """Get number of limited invocations of each command."""
+    return dict(sorted(_LIMITER.limited.items()))
+
+
+metrics.register("pie.ratelimit", _LIMITER.get_statistics)
+metrics.register("pie.ratelimit.limited", get_command_statistics)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import BigInteger, Column, Integer, String, UniqueConstraint
+
+from pie.database import database, invalidation, read_only, session
+
+
+class RateLimit(database.base):
+    """Rate limit of a command in a guild.
+
+    It overrides the limit set in the ``check.ratelimit`` decorator of the
+    command: the command can be run ``rate`` times in ``per`` seconds by each
+    user, in each channel, in the whole guild or anywhere, depending on the
+    ``scope``.
+    """
+
+    __tablename__ = "ratelimits"
+
+    idx = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(BigInteger)
+    command = Column(String)
+    scope = Column(String)
+    rate = Column(Integer)
+    per = Column(Integer)
+
+    __table_args__ = (UniqueConstraint(guild_id, command),)
+
+    @staticmethod
+    def set(guild_id: int, command: str, scope: str, rate: int, per: int) -> RateLimit:
+        query = (
+            session.query(RateLimit)
+            .filter_by(guild_id=guild_id, command=command)
+            .one_or_none()
+        )
+        if query is None:
+            query = RateLimit(guild_id=guild_id, command=command)
+        query.scope = scope
+        query.rate = rate
+        query.per = per
+        session.add(query)
+        invalidation.publish(RateLimit.__tablename__, guild_id)
+        session.commit()
+        return query
+
+    @staticmethod
+    @read_only
+    def get(guild_id: int, command: str) -> Optional[RateLimit]:
+        query = (
+            session.query(RateLimit)
+            .filter_by(guild_id=guild_id, command=command)
+            .one_or_none()
+        )
+        return query
+
+    @staticmethod
+    @read_only
+    def get_all(guild_id: int) -> List[RateLimit]:
+        query = session.query(RateLimit).filter_by(guild_id=guild_id).all()
+        return query
+
+    @staticmethod
+    def remove(guild_id: int, command: str) -> int:
+        query = (
+            session.query(RateLimit)
+            .filter_by(guild_id=guild_id, command=command)
+            .delete()
+        )
+        invalidation.publish(RateLimit.__tablename__, guild_id)
+        session.commit()
+        return query
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} idx="{self.idx}" '
+            f'guild_id="{self.guild_id}" command="{self.command}" '
+            f'scope="{self.scope}" rate="{self.rate}" per="{self.per}">'
+        )
+
+    def dump(self) -> Dict[str, Union[int, str]]:
+        return {
+            "guild_id": self.guild_id,
+            "command": self.command,
+            "scope": self.scope,
+            "rate": self.rate,
+            "per": self.per,
+        }
@@ -1,21 +1,236 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
 import configparser
+import functools
 import git
 import hashlib
+import os
 import re
-import subprocess  # nosec: B404
 import sys
+import time
 from pathlib import Path
-from typing import List, Tuple, Optional
-
-from pie.exceptions import RepositoryMetadataError
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pie.exceptions import DotEnvException, RepositoryMetadataError
 
 
 RE_QUOTE = r"(\"|\"\"\"|')"
 RE_NAME = r"[a-z_][0-9a-z_]+"
 RE_NAMES = r"[a-z0-9_,\s" + RE_QUOTE + r"]+"
 
+# GitPython runs git in subprocesses and waits for them, so the operations are
+# run in threads to keep the event loop responsive.
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="pie.repository"
+)
+
+
+async def _run_in_executor(function: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(function, *args, **kwargs)
+    )
+
+
+def _is_shallow(repo: git.repo.base.Repo) -> bool:
+    """Whether the repository was cloned without its whole history."""
+    return (Path(repo.git_dir) / "shallow").is_file()
+
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
+# Parts of git errors telling that the history of a shallow clone is not
+# deep enough
+MISSING_HISTORY_ERRORS: Tuple[str, ...] = (
+    "shallow",
+    "unrelated histories",
+    "refusing to merge",
+    "no merge base",
+)
+
+# Requirements that are not pinned with '==' are installed again after this
+# many seconds, so they get upgraded
+UNPINNED_REQUIREMENTS_TTL: int = 24 * 3600
+
+RE_INCLUDE = re.compile(
+    r"^(?P<option>-[rc]|--requirement|--constraint)(\s*=\s*|\s*)(?P<path>\S.*)$"
+)
+RE_PINNED = re.compile(r"^[^;]*===?\s*[^\s,;*]+\s*(;.*)?$")
+
+
+def _read_requirements(file: Path, *, seen: Optional[Set[Path]] = None) -> List[str]:
+    """Read requirement lines of the file and the files it includes.
+
+    :param file: Path to the requirements file.
+    :param seen: Files that were already read, so cyclic includes end.
+    :return: Lines without comments and empty lines. Files included by
+        ``-r`` and ``-c`` are read as well, lines of constraint files are
+        prefixed with ``-c``.
+    """
+    seen = set() if seen is None else seen
+    file = file.resolve()
+    if file in seen or not file.is_file():
+        return []
+    seen.add(file)
+
+    lines: List[str] = []
+    with open(file, "r") as handle:
+        for line in handle.readlines():
+            # '#' only starts a comment at the start or after a whitespace,
+            # URL fragments like '#egg=' are kept
+            line = re.sub(r"(^|\s)#.*$", "", line).strip()
+            if not line:
+                continue
+            lines.append(line)
+
+            include = RE_INCLUDE.match(line)
+            if include is None or "://" in include.group("path"):
+                continue
+            included: List[str] = _read_requirements(
+                file.parent / include.group("path").strip(), seen=seen
+            )
+            if include.group("option") in ("-c", "--constraint"):
+                included = [f"-c {line}" for line in included]
+            lines += included
+    return lines
+
+
+def _is_pinned(requirements: List[str]) -> bool:
+    """Whether all requirements have an exact version.
+
+    Options and constraints are not requirements, except for editable
+    installs, which are never pinned.
+    """
+    for line in requirements:
+        if line.startswith(("-e", "--editable")):
+            return False
+        if line.startswith("-"):
+            continue
+        if RE_PINNED.match(line) is None:
+            return False
+    return True
+
+
+def get_clone_options() -> Tuple[int, bool]:
+    """Get how much of module repositories is downloaded on install.
+
+    :return: Number of commits (``REPOSITORY_CLONE_DEPTH``, ``1`` by default,
+        ``0`` downloads the whole history) and whether the file contents are
+        only downloaded when they are needed (``REPOSITORY_CLONE_BLOBLESS``,
+        disabled by default).
+    :raises DotEnvException: The depth is not a non-negative integer or the
+        blobless option is not a boolean.
+    """
+    value: str = os.getenv("REPOSITORY_CLONE_DEPTH", "").strip()
+    try:
+        depth: int = int(value) if value else 1
+    except ValueError:
+        depth = -1
+    if depth < 0:
+        raise DotEnvException(
+            f"REPOSITORY_CLONE_DEPTH has to be a non-negative integer, got '{value}'."
+        )
+
+    value = os.getenv("REPOSITORY_CLONE_BLOBLESS", "").strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        blobless: bool = False
+    elif value.lower() in ("1", "true", "yes", "on"):
+        blobless = True
+    else:
+        raise DotEnvException(
+            f"REPOSITORY_CLONE_BLOBLESS has to be a boolean, got '{value}'."
+        )
+    return depth, blobless
+
+
+def get_wheel_cache() -> Path:
+    """Get directory with wheels of module requirements.
+
+    The wheels are shared by all repositories, so the requirements can be
+    reinstalled without downloading them again. The directory can be set with
+    ``REPOSITORY_WHEEL_CACHE``, it defaults to ``~/.cache/pumpkin/wheels``.
+    """
+    directory: Optional[str] = os.getenv("REPOSITORY_WHEEL_CACHE")
+    if directory:
+        return Path(directory)
+    return Path.home() / ".cache" / "pumpkin" / "wheels"
+
+
+async def _run_pip(
+    *args: str, on_output: Optional[OutputCallback] = None
+) -> Tuple[int, str]:
+    """Run pip without blocking the event loop.
+
+    :param args: Arguments of pip.
+    :param on_output: Coroutine function called with each line of the output.
+    :return: Exit code and the output.
+    """
+    process = await asyncio.create_subprocess_exec(  # nosec: B603
+        sys.executable,
+        "-m",
+        "pip",
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    lines: List[str] = []
+    async for raw_line in process.stdout:
+        line: str = raw_line.decode("utf-8", errors="replace").rstrip()
+        lines.append(line)
+        if on_output is not None:
+            await on_output(line)
+    returncode: int = await process.wait()
+    return returncode, "\n".join(lines)
+
+
+class RepositorySnapshot:
+    """Metadata of a repository at some commit.
+
+    :param name: Repository name.
+    :param module_names: Names of the modules of the repository.
+    :param branch: Current branch, ``None`` if the HEAD is detached.
+    :param head_sha: Hash of the last commit.
+    :param summary: First line of the message of the last commit.
+    """
+
+    __slots__ = ("name", "module_names", "branch", "head_sha", "summary", "stamp")
+
+    def __init__(
+        self,
+        name: str,
+        module_names: Tuple[str, ...],
+        branch: Optional[str],
+        head_sha: str,
+        summary: str,
+        stamp: Tuple,
+    ):
+        self.name: str = name
+        self.module_names: Tuple[str, ...] = module_names
+        self.branch: Optional[str] = branch
+        self.head_sha: str = head_sha
+        self.summary: str = summary
+        # Everything the snapshot was made from, see Repository.get_stamp()
+        self.stamp: Tuple = stamp
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} name='{self.name}' "
+            f"branch='{self.branch}' head_sha='{self.head_sha}'>"
+        )
+
 
 class RepositoryManager:
     """Module repository manager.
@@ -28,6 +243,7 @@ class RepositoryManager:
 
     repositories: List[Repository]
     log: List[str]
+    _snapshots: Dict[Path, RepositorySnapshot]
 
     def __new__(cls, *args, **kwargs):
         """Create singleton instance."""
@@ -37,6 +253,7 @@ class RepositoryManager:
 
     def __init__(self):
         self.log = []
+        self._snapshots = {}
         self.refresh()
 
     def flush_log(self) -> None:
@@ -69,6 +286,38 @@ class RepositoryManager:
             repositories.append(repository)
 
         self.repositories = repositories
+        paths: Set[Path] = {repository.path for repository in repositories}
+        for path in list(self._snapshots.keys()):
+            if path not in paths:
+                del self._snapshots[path]
+
+    def get_snapshot(self, repository: Repository) -> RepositorySnapshot:
+        """Get metadata of the repository.
+
+        The metadata is only read from git again when the checked out branch
+        or commit changes, which is detected from the modification times of
+        ``.git/HEAD`` and of the file of the current branch.
+        """
+        stamp: Tuple = repository.get_stamp()
+        snapshot: Optional[RepositorySnapshot] = self._snapshots.get(repository.path)
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+
+        is_base: bool = repository.name == "base"
+        repo = git.repo.base.Repo(
+            str(repository.path), search_parent_directories=is_base
+        )
+        commit: git.objects.commit.Commit = repo.head.commit
+        snapshot = RepositorySnapshot(
+            name=repository.name,
+            module_names=tuple(repository.module_names),
+            branch=None if repo.head.is_detached else repo.active_branch.name,
+            head_sha=commit.hexsha,
+            summary=commit.summary,
+            stamp=stamp,
+        )
+        self._snapshots[repository.path] = snapshot
+        return snapshot
 
     def get_repository(self, name: str) -> Optional[Repository]:
         """Get repository by its name."""
@@ -77,6 +326,39 @@ class RepositoryManager:
                 return repository
         return None
 
+    async def update_all(
+        self, option: Optional[str] = None
+    ) -> AsyncIterator[Tuple[Repository, bool, str]]:
+        """Update all repositories at once.
+
+        :param option: Update type, see :meth:`Repository.update`.
+        :return: Asynchronous iterator of repositories, whether their update
+            succeeded and the git output, in the order they finish.
+
+        .. code-block:: python
+            :linenos:
+
+            async for repository, success, output in manager.update_all():
+                print(repository.name, success, output)
+        """
+
+        async def update(repository: Repository) -> Tuple[Repository, bool, str]:
+            try:
+                return repository, True, await repository.update(option)
+            except git.exc.GitError as exc:
+                return repository, False, str(exc)
+
+        tasks: List[asyncio.Task] = [
+            asyncio.ensure_future(update(repository))
+            for repository in self.repositories
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
 
 class Repository:
     """Module repository."""
@@ -107,15 +389,78 @@ class Repository:
         repo = git.repo.base.Repo(str(self.path), search_parent_directories=is_base)
         return repo.head.commit
 
+    def get_git_dir(self) -> Optional[Path]:
+        """Find the git directory without starting git.
+
+        :return: Path to the directory, or ``None`` if the repository is not
+            a git repository.
+        """
+        # 'base' is part of the bot repository
+        directories: List[Path] = [self.path]
+        if self.name == "base":
+            directories += list(self.path.resolve().parents)
+
+        for directory in directories:
+            dot_git: Path = directory / ".git"
+            if dot_git.is_dir():
+                return dot_git
+            if dot_git.is_file():
+                # Worktrees and submodules link to the directory
+                content: str = dot_git.read_text().strip()
+                if content.startswith("gitdir:"):
+                    return (directory / content[len("gitdir:") :].strip()).resolve()
+        return None
+
+    def get_stamp(self) -> Tuple:
+        """Get state of the checked out commit.
+
+        The state changes with every commit, pull or checkout. It is made
+        from the repository metadata, the content and modification time of
+        ``HEAD`` and the modification time of the current branch.
+        """
+        facts: Tuple = (self.name, tuple(self.module_names))
+        git_dir: Optional[Path] = self.get_git_dir()
+        if git_dir is None:
+            return facts
+
+        head: Path = git_dir / "HEAD"
+        try:
+            head_content: str = head.read_text().strip()
+            head_mtime: int = head.stat().st_mtime_ns
+        except OSError:
+            return facts
+
+        ref_mtime: Optional[int] = None
+        if head_content.startswith("ref:"):
+            ref: str = head_content[len("ref:") :].strip()
+            # Worktrees keep their HEAD, but share the refs
+            common_dir: Path = git_dir
+            if (git_dir / "commondir").is_file():
+                common_dir = git_dir / (git_dir / "commondir").read_text().strip()
+            for ref_file in (common_dir / ref, common_dir / "packed-refs"):
+                if ref_file.is_file():
+                    ref_mtime = ref_file.stat().st_mtime_ns
+                    break
+        return facts + (head_content, head_mtime, ref_mtime)
+
     def change_branch(self, branch: str) -> None:
         """Change the git branch of the repository.
 
         :raises ValueError: Output of git if an error occurs.
         """
-        is_base: bool = getattr(self, "name", "") == "base"
+        is_base: bool = self.name == "base"
         repo = git.repo.base.Repo(str(self.path), search_parent_directories=is_base)
-        repo.remotes.origin.fetch()
         try:
+            if _is_shallow(repo):
+                # Single-branch clones only know the branch they were cloned with
+                repo.git.remote("set-branches", "--add", "origin", branch)
+                repo.git.fetch(
+                    "origin",
+                    f"+refs/heads/{branch}:refs/remotes/origin/{branch}",
+                    depth=1,
+                )
+            else:
+                repo.remotes.origin.fetch()
             repo.git.checkout(branch)
         except git.exc.GitCommandError as exc:
             raise ValueError(
@@ -228,28 +573,88 @@ class Repository:
         return tuple(list_of_names)
 
     @staticmethod
-    def git_clone(path: Path, url: str) -> Optional[str]:
+    def git_clone(
+        path: Path,
+        url: str,
+        branch: Optional[str] = None,
+        *,
+        depth: int = 0,
+        blobless: bool = False,
+    ) -> Optional[str]:
         """Clone repository to given path.
 
+        :param branch: Branch to clone, defaults to the remote HEAD.
+        :param depth: Number of commits to download; ``0`` downloads the whole
+            history. Shallow clones only include the cloned branch.
+        :param blobless: Only download file contents of the checked out
+            commit, the others are downloaded when they are needed.
         :return: stderr output on error, otherwise `None`.
         """
+        options: Dict[str, Union[bool, int, str]] = {}
+        if branch is not None:
+            options["branch"] = branch
+        if depth > 0:
+            options["depth"] = depth
+            options["single_branch"] = True
+        if blobless:
+            options["filter"] = "blob:none"
+
         try:
-            git.repo.base.Repo.clone_from(url, str(path.resolve()))
+            git.repo.base.Repo.clone_from(url, str(path.resolve()), **options)
         except git.exc.GitError as exc:
             stderr: str = str(exc)[str(exc).find("stderr: ") + 8 :]
             return stderr
         return None
 
+    @staticmethod
+    async def clone(
+        path: Path, url: str, branch: Optional[str] = None
+    ) -> Optional[str]:
+        """Clone repository to given path without blocking the event loop.
+
+        Only the latest commits are downloaded, see :func:`get_clone_options`.
+
+        :return: stderr output on error, otherwise `None`.
+        """
+        depth, blobless = get_clone_options()
+        return await _run_in_executor(
+            Repository.git_clone, path, url, branch, depth=depth, blobless=blobless
+        )
+
     def git_pull(self, force: bool = False) -> str:
         """Perform 'git pull' over the repository.
 
+        Shallow clones are made complete if git needs older commits, e.g. to
+        merge local changes. Other errors, like network or authentication
+        failures and merge conflicts, are raised.
+
         :return: Git output
         """
         is_base: bool = self.name == "base"
         repo = git.repo.base.Repo(str(self.path), search_parent_directories=is_base)
-        result: str = repo.git.pull(force=force)
+        try:
+            result: str = repo.git.pull(force=force)
+        except git.exc.GitCommandError as exc:
+            if not _is_shallow(repo):
+                raise
+            stderr: str = str(exc.stderr).lower()
+            if not any(error in stderr for error in MISSING_HISTORY_ERRORS):
+                raise
+            repo.git.fetch(unshallow=True)
+            result = repo.git.pull(force=force)
         return result
 
+    async def update(self, option: Optional[str] = None) -> str:
+        """Update the repository without blocking the event loop.
+
+        :param option: ``force`` to force the pull, ``reset`` to reset the
+            repository to its remote branch first, ``None`` to just pull.
+        :return: Git output
+        """
+        if option == "reset":
+            return await _run_in_executor(self.git_reset_pull)
+        return await _run_in_executor(self.git_pull, option == "force")
+
     def git_reset_pull(self) -> str:
         """Perform 'git reset --hard' and 'git pull' over the repository.
 
@@ -276,35 +681,125 @@ class Repository:
 
         h = hashlib.sha256()
         with open(file, "rb") as handle:
-            chunk: bytes = b""
-            while chunk != b"":
-                # read 1kB at a time
-                chunk = handle.read(1024)
+            # read 1kB at a time
+            for chunk in iter(lambda: handle.read(1024), b""):
                 h.update(chunk)
         file_hash = h.hexdigest()
         return file_hash
 
-    def install_requirements(self) -> Optional[str]:
+    @property
+    def requirements_hash(self) -> Optional[str]:
+        """Get hash of the requirements installed into this Python environment.
+
+        Unlike :attr:`requirements_txt_hash`, comments, empty lines and the
+        order of the requirements do not change it. Contents of files included
+        with ``-r`` and ``-c`` do.
+
+        :return: SHA-256 of the requirements or `None` if the file does not
+            exist.
+        """
+        file: Path = self.path / "requirements.txt"
+        if not file.is_file():
+            return None
+
+        h = hashlib.sha256()
+        h.update(sys.prefix.encode("utf-8"))
+        for requirement in sorted(set(_read_requirements(file))):
+            h.update(b"\n" + requirement.encode("utf-8"))
+        return h.hexdigest()
+
+    @property
+    def requirements_pinned(self) -> bool:
+        """Whether all requirements have an exact version.
+
+        Requirements without one are upgraded when they are installed.
+        """
+        return _is_pinned(_read_requirements(self.path / "requirements.txt"))
+
+    @property
+    def _requirements_marker(self) -> Path:
+        """File with the hash of the last installed requirements."""
+        return get_wheel_cache() / "installed" / f"{self.name}.sha256"
+
+    def _requirements_installed(self, requirements_hash: str, pinned: bool) -> bool:
+        marker: Path = self._requirements_marker
+        if not marker.is_file() or marker.read_text() != requirements_hash:
+            return False
+        if pinned:
+            return True
+        # Newer versions may have been released since the last install
+        return time.time() - marker.stat().st_mtime < UNPINNED_REQUIREMENTS_TTL
+
+    async def install_requirements(
+        self, *, force: bool = False, on_output: Optional[OutputCallback] = None
+    ) -> Optional[str]:
         """Install packages from requirements.txt.
 
-        :return: Command output if the file exists, otherwise `None`.
+        :param force: Install the packages even if the requirements did not
+            change since they were installed last time. Requirements that are
+            not pinned are installed again once a day, see
+            :attr:`requirements_pinned`.
+        :param on_output: Coroutine function called with each line of pip
+            output as it is printed.
+        :return: Command output if the packages were installed, otherwise
+            `None`.
+
+        The packages are installed from the shared wheel cache (see
+        :func:`get_wheel_cache`) when all of them are there, so no network is
+        needed. Otherwise the missing wheels are downloaded or built into the
+        cache first. Packages without an exact version are always looked up
+        in the package index, so they are upgraded.
         """
-        reqirements = self.path / "requirements.txt"
-        if not reqirements.is_file():
-            return
+        requirements: Path = self.path / "requirements.txt"
+        if not requirements.is_file():
+            return None
 
-        output: subprocess.CompletedProcess = subprocess.run(  # nosec: B603
-            [
-                sys.executable,
-                "-m",
-                "pip",
-                "install",
-                "-r",
-                reqirements.resolve(),
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        requirements_hash: Optional[str] = self.requirements_hash
+        pinned: bool = self.requirements_pinned
+        if not force and self._requirements_installed(requirements_hash, pinned):
+            return None
+
+        wheels: Path = get_wheel_cache()
+        wheels.mkdir(parents=True, exist_ok=True)
+        install: Tuple[str, ...] = (
+            "install",
+            *(() if pinned else ("--upgrade",)),
+            "--no-index",
+            "--find-links",
+            str(wheels),
+            "-r",
+            str(requirements.resolve()),
         )
 
-        result = output.stderr or output.stdout
-        return result.decode("utf-8")
+        if pinned:
+            # Errors about wheels that are not cached are expected here,
+            # so the output is not streamed
+            returncode, output = await _run_pip(*install)
+        else:
+            # The cache may only have older versions
+            returncode, output = 1, ""
+        if returncode != 0:
+            returncode, output = await _run_pip(
+                "wheel",
+                "--wheel-dir",
+                str(wheels),
+                "--find-links",
+                str(wheels),
+                "-r",
+                str(requirements.resolve()),
+                on_output=on_output,
+            )
+            if returncode == 0:
+                returncode, install_output = await _run_pip(
+                    *install, on_output=on_output
+                )
+                output += "\n" + install_output
+        elif on_output is not None:
+            for line in output.splitlines():
+                await on_output(line)
+
+        if returncode == 0:
+            marker: Path = self._requirements_marker
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.write_text(requirements_hash)
+        return output
@@ -1,13 +1,15 @@
-import contextlib
-import datetime
-from typing import Callable, Dict, Optional, List
+import asyncio
+import collections
+import time
+from typing import Callable, Deque, Dict, FrozenSet, List, Optional, Tuple
 
 import discord
 from discord.ext import commands
 
 import pie._tracing
+from pie import cache
 from pie.database.config import Config
-from pie.spamchannel.database import SpamChannel
+from pie.spamchannel.database import SpamChannel, SpamLimit
 from pie.exceptions import SpamChannelException
 
 
@@ -15,34 +17,96 @@ config = Config.get()
 _trace: Callable = pie._tracing.register("pie_spamchannel")
 
 
+# Limits used by guilds that have not set their own
+MESSAGE_LIMIT: int = 3
+TIME_LIMIT: int = 180
+
+_limits = cache.Cache(
+    "pie.spamchannel.limits", maxsize=10000, tables=(SpamLimit.__tablename__,)
+)
+
+
+def get_limits(guild_id: int) -> Tuple[int, int]:
+    """Get soft limit of the guild.
+
+    :return: Number of commands and the number of seconds they can be run in.
+    """
+
+    def load() -> Tuple[int, int]:
+        limit: Optional[SpamLimit] = SpamLimit.get(guild_id)
+        if limit is None:
+            return MESSAGE_LIMIT, TIME_LIMIT
+        return limit.message_limit, limit.time_limit
+
+    return _limits.get_or_load(guild_id, load, tags=(str(guild_id),))
+
+
+_channels = cache.Cache(
+    "pie.spamchannel.channels", maxsize=10000, tables=(SpamChannel.__tablename__,)
+)
+
+
+def get_channels(guild_id: int) -> Tuple[FrozenSet[int], Optional[int]]:
+    """Get spam channels of the guild.
+
+    :return: IDs of the spam channels and ID of the primary one. When none
+        of them is marked as primary, the first one defined is used.
+    """
+
+    def load() -> Tuple[FrozenSet[int], Optional[int]]:
+        spamchannels: List[SpamChannel] = SpamChannel.get_all(guild_id)
+        primary: Optional[int] = None
+        for spamchannel in spamchannels:
+            if spamchannel.primary:
+                primary = spamchannel.channel_id
+                break
+        if primary is None and spamchannels:
+            primary = min(spamchannels, key=lambda c: c.idx).channel_id
+        return frozenset(c.channel_id for c in spamchannels), primary
+
+    return _channels.get_or_load(guild_id, load, tags=(str(guild_id),))
+
+
+class _Window:
+    """Times of recent commands in one channel."""
+
+    __slots__ = ("timestamps", "time_limit", "frozen")
+
+    def __init__(self, time_limit: float):
+        self.timestamps: Deque[float] = collections.deque()
+        self.time_limit: float = time_limit
+        self.frozen: bool = False
+
+    def expire(self, now: float) -> None:
+        while self.timestamps and now - self.timestamps[0] > self.time_limit:
+            self.timestamps.popleft()
+
+
 class _SpamchannelManager:
-    def __init__(self, *, time_limit: int, message_limit: int):
-        self.time_limit = datetime.timedelta(minutes=time_limit)
-        self.message_limit: int = message_limit
-
-        self.cooldown: Dict[int, List[datetime.datetime]] = {}
-        self.frozen: Dict[int, bool] = {}
-
-    def _ensure_key(self, channel_id: int) -> None:
-        """Make sure that the internal dictionaries know about the channel."""
-        if channel_id not in self.cooldown:
-            self.cooldown[channel_id] = []
-        if channel_id not in self.frozen:
-            self.frozen[channel_id] = False
-
-    def _update_channel(self, channel_id: int) -> None:
-        """Delete old timestamps from internal dictionaries."""
-        if channel_id not in self.cooldown.keys():
-            return
+    """Sliding windows of commands run outside of spam channels.
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        new_cooldown: List[datetime.datetime] = []
-        for timestamp in self.cooldown[channel_id]:
-            if (now - timestamp) <= self.time_limit:
-                new_cooldown.append(timestamp)
-        self.cooldown[channel_id] = new_cooldown
+    :param sweep_interval: Seconds between removals of idle channels.
+    """
 
-    def block_message(self, message: discord.Message) -> bool:
+    def __init__(self, *, sweep_interval: float = 600):
+        self.sweep_interval: float = sweep_interval
+        self.windows: Dict[int, _Window] = {}
+        self._last_sweep: float = time.monotonic()
+
+    def _sweep(self, now: float) -> None:
+        """Forget channels whose commands have all expired."""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for channel_id, window in list(self.windows.items()):
+            window.expire(now)
+            if not window.timestamps:
+                del self.windows[channel_id]
+        _trace(f"Swept idle channels, {len(self.windows)} left.")
+
+    def block_message(
+        self, message: discord.Message, *, message_limit: int, time_limit: float
+    ) -> bool:
         """Check if the message can be sent to given channel.
 
         The redirection message is always sent, this function
@@ -50,6 +114,8 @@ class _SpamchannelManager:
 
         Args:
             message: The command to be run.
+            message_limit: Number of commands allowed in the channel.
+            time_limit: Number of seconds the commands are counted for.
 
         Returns:
             If the command should be run or not.
@@ -58,34 +124,114 @@ class _SpamchannelManager:
             _trace(f"Not TextChannel, but {type(message.channel).__name__}.")
             return False
 
-        channel_id: int = message.channel.id
-        self._ensure_key(channel_id)
-        self._update_channel(channel_id)
+        now: float = time.monotonic()
+        self._sweep(now)
 
-        count: int = len(self.cooldown[channel_id])
-        if count < self.message_limit and self.frozen[channel_id]:
+        channel_id: int = message.channel.id
+        window: Optional[_Window] = self.windows.get(channel_id)
+        if window is None:
+            window = _Window(time_limit)
+            self.windows[channel_id] = window
+        window.time_limit = time_limit
+        window.expire(now)
+
+        count: int = len(window.timestamps)
+        if count < message_limit and window.frozen:
             # Unlock the channel
-            self.frozen[channel_id] = False
+            window.frozen = False
             _trace("Channel unlocked.")
-        if count == self.message_limit and not self.frozen[channel_id]:
+        if count >= message_limit and not window.frozen:
             # Lock the channel
-            self.frozen[channel_id] = True
+            window.frozen = True
             _trace("Channel locked.")
-        if count >= self.message_limit:
+        if count >= message_limit:
             # Any messages above message_limit won't be run,
             # and they should not count into the cooldown
             _trace("Allowed message queue size exceeded.")
             return True
 
         # Add the message timestamp to cooldown
-        self.cooldown[channel_id].append(message.created_at)
+        window.timestamps.append(now)
 
         # Allow the command to be run
         _trace("Message added to message cooldown queue.")
         return False
 
 
-_SPAMCHANNEL_MANAGER = _SpamchannelManager(time_limit=3, message_limit=3)
+_SPAMCHANNEL_MANAGER = _SpamchannelManager()
+
+
+class _Notice:
+    """Redirect message of one channel."""
+
+    __slots__ = ("spamchannel_id", "user_ids", "message", "content", "lock")
+
+    def __init__(self, spamchannel_id: int):
+        self.spamchannel_id: int = spamchannel_id
+        self.user_ids: List[int] = []
+        self.message: Optional[discord.Message] = None
+        self.content: str = ""
+        self.lock = asyncio.Lock()
+
+    def render(self) -> str:
+        mentions: str = " ".join(f"<@{user_id}>" for user_id in self.user_ids)
+        return f"{mentions} 👉 <#{self.spamchannel_id}>"
+
+
+class _RedirectNotices:
+    """Redirect messages coalesced per channel.
+
+    :param window: Seconds during which users redirected in one channel are
+        added to the same message.
+    :param max_users: Maximal number of users mentioned in one message.
+
+    The first redirected user gets a new message, the others redirected in
+    the same channel while the window is open are mentioned in it by editing
+    the message. When more of them come at once, they share one edit.
+    """
+
+    def __init__(self, *, window: float = 30, max_users: int = 50):
+        self.max_users: int = max_users
+        self.notices = cache.Cache("pie.spamchannel.notices", maxsize=1000, ttl=window)
+
+    async def send(
+        self, channel: discord.abc.GuildChannel, user_id: int, spamchannel_id: int
+    ) -> None:
+        """Tell the user to use the spam channel."""
+        notice: Optional[_Notice] = self.notices.get(channel.id)
+        if (
+            notice is None
+            or notice.spamchannel_id != spamchannel_id
+            or len(notice.user_ids) >= self.max_users
+        ):
+            notice = _Notice(spamchannel_id)
+            self.notices.set(channel.id, notice)
+        if user_id not in notice.user_ids:
+            notice.user_ids.append(user_id)
+
+        async with notice.lock:
+            content: str = notice.render()
+            if content == notice.content:
+                # Another invocation has already sent it
+                _trace("Redirect notice is up to date.")
+                return
+
+            if notice.message is not None:
+                try:
+                    await notice.message.edit(content=content)
+                    notice.content = content
+                    _trace("Redirect notice edited.")
+                    return
+                except discord.HTTPException:
+                    # The message may have been deleted, send a new one
+                    pass
+
+            notice.message = await channel.send(content)
+            notice.content = content
+            _trace("Redirect notice sent.")
+
+
+_REDIRECT_NOTICES = _RedirectNotices()
 
 
 async def _run(ctx: commands.Context, hard: bool) -> bool:
@@ -104,28 +250,18 @@ async def _run(ctx: commands.Context, hard: bool) -> bool:
         _trace("Not in guild, invocation allowed.")
         return True
 
-    spamchannels = SpamChannel.get_all(ctx.guild.id)
+    spamchannels, primary = get_channels(ctx.guild.id)
     if not spamchannels:
         # Allow the invocation if there are no spamchannels
         _trace("No spamchannels, invocation allowed.")
         return True
 
-    if ctx.channel.id in [c.channel_id for c in spamchannels]:
+    if ctx.channel.id in spamchannels:
         # Allow the invocation if message's channel is spamchannel
         _trace("In spamchannel, invocation allowed.")
         return True
 
-    primary: Optional[SpamChannel] = None
-    with contextlib.suppress(IndexError):
-        primary = [s for s in spamchannels if s.primary][0]
-    if not primary:
-        primary = spamchannels[0]
-
-    await ctx.send(
-        "<@{user}> 👉 <#{channel}>".format(
-            user=ctx.author.id, channel=primary.channel_id
-        )
-    )
+    await _REDIRECT_NOTICES.send(ctx.channel, ctx.author.id, primary)
 
     if hard:
         # Don't return 'False', because that triggers
@@ -134,7 +270,10 @@ async def _run(ctx: commands.Context, hard: bool) -> bool:
         _trace("Command blocked [hard limit].")
         raise SpamChannelException(ctx.message)
 
-    if _SPAMCHANNEL_MANAGER.block_message(ctx.message):
+    message_limit, time_limit = get_limits(ctx.guild.id)
+    if _SPAMCHANNEL_MANAGER.block_message(
+        ctx.message, message_limit=message_limit, time_limit=time_limit
+    ):
         # Don't return 'False', because that triggers
         # 'You don't have permission' message. They do, but they've already
         # exceeded their spam channel message limit.
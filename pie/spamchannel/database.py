@@ -3,7 +3,7 @@ from typing import Dict, Union, List, Optional
 
 from sqlalchemy import BigInteger, Boolean, Column, Integer, UniqueConstraint
 
-from pie.database import database, session
+from pie.database import database, invalidation, primary, read_only, session
 
 
 class SpamChannel(database.base):
@@ -22,9 +22,11 @@ class SpamChannel(database.base):
     def add(guild_id: int, channel_id: int) -> SpamChannel:
         channel = SpamChannel(guild_id=guild_id, channel_id=channel_id)
         session.add(channel)
+        invalidation.publish(SpamChannel.__tablename__, guild_id)
         session.commit()
         return channel
 
+    @read_only
     def get(guild_id: int, channel_id: int) -> Optional[SpamChannel]:
         query = (
             session.query(SpamChannel)
@@ -33,6 +35,7 @@ class SpamChannel(database.base):
         )
         return query
 
+    @read_only
     def get_all(guild_id: int) -> List[SpamChannel]:
         query = session.query(SpamChannel).filter_by(guild_id=guild_id).all()
         return query
@@ -48,10 +51,13 @@ class SpamChannel(database.base):
         if query:
             query.primary = False
 
-        query = SpamChannel.get(guild_id, channel_id)
+        # The row is updated, a lagging replica could miss it
+        with primary():
+            query = SpamChannel.get(guild_id, channel_id)
         if query:
             query.primary = True
 
+        invalidation.publish(SpamChannel.__tablename__, guild_id)
         session.commit()
         return query
 
@@ -61,6 +67,7 @@ class SpamChannel(database.base):
             .filter_by(guild_id=guild_id, channel_id=channel_id)
             .delete()
         )
+        invalidation.publish(SpamChannel.__tablename__, guild_id)
         session.commit()
         return query
 
@@ -77,3 +84,55 @@ class SpamChannel(database.base):
             "channel_id": self.channel_id,
             "primary": self.primary,
         }
+
+
+class SpamLimit(database.base):
+    """Number of commands allowed outside of spam channels.
+
+    Soft-limited commands can be run ``message_limit`` times in ``time_limit``
+    seconds in each channel that is not a spam channel.
+    """
+
+    __tablename__ = "spamchannel_limits"
+
+    guild_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    message_limit = Column(Integer)
+    time_limit = Column(Integer)
+
+    @staticmethod
+    def set(guild_id: int, message_limit: int, time_limit: int) -> SpamLimit:
+        query = session.query(SpamLimit).filter_by(guild_id=guild_id).one_or_none()
+        if query is None:
+            query = SpamLimit(guild_id=guild_id)
+        query.message_limit = message_limit
+        query.time_limit = time_limit
+        session.add(query)
+        invalidation.publish(SpamLimit.__tablename__, guild_id)
+        session.commit()
+        return query
+
+    @staticmethod
+    @read_only
+    def get(guild_id: int) -> Optional[SpamLimit]:
+        query = session.query(SpamLimit).filter_by(guild_id=guild_id).one_or_none()
+        return query
+
+    @staticmethod
+    def remove(guild_id: int) -> int:
+        query = session.query(SpamLimit).filter_by(guild_id=guild_id).delete()
+        invalidation.publish(SpamLimit.__tablename__, guild_id)
+        session.commit()
+        return query
+
+    def __repr__(self) -> str:
+        return (
+            f'<{self.__class__.__name__} guild_id="{self.guild_id}" '
+            f'message_limit="{self.message_limit}" time_limit="{self.time_limit}">'
+        )
+
+    def dump(self) -> Dict[str, int]:
+        return {
+            "guild_id": self.guild_id,
+            "message_limit": self.message_limit,
+            "time_limit": self.time_limit,
+        }
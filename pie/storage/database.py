@@ -4,7 +4,7 @@ from typing import Dict, Optional, Union
 
 from sqlalchemy import BigInteger, Column, String
 
-from pie.database import database, session
+from pie.database import database, invalidation, session
 
 
 class StorageData(database.base):
@@ -41,6 +41,7 @@ class StorageData(database.base):
         data.value = value
         data.type = type(value).__name__
         session.merge(data)
+        invalidation.publish(StorageData.__tablename__, guild_id)
         session.commit()
 
         return data
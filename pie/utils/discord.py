@@ -1,13 +1,79 @@
+import collections
 import datetime
-from typing import Optional, Union
+from typing import Dict, Iterable, Optional, Union
 
 import discord
 from discord.ext import commands
 
+from pie import cache
 from pie.database.config import Config
 
 config = Config.get()
 
+# Messages fetched by get_message(). Reactions to popular messages come in
+# bursts and every one of them asks for the message; they all share one
+# request and its result for a few seconds.
+_fetched_messages = cache.Cache("pie.utils.messages", maxsize=256, ttl=3)
+
+
+class _IndexedMessages(collections.deque):
+    """Message store of discord.py with an index of message IDs.
+
+    discord.py keeps received messages in a bounded deque and only appends
+    to it, removes deleted messages and iterates over it. This deque keeps
+    a dictionary of its messages next to it, so they can be found by their
+    ID without scanning the whole store.
+    """
+
+    def __init__(
+        self, iterable: Iterable[discord.Message] = (), maxlen: Optional[int] = None
+    ):
+        super().__init__(maxlen=maxlen)
+        self._index: Dict[int, discord.Message] = {}
+        for message in iterable:
+            self.append(message)
+
+    def append(self, message: discord.Message) -> None:
+        evicted: Optional[discord.Message] = None
+        if self.maxlen is not None and len(self) == self.maxlen:
+            evicted = self[0]
+        super().append(message)
+        if evicted is not None:
+            self._forget(evicted)
+        self._index[message.id] = message
+
+    def remove(self, message: discord.Message) -> None:
+        super().remove(message)
+        self._forget(message)
+
+    def clear(self) -> None:
+        super().clear()
+        self._index.clear()
+
+    def get(self, message_id: int) -> Optional[discord.Message]:
+        return self._index.get(message_id)
+
+    def _forget(self, message: discord.Message) -> None:
+        # Newer message with the same ID may have replaced it in the index
+        if self._index.get(message.id) is message:
+            del self._index[message.id]
+
+
+def _get_cached_message(
+    bot: commands.Bot, message_id: int
+) -> Optional[discord.Message]:
+    """Find the message in the message cache of the bot."""
+    state = bot._connection
+    messages = state._messages
+    if messages is None:
+        return None
+    if not isinstance(messages, _IndexedMessages):
+        # discord.py creates new store when it connects and when the bot
+        # leaves a guild, index it on the first lookup after that
+        messages = _IndexedMessages(messages, maxlen=state.max_messages)
+        state._messages = messages
+    return messages.get(message_id)
+
 
 async def get_message(
     bot: commands.Bot, guild_or_user_id: int, channel_id: int, message_id: int
@@ -17,16 +83,33 @@ async def get_message(
     If the message is contained in bot cache, it is returned from it, to
     save API calls. Otherwise it is fetched.
 
+    Concurrent calls for the same message share one API request, and fetched
+    messages are kept for three seconds. Their content and reactions may be
+    that old.
+
     :param bot: The :class:`~discord.ext.commands.Bot` object.
     :param guild_or_user_id: Guild ID or User ID (if the message is in DMs).
     :param channel_id: Channel ID.
     :param message_id: Message ID.
     :return: Found message or ``None``.
     """
-    query = [m for m in bot.cached_messages if m.id == message_id]
-    if len(query) == 1:
-        return query[0]
+    message: Optional[discord.Message] = _get_cached_message(bot, message_id)
+    if message is not None:
+        return message
+
+    message = await _fetched_messages.aget_or_load(
+        message_id,
+        lambda: _fetch_message(bot, guild_or_user_id, channel_id, message_id),
+    )
+    if message is None:
+        # Do not remember failures, the message may become available
+        _fetched_messages.invalidate(message_id)
+    return message
 
+
+async def _fetch_message(
+    bot: commands.Bot, guild_or_user_id: int, channel_id: int, message_id: int
+) -> Optional[discord.Message]:
     try:
         guild = bot.get_guild(guild_or_user_id)
         if guild is not None:
@@ -131,9 +131,20 @@ bot = commands.Bot(
     help_command=Help(),
     intents=intents,
 )
-# This is required to make the 'bot' object hashable by ring's LRU cache
-# See pie/acl/__init__.py:map_member_to_ACLevel()
-bot.__ring_key__ = lambda: "bot"
+
+
+# Setup event routing
+
+from pie import events
+
+events.setup(bot)
+
+
+# Apply rate limits set by guilds
+
+from pie import ratelimit
+
+ratelimit.setup(bot)
 
 
 # Setup logging
@@ -206,6 +217,31 @@ async def on_error(event, *args, **kwargs):
 commands.Bot.on_error = on_error
 
 
+# Attribute database queries to the command or listener that issued them
+
+from pie.database import accounting
+
+_bot_invoke = commands.Bot.invoke
+_bot_run_event = commands.Bot._run_event
+
+
+async def invoke(self, ctx: commands.Context):
+    if ctx.command is None:
+        return await _bot_invoke(self, ctx)
+    with accounting.track(f"command:{ctx.command.qualified_name}"):
+        await _bot_invoke(self, ctx)
+
+
+async def run_event(self, coro, event_name: str, *args, **kwargs):
+    name: str = getattr(coro, "__qualname__", event_name)
+    with accounting.track(f"listener:{name}"):
+        await _bot_run_event(self, coro, event_name, *args, **kwargs)
+
+
+commands.Bot.invoke = invoke
+commands.Bot._run_event = run_event
+
+
 from modules.base.admin.database import BaseAdminModule
 
 
@@ -256,7 +292,12 @@ async def load_modules():
             command.ignore_extra = False
 
 
+from pie.database import invalidation
+
+
 async def main():
+    # Receive changes of cached data made by other processes
+    invalidation.start()
     await load_modules()
     await bot.start(os.getenv("TOKEN"))
 
@@ -1,11 +1,19 @@
+import asyncio
 import git
+import os
 import pytest
 import tempfile
+import time
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Union
 
-from pie.exceptions import RepositoryMetadataError
-from pie.repository import Repository
+from pie.exceptions import DotEnvException, RepositoryMetadataError
+from pie.repository import Repository, RepositoryManager, get_clone_options
+from pie.spamchannel import get_limits
+from pie.spamchannel.database import SpamLimit
+
+from modules.base.admin import module as admin_module
 
 
 def _create_repo(path: str):
@@ -52,6 +60,14 @@ def _update_requirements(path: Path, *, lines: list):
         handle.write("\n".join(lines))
 
 
+def _commit(path: Path, message: str):
+    """Commit all files in the directory."""
+    repo = git.repo.base.Repo(str(path))
+    repo.git.add(A=True)
+    actor = git.Actor("pumpkin", "pumpkin@example.com")
+    repo.index.commit(message, author=actor, committer=actor)
+
+
 @pytest.mark.skip
 def test_module_download():
     """Valid repo clone"""
@@ -153,3 +169,257 @@ def test_module_check_failures():
     )
 
     tempdir.cleanup()
+
+
+def test_update_all():
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+
+    # two repositories cloned from their upstreams
+    repositories = []
+    for name in ("first", "second"):
+        upstream = temppath / f"{name}-upstream"
+        git.repo.base.Repo.init(path=str(upstream))
+        _update_init(upstream, name=name)
+        _commit(upstream, "Initial commit")
+        git.repo.base.Repo.clone_from(str(upstream), str(temppath / name))
+        repositories.append(Repository(temppath / name))
+
+    _update_requirements(temppath / "second-upstream", lines=["requests"])
+    _commit(temppath / "second-upstream", "Add requirements")
+
+    manager = RepositoryManager()
+    original = manager.repositories
+    manager.repositories = repositories
+
+    async def update():
+        return [result async for result in manager.update_all()]
+
+    try:
+        results = {
+            repository.name: (success, output)
+            for repository, success, output in asyncio.run(update())
+        }
+    finally:
+        manager.repositories = original
+        tempdir.cleanup()
+
+    assert results["first"] == (True, "Already up to date.")
+    assert results["second"][0]
+    assert "requirements.txt" in results["second"][1]
+
+
+def test_requirements_hash():
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+    _update_init(temppath)
+    repository = Repository(temppath)
+
+    try:
+        assert repository.requirements_txt_hash is None
+        assert repository.requirements_hash is None
+
+        _update_requirements(temppath, lines=["requests", "emoji"])
+        txt_hash = repository.requirements_txt_hash
+        requirements_hash = repository.requirements_hash
+
+        _update_requirements(
+            temppath, lines=["# dependencies", "emoji  # for reactions", "requests"]
+        )
+        assert repository.requirements_txt_hash != txt_hash
+        assert repository.requirements_hash == requirements_hash
+
+        _update_requirements(temppath, lines=["requests", "emoji", "lxml"])
+        assert repository.requirements_hash != requirements_hash
+
+        # changes of included files are detected as well
+        (temppath / "constraints.txt").write_text("emoji==2.8.0")
+        _update_requirements(temppath, lines=["requests", "-c constraints.txt"])
+        requirements_hash = repository.requirements_hash
+        (temppath / "constraints.txt").write_text("emoji==2.9.0")
+        assert repository.requirements_hash != requirements_hash
+    finally:
+        tempdir.cleanup()
+
+
+def test_requirements_pinned(monkeypatch):
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+    monkeypatch.setenv("REPOSITORY_WHEEL_CACHE", str(temppath / "wheels"))
+    _update_init(temppath)
+    repository = Repository(temppath)
+
+    try:
+        _update_requirements(temppath, lines=["emoji==2.8.0", "-r extra.txt"])
+        (temppath / "extra.txt").write_text("requests == 2.31.0 ; python_version>'3'")
+        assert repository.requirements_pinned
+
+        for requirement in ("requests", "requests>=2.0", "requests==2.*"):
+            (temppath / "extra.txt").write_text(requirement)
+            assert not repository.requirements_pinned
+
+        # unpinned requirements are installed again after a day
+        marker = temppath / "wheels" / "installed" / "test.sha256"
+        marker.parent.mkdir(parents=True)
+        marker.write_text(repository.requirements_hash)
+        assert repository._requirements_installed(repository.requirements_hash, False)
+        day_ago = time.time() - 24 * 3600
+        os.utime(marker, (day_ago, day_ago))
+        assert repository._requirements_installed(repository.requirements_hash, True)
+        assert not repository._requirements_installed(
+            repository.requirements_hash, False
+        )
+    finally:
+        tempdir.cleanup()
+
+
+def test_install_requirements_unchanged(monkeypatch):
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+    monkeypatch.setenv("REPOSITORY_WHEEL_CACHE", str(temppath / "wheels"))
+    (temppath / "repository").mkdir()
+    _update_init(temppath / "repository")
+    _update_requirements(temppath / "repository", lines=["requests"])
+    repository = Repository(temppath / "repository")
+
+    marker = temppath / "wheels" / "installed" / "test.sha256"
+    marker.parent.mkdir(parents=True)
+    marker.write_text(repository.requirements_hash)
+
+    try:
+        # pip is not run at all
+        assert asyncio.run(repository.install_requirements()) is None
+    finally:
+        tempdir.cleanup()
+
+
+def test_shallow_clone():
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+
+    upstream = temppath / "upstream"
+    git.repo.base.Repo.init(path=str(upstream), initial_branch="main")
+    _update_init(upstream)
+    _commit(upstream, "Initial commit")
+    _update_requirements(upstream, lines=["requests"])
+    _commit(upstream, "Add requirements")
+    upstream_repo = git.repo.base.Repo(str(upstream))
+    upstream_repo.git.checkout("-b", "develop")
+    _update_requirements(upstream, lines=["requests", "emoji"])
+    _commit(upstream, "Add emoji")
+    upstream_repo.git.checkout("main")
+
+    clone = temppath / "clone"
+    try:
+        # shallow clones need 'file://', plain paths are copied
+        assert Repository.git_clone(clone, upstream.as_uri(), depth=1) is None
+        clone_repo = git.repo.base.Repo(str(clone))
+        assert (Path(clone_repo.git_dir) / "shallow").is_file()
+        assert len(list(clone_repo.iter_commits())) == 1
+        assert "origin/develop" not in [r.name for r in clone_repo.remotes.origin.refs]
+
+        repository = Repository(clone)
+        repository.change_branch("develop")
+        assert clone_repo.active_branch.name == "develop"
+        assert (clone / "requirements.txt").read_text() == "requests\nemoji"
+
+        _update_init(upstream, name="renamed")
+        upstream_repo.git.checkout("develop")
+        _commit(upstream, "Rename")
+        repository.git_pull()
+        assert Repository(clone).name == "renamed"
+
+        # unreachable remote is reported, not hidden by fetching the history
+        clone_repo.git.remote("set-url", "origin", (temppath / "missing").as_uri())
+        with pytest.raises(git.exc.GitCommandError):
+            repository.git_pull()
+        assert (Path(clone_repo.git_dir) / "shallow").is_file()
+    finally:
+        tempdir.cleanup()
+
+
+def test_clone_options(monkeypatch):
+    monkeypatch.delenv("REPOSITORY_CLONE_DEPTH", raising=False)
+    monkeypatch.delenv("REPOSITORY_CLONE_BLOBLESS", raising=False)
+    assert get_clone_options() == (1, False)
+
+    monkeypatch.setenv("REPOSITORY_CLONE_DEPTH", "0")
+    monkeypatch.setenv("REPOSITORY_CLONE_BLOBLESS", "yes")
+    assert get_clone_options() == (0, True)
+
+    for value in ("one", "-1"):
+        monkeypatch.setenv("REPOSITORY_CLONE_DEPTH", value)
+        with pytest.raises(DotEnvException):
+            get_clone_options()
+
+    monkeypatch.setenv("REPOSITORY_CLONE_DEPTH", "1")
+    monkeypatch.setenv("REPOSITORY_CLONE_BLOBLESS", "maybe")
+    with pytest.raises(DotEnvException):
+        get_clone_options()
+
+
+def test_repository_snapshot():
+    tempdir = tempfile.TemporaryDirectory()
+    temppath = Path(tempdir.name)
+    git.repo.base.Repo.init(path=str(temppath), initial_branch="main")
+    _update_init(temppath)
+    _commit(temppath, "Initial commit")
+    repository = Repository(temppath)
+
+    manager = RepositoryManager()
+    try:
+        snapshot = manager.get_snapshot(repository)
+        assert snapshot.name == "test"
+        assert snapshot.module_names == ("test",)
+        assert snapshot.branch == "main"
+        assert snapshot.summary == "Initial commit"
+        # nothing changed, git is not asked again
+        assert manager.get_snapshot(repository) is snapshot
+
+        _update_requirements(temppath, lines=["requests"])
+        _commit(temppath, "Add requirements")
+        updated = manager.get_snapshot(repository)
+        assert updated is not snapshot
+        assert updated.summary == "Add requirements"
+        assert updated.head_sha == str(git.repo.base.Repo(tempdir.name).head.commit)
+
+        git.repo.base.Repo(tempdir.name).git.checkout("-b", "develop")
+        assert manager.get_snapshot(repository).branch == "develop"
+    finally:
+        manager._snapshots.pop(repository.path, None)
+        tempdir.cleanup()
+
+
+def test_spamchannel_limit_unset(monkeypatch):
+    replies = []
+    logs = []
+
+    async def reply(text: str):
+        replies.append(text)
+
+    async def info(actor, source, message: str):
+        logs.append(message)
+
+    monkeypatch.setattr(admin_module, "guild_log", SimpleNamespace(info=info))
+    ctx = SimpleNamespace(
+        guild=SimpleNamespace(id=43),
+        author=SimpleNamespace(id=1),
+        channel=SimpleNamespace(id=2),
+        reply=reply,
+    )
+    unset = admin_module.Admin.spamchannel_limit_unset.callback
+    assert admin_module.Admin.spamchannel_limit_unset.qualified_name == (
+        "spamchannel limit unset"
+    )
+
+    default = get_limits(43)
+    SpamLimit.set(43, default[0] + 1, default[1])
+    asyncio.run(unset(None, ctx))
+    assert get_limits(43) == default
+    assert SpamLimit.get(43) is None
+    assert len(logs) == 1
+
+    # nothing to remove
+    asyncio.run(unset(None, ctx))
+    assert len(replies) == 2
+    assert len(logs) == 1
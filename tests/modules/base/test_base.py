@@ -0,0 +1,214 @@
+import asyncio
+from types import SimpleNamespace
+
+from pie import cache
+
+from modules.base.base.database import AutoThread, Bookmark, UserPin, UserThread
+from modules.base.base import module as base_module
+from modules.base.base.module import GuildSettings, ReactionCounter, ThreadQueue
+
+
+def _message(idx: int, **reactions: int):
+    emojis = {"pin": "📌", "thread": "🧵", "bookmark": "🔖"}
+    return SimpleNamespace(
+        id=idx,
+        reactions=[
+            SimpleNamespace(emoji=emojis[name], count=count)
+            for name, count in reactions.items()
+        ],
+    )
+
+
+def test_reaction_counter_seed():
+    counter = ReactionCounter(("📌", "🧵"), maxsize=10, ttl=60)
+    assert counter.add(1, "📌") is None
+
+    assert counter.seed(_message(1, pin=3, bookmark=2)) == {"📌": 3}
+    # seeding again must not overwrite counts kept by the events
+    assert counter.add(1, "📌") == 4
+    assert counter.seed(_message(1, pin=1)) == {"📌": 4}
+
+
+def test_reaction_counter_events():
+    counter = ReactionCounter(("📌", "🧵"), maxsize=10, ttl=60)
+    counter.seed(_message(1, pin=2))
+
+    assert counter.add(1, "🧵") == 1
+    counter.remove(1, "📌")
+    counter.remove(1, "📌")
+    counter.remove(1, "📌")
+    assert counter.add(1, "📌") == 1
+
+    counter.reset(1, "📌")
+    assert counter.add(1, "📌") == 1
+    counter.reset(1)
+    assert counter.add(1, "🧵") == 1
+
+    counter.forget(1)
+    assert counter.add(1, "📌") is None
+
+
+def test_reaction_counter_refresh():
+    counter = ReactionCounter(("📌", "🧵"), maxsize=10, ttl=60)
+    message = _message(1, pin=2)
+    assert counter.seed(message) == {"📌": 2}
+    # raw event of the second reaction arrives after the seed
+    assert counter.add(1, "📌") == 3
+
+    assert counter.refresh(message) == {"📌": 2}
+    assert counter.add(1, "📌") == 3
+
+
+def test_userpin_counts_seeded_reaction_once(monkeypatch):
+    pinned = []
+
+    async def pin():
+        pinned.append(True)
+
+    async def log(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(
+        base_module, "guild_log", SimpleNamespace(debug=log, info=log, error=log)
+    )
+    message = _message(1, pin=2)
+    message.pinned = False
+    message.pin = pin
+
+    async def get_message(payload, emoji):
+        return message
+
+    cog = object.__new__(base_module.Base)
+    cog.reactions = ReactionCounter(("📌", "🧵"), maxsize=10, ttl=60)
+    cog._get_settings = lambda guild_id: SimpleNamespace(
+        get_userpin_limit=lambda channel_id: 3
+    )
+    cog._get_message = get_message
+    payload = SimpleNamespace(guild_id=1, channel_id=10, message_id=1)
+
+    async def run():
+        # the first event seeds the counts with both reactions
+        await cog._userpin(payload, "📌")
+        # the event of the second reaction must not reach the limit
+        await cog._userpin(payload, "📌")
+
+    asyncio.run(run())
+    assert pinned == []
+
+
+def test_autothread_channels_invalidation():
+    channels = cache.Cache("test.autothread", tables=(AutoThread.__tablename__,))
+
+    def get(guild_id: int):
+        return channels.get_or_load(
+            guild_id,
+            lambda: AutoThread.get_channels(guild_id),
+            tags=(str(guild_id),),
+        )
+
+    assert get(1) == {}
+    AutoThread.add(1, 10, 60)
+    assert get(1) == {10: 60}
+    AutoThread.add(1, 10, 1440)
+    assert get(1) == {10: 1440}
+    AutoThread.remove(1, 10)
+    assert get(1) == {}
+
+
+def test_guild_settings():
+    UserPin.add(2, None, 5)
+    UserPin.add(2, 20, 3)
+    UserPin.add(2, 21, -1)
+    UserThread.add(2, 20, 4)
+    Bookmark.add(2, None, True)
+    Bookmark.add(2, 20, False)
+
+    settings = GuildSettings(2)
+    assert settings.get_userpin_limit(20) == 3
+    assert settings.get_userpin_limit(21) == 5
+    assert settings.get_userpin_limit(22) == 5
+    assert settings.get_userthread_limit(20) == 4
+    assert settings.get_userthread_limit(21) == 0
+    assert settings.get_bookmarks_enabled(20) is False
+    assert settings.get_bookmarks_enabled(21) is True
+
+    UserPin.add(2, 20, 7)
+    UserPin.remove(2, None)
+    settings = GuildSettings(2)
+    assert settings.get_userpin_limit(20) == 7
+    assert settings.get_userpin_limit(22) == 0
+
+
+def _channel_message(idx: int, channel_id: int, author_id: int):
+    return SimpleNamespace(
+        id=idx,
+        channel=SimpleNamespace(id=channel_id),
+        author=SimpleNamespace(id=author_id),
+    )
+
+
+def test_thread_queue():
+    created = []
+
+    async def create(message):
+        await asyncio.sleep(0.01)
+        created.append(message.id)
+
+    async def report(message, exc):
+        pass
+
+    async def run():
+        queue = ThreadQueue(create, report, maxsize=2, merge_window=60)
+        queue.put(_channel_message(1, 10, 100))
+        # merged with the previous message of the same author
+        queue.put(_channel_message(2, 10, 100))
+        queue.put(_channel_message(3, 10, 101))
+        # the channel is full, its oldest message is skipped
+        queue.put(_channel_message(4, 10, 102))
+        queue.put(_channel_message(5, 11, 100))
+        assert queue.get_statistics()["waiting"] == 3
+
+        await asyncio.sleep(0.1)
+        return queue
+
+    queue = asyncio.run(run())
+    assert sorted(created) == [3, 4, 5]
+    statistics = queue.get_statistics()
+    assert statistics["merged"] == 1
+    assert statistics["skipped"] == 1
+    assert statistics["created"] == 3
+    assert statistics["waiting"] == 0
+    assert statistics["lag"] == 0.0
+
+
+def test_thread_queue_error(monkeypatch):
+    created = []
+    errors = []
+
+    async def error(actor, source, message: str, *, exception=None):
+        errors.append(exception)
+
+    monkeypatch.setattr(base_module, "bot_log", SimpleNamespace(error=error))
+
+    async def create(message):
+        if message.id == 1:
+            raise TypeError("unexpected")
+        created.append(message.id)
+
+    async def report(message, exc):
+        pass
+
+    async def run():
+        queue = ThreadQueue(create, report, maxsize=2, merge_window=60)
+        queue.put(_channel_message(1, 10, 100))
+        queue.put(_channel_message(2, 10, 101))
+        await asyncio.sleep(0.1)
+        return queue
+
+    queue = asyncio.run(run())
+    # the worker keeps running after the error
+    assert created == [2]
+    statistics = queue.get_statistics()
+    assert statistics["failed"] == 1
+    assert statistics["created"] == 1
+    assert [type(exc) for exc in errors] == [TypeError]
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+from pie import cache
+
+
+def test_cache_lru():
+    c = cache.Cache("test.lru", maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)
+
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.statistics.evictions == 1
+
+
+def test_cache_none_value():
+    c = cache.Cache("test.none")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert c.get_or_load("a", loader) is None
+    assert c.get_or_load("a", loader) is None
+    assert len(calls) == 1
+
+
+def test_cache_ttl():
+    c = cache.Cache("test.ttl", ttl=60)
+    c.set("a", 1)
+    c.set("b", 2, ttl=0.01)
+    time.sleep(0.02)
+
+    assert c.get("a") == 1
+    assert c.get("b") is None
+    assert c.statistics.expirations == 1
+
+
+def test_cache_tags():
+    c = cache.Cache("test.tags")
+    c.set("a", 1, tags=("1",))
+    c.set("b", 2, tags=("1", "2"))
+    c.set("c", 3, tags=("2",))
+
+    assert c.invalidate_tag(1) == 2
+    assert c.get("a") is None
+    assert c.get("b") is None
+    assert c.get("c") == 3
+    assert c.invalidate_tag("1") == 0
+
+
+def test_cache_registry():
+    first = cache.Cache("test.registry")
+    second = cache.Cache("test.registry")
+    assert cache.get("test.registry") is second
+    assert first is not second
+
+
+def test_cache_async_single_flight():
+    c = cache.Cache("test.async")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*[c.aget_or_load("a", loader) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert c.get("a") == "value"
+
+
+def test_cache_async_loader_error():
+    c = cache.Cache("test.async_error")
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def run():
+        return await asyncio.gather(
+            *[c.aget_or_load("a", loader) for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert c.get("a") is None
+
+    with pytest.raises(ValueError):
+        asyncio.run(c.aget_or_load("a", loader))
+
+
+def test_cache_tables():
+    from pie.database import invalidation
+
+    c = cache.Cache("test.tables", tables=("test_cache_table",))
+    c.set("a", 1, tags=("1",))
+    c.set("b", 2, tags=("2",))
+
+    invalidation._deliver("test_cache_table", "1")
+    assert c.get("a") is None
+    assert c.get("b") == 2
+
+    invalidation._deliver("test_cache_table", None)
+    assert len(c) == 0
+
+
+def test_cache_tables_load_from_primary():
+    from pie.database import routing
+
+    c = cache.Cache("test.tables.primary", tables=("test_cache_table",))
+    assert c.get_or_load("a", routing._primary.get) is True
+
+    c = cache.Cache("test.primary")
+    assert c.get_or_load("a", routing._primary.get) is False
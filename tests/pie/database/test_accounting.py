@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from pie.database import accounting
+from pie.exceptions import DotEnvException
+
+
+def test_unnamed_tasks():
+    async def origin():
+        return accounting._get_origin()
+
+    async def run():
+        return [
+            await asyncio.create_task(origin()),
+            await asyncio.create_task(origin()),
+            await asyncio.create_task(origin(), name="Reminder"),
+        ]
+
+    assert asyncio.run(run()) == ["task", "task", "task:Reminder"]
+
+
+def test_failed_statement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+    accounting.install(engine)
+
+    with engine.connect() as connection:
+        with accounting.track("test:failed") as invocation:
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+            connection.execute(text("SELECT 1"))
+        assert "pie_query_start" not in connection.info
+    assert invocation.queries == 1
+    engine.dispose()
+
+
+def test_slow_query_threshold(monkeypatch):
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "50")
+    assert accounting._get_slow_query_threshold() == 0.05
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "fast")
+    with pytest.raises(DotEnvException):
+        accounting._get_slow_query_threshold()
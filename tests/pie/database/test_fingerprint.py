@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table
+from sqlalchemy.dialects import sqlite
+
+from pie.database import fingerprint
+
+
+def _get_metadata(*, nullable: bool = True, index: bool = False) -> MetaData:
+    metadata = MetaData()
+    table = Table(
+        "test_fingerprint",
+        metadata,
+        Column("idx", Integer, primary_key=True),
+        Column("name", String, nullable=nullable),
+    )
+    if index:
+        Index("ix_test_fingerprint_name", table.c.name)
+    return metadata
+
+
+def test_fingerprint_is_stable():
+    dialect = sqlite.dialect()
+    assert fingerprint.get_fingerprint(
+        _get_metadata(), dialect
+    ) == fingerprint.get_fingerprint(_get_metadata(), dialect)
+
+
+def test_fingerprint_detects_changes():
+    dialect = sqlite.dialect()
+    original = fingerprint.get_fingerprint(_get_metadata(), dialect)
+    assert original != fingerprint.get_fingerprint(
+        _get_metadata(nullable=False), dialect
+    )
+    assert original != fingerprint.get_fingerprint(_get_metadata(index=True), dialect)
+    assert original != fingerprint.get_fingerprint(MetaData(), dialect)
@@ -0,0 +1,51 @@
+import pytest
+
+from pie.database import database, session
+from pie.database import invalidation
+
+
+@pytest.fixture
+def received():
+    received = []
+
+    def subscriber(table, key):
+        received.append((table, key))
+
+    invalidation.subscribe("test_invalidation", subscriber)
+    yield received
+    invalidation.unsubscribe("test_invalidation", subscriber)
+
+
+def test_publish_is_delivered_after_commit(received):
+    invalidation.publish("test_invalidation", 1)
+    assert received == []
+
+    session.commit()
+    assert received == [("test_invalidation", "1")]
+
+
+def test_publish_is_dropped_on_rollback(received):
+    invalidation.publish("test_invalidation", 1)
+    session.rollback()
+    session.commit()
+    assert received == []
+
+
+def test_poller_skips_own_changes(received):
+    poller = invalidation._ChangePoller(interval=1, retention=3600)
+    poller.start()
+
+    invalidation.publish("test_invalidation", 1)
+    session.commit()
+    with database.db.begin() as connection:
+        connection.execute(
+            invalidation.Change.__table__.insert().values(
+                origin="other", table="test_invalidation", key="2"
+            )
+        )
+    received.clear()
+
+    poller.poll()
+    assert received == [("test_invalidation", "2")]
+    poller.poll()
+    assert received == [("test_invalidation", "2")]
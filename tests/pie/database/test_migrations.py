@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import Column, Index, Integer, MetaData, Table, create_engine, inspect
+
+from pie.database import migrations
+
+
+@pytest.fixture(autouse=True)
+def forget_test_migrations():
+    yield
+    for scope in [s for s in migrations._migrations.keys() if s.startswith("test.")]:
+        del migrations._migrations[scope]
+
+
+@pytest.mark.parametrize(
+    "module_name,scope",
+    [
+        ("pie.acl.database", "pie.acl"),
+        ("modules.base.base.database", "base.base"),
+        ("modules.fun.fun.database", "fun.fun"),
+    ],
+)
+def test_get_scope(module_name: str, scope: str):
+    assert migrations._get_scope(module_name) == scope
+
+
+def test_get_pending():
+    def first(connection):
+        pass
+
+    def second(connection):
+        pass
+
+    migrations.migration(1, scope="test.pending")(first)
+    migrations.migration(2, scope="test.pending")(second)
+
+    assert [m.function for m in migrations._get_pending("test.pending", 0)] == [
+        first,
+        second,
+    ]
+    assert [m.function for m in migrations._get_pending("test.pending", 1)] == [second]
+    assert migrations._get_pending("test.pending", 2) == []
+
+
+def test_get_pending__gap():
+    migrations.migration(1, scope="test.gap")(lambda connection: None)
+    migrations.migration(3, scope="test.gap")(lambda connection: None)
+
+    with pytest.raises(ValueError):
+        migrations._get_pending("test.gap", 0)
+
+
+def test_migration__duplicate_version():
+    migrations.migration(1, scope="test.duplicate")(lambda connection: None)
+
+    with pytest.raises(ValueError):
+        migrations.migration(1, scope="test.duplicate")(lambda connection: None)
+
+
+def test_create_indexes__removes_duplicates():
+    engine = create_engine("sqlite://", future=True)
+    metadata = MetaData()
+    table = Table(
+        "test_migrations",
+        metadata,
+        Column("idx", Integer, primary_key=True),
+        Column("guild_id", Integer),
+        Column("channel_id", Integer),
+    )
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            table.insert(),
+            [
+                {"idx": 1, "guild_id": 1, "channel_id": 1},
+                {"idx": 2, "guild_id": 1, "channel_id": 1},
+                {"idx": 3, "guild_id": 1, "channel_id": 2},
+            ],
+        )
+
+    Index(
+        "ix_test_migrations_guild_channel",
+        table.c.guild_id,
+        table.c.channel_id,
+        unique=True,
+    )
+    with engine.begin() as connection:
+        migrations.create_indexes(connection, table)
+        # Second run must not fail on existing index
+        migrations.create_indexes(connection, table)
+        rows = connection.execute(table.select().order_by(table.c.idx)).all()
+
+    assert [row.idx for row in rows] == [1, 3]
+    assert [i["name"] for i in inspect(engine).get_indexes("test_migrations")] == [
+        "ix_test_migrations_guild_channel"
+    ]
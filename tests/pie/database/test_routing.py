@@ -0,0 +1,124 @@
+from typing import Optional
+
+import pytest
+from sqlalchemy import Column, Integer, create_engine, select
+from sqlalchemy.orm import declarative_base
+
+from pie.database.routing import RoutingSession, primary, read_only
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "test_routing_items"
+
+    idx = Column(Integer, primary_key=True)
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path}/primary.db", future=True)
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db", future=True)
+    Base.metadata.create_all(primary)
+    Base.metadata.create_all(replica)
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+def _make_session(engines, stickiness: float) -> RoutingSession:
+    primary, replica = engines
+    return RoutingSession(bind=primary, replica=replica, stickiness=stickiness)
+
+
+def _get(session: RoutingSession, idx: int) -> Optional[Item]:
+    return session.execute(select(Item).where(Item.idx == idx)).scalar_one_or_none()
+
+
+@read_only
+def _get_read_only(session: RoutingSession, idx: int) -> Optional[Item]:
+    return _get(session, idx)
+
+
+def test_reads_without_decorator_use_primary(engines):
+    session = _make_session(engines, stickiness=0)
+    session.add(Item(idx=1))
+    session.commit()
+    session.expunge_all()
+
+    assert _get(session, 1) is not None
+    assert session.get_routing_statistics() == {"replica": 0, "primary": 0}
+
+
+def test_read_only_uses_replica(engines):
+    session = _make_session(engines, stickiness=0)
+    session.add(Item(idx=1))
+    session.commit()
+    session.expunge_all()
+
+    # The row only exists in the primary database
+    assert _get_read_only(session, 1) is None
+    assert session.get_routing_statistics() == {"replica": 1, "primary": 0}
+
+
+def test_read_only_sticks_to_primary_after_write(engines):
+    session = _make_session(engines, stickiness=60)
+    session.add(Item(idx=1))
+    session.commit()
+    session.expunge_all()
+
+    assert _get_read_only(session, 1) is not None
+    assert session.get_routing_statistics() == {"replica": 0, "primary": 1}
+
+
+def test_read_only_uses_primary_with_pending_write(engines):
+    session = _make_session(engines, stickiness=0)
+    session.add(Item(idx=1))
+    session.flush()
+
+    assert _get_read_only(session, 1) is not None
+    session.rollback()
+
+    assert _get_read_only(session, 1) is None
+
+
+def test_no_replica():
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    session = RoutingSession(bind=engine)
+    session.add(Item(idx=1))
+    session.commit()
+
+    assert _get_read_only(session, 1) is not None
+    assert session.get_routing_statistics() == {}
+
+
+def test_primary_overrides_read_only(engines):
+    session = _make_session(engines, stickiness=0)
+    session.add(Item(idx=1))
+    session.commit()
+    session.expunge_all()
+
+    with primary():
+        assert _get_read_only(session, 1) is not None
+    assert session.get_routing_statistics() == {"replica": 0, "primary": 1}
+
+
+def test_write_methods_read_primary(tmp_path, monkeypatch):
+    from pie.acl.database import ACDefault, ACLevel
+    from pie.database import database, session
+
+    # Empty replica, as if it did not receive the rows yet
+    replica = create_engine(f"sqlite:///{tmp_path}/lagging.db", future=True)
+    database.base.metadata.create_all(replica)
+    monkeypatch.setattr(session, "replica", replica)
+    monkeypatch.setattr(session, "stickiness", 0)
+
+    try:
+        assert ACDefault.add(7, "test routing", ACLevel.MOD) is not None
+        # The existing row is found instead of failing on the unique index
+        assert ACDefault.add(7, "test routing", ACLevel.MOD) is None
+        assert session.get_routing_statistics()["primary"] >= 2
+    finally:
+        ACDefault.remove(7, "test routing")
+        replica.dispose()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from pie.database import sqlite
+
+
+def test_is_write():
+    assert sqlite._is_write("INSERT INTO a VALUES (1)")
+    assert sqlite._is_write("\n  update a SET b = 1")
+    assert sqlite._is_write("DELETE FROM a")
+    assert not sqlite._is_write("SELECT * FROM a")
+    assert not sqlite._is_write("PRAGMA journal_mode")
+
+
+def test_writer_queue_same_connection():
+    queue = sqlite.WriterQueue(timeout=0.1)
+    connection = object()
+    assert queue.acquire(connection) is True
+    # Further writes of the transaction already hold the lock
+    assert queue.acquire(connection) is False
+    # Other connections cannot release it
+    queue.release(object())
+    assert queue._owner is connection
+    queue.release(connection)
+    assert queue.get_statistics() == {
+        "writes": 1,
+        "waits": 0,
+        "wait_time": 0.0,
+        "skipped": 0,
+    }
+
+
+def test_writer_queue_other_thread():
+    queue = sqlite.WriterQueue(timeout=5)
+    connection = object()
+    queue.acquire(connection)
+    results = []
+
+    def write():
+        other = object()
+        results.append(queue.acquire(other))
+        queue.release(other)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join(0.05)
+    assert results == []
+
+    queue.release(connection)
+    thread.join()
+    assert results == [True]
+    assert queue.writes == 2
+    assert queue.waits == 1
+
+
+def test_writer_queue_event_loop():
+    queue = sqlite.WriterQueue(timeout=5)
+    connection = object()
+    queue.acquire(connection)
+
+    async def write():
+        start = time.monotonic()
+        result = queue.acquire(object())
+        return result, time.monotonic() - start
+
+    # The event loop must not wait for the lock
+    result, waited = asyncio.run(write())
+    assert result is False
+    assert waited < 1
+    assert queue.skipped == 1
+    queue.release(connection)
+
+
+def test_writer_queue_timeout():
+    queue = sqlite.WriterQueue(timeout=0.01)
+    connection = object()
+    queue.acquire(connection)
+    results = []
+
+    thread = threading.Thread(target=lambda: results.append(queue.acquire(object())))
+    thread.start()
+    thread.join()
+    assert results == [False]
+    queue.release(connection)
+
+
+def test_release_on_invalidate(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+    queue = sqlite.install(engine, {}, timeout=0.1)
+
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE a (b INTEGER)"))
+        assert queue._owner is not None
+        connection.invalidate()
+    assert queue._owner is None
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO a VALUES (1)"))
+    # Returned to the pool
+    assert queue._owner is None
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+from pie import events
+
+
+def _message(channel_id: int, content: str):
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id), content=content)
+
+
+def _reaction(channel_id: int, emoji: str):
+    return SimpleNamespace(channel_id=channel_id, emoji=SimpleNamespace(name=emoji))
+
+
+def test_message_routing():
+    received: List[str] = []
+
+    def handler(name: str):
+        async def handle(event):
+            received.append(name)
+
+        return handle
+
+    channel = events.subscribe_message(
+        "test.channel", handler("channel"), channels=(1,)
+    )
+    prefix = events.subscribe_message(
+        "test.prefix", handler("prefix"), prefixes=("!remind", "?remind")
+    )
+    both = events.subscribe_message(
+        "test.both", handler("both"), channels=(2,), prefixes=("!",)
+    )
+
+    async def run():
+        router = events._router
+        await router.on_message(_message(1, "hello"))
+        await router.on_message(_message(2, "!remind me"))
+        await router.on_message(_message(2, "hello"))
+        await router.on_message(_message(3, "?remind me"))
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert sorted(received) == ["both", "channel", "prefix", "prefix"]
+    statistics = events.get_statistics()
+    assert statistics["test.channel"] == 1
+    assert statistics["test.prefix"] == 2
+    assert statistics["test.both"] == 1
+
+    channel.set_channels((3,))
+    received.clear()
+    asyncio.run(events._router.on_message(_message(1, "hello")))
+    assert received == []
+
+    for subscription in (channel, prefix, both):
+        events.unsubscribe(subscription)
+    assert "test.channel" not in events.get_statistics()
+
+
+def test_reaction_routing():
+    received: List[str] = []
+
+    async def handle(payload):
+        received.append(payload.emoji.name)
+
+    subscription = events.subscribe_reaction("test.reaction", handle, emojis=("📌",))
+
+    async def run():
+        await events._router.on_raw_reaction_add(_reaction(1, "📌"))
+        await events._router.on_raw_reaction_add(_reaction(1, "🔖"))
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert received == ["📌"]
+
+    events.unsubscribe(subscription)
+    asyncio.run(events._router.on_raw_reaction_add(_reaction(1, "📌")))
+    assert received == ["📌"]
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+import pytest
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+import pie.ratelimit
+from pie.exceptions import RateLimitExceeded
+from pie.ratelimit import Limit, Limiter, Scope, TokenBucket
+from pie.ratelimit.database import RateLimit
+
+
+def test_token_bucket():
+    bucket = TokenBucket(2, 10, now=0)
+
+    assert bucket.consume(0) == 0
+    assert bucket.consume(0) == 0
+    assert bucket.consume(0) == pytest.approx(5)
+    # one token is refilled every five seconds
+    assert bucket.consume(5) == 0
+    assert bucket.consume(6) == pytest.approx(4)
+
+    assert not bucket.is_idle(15)
+    assert bucket.is_idle(16)
+
+
+def test_limiter_scopes():
+    limiter = Limiter()
+    limit = Limit(Scope.USER, 1, 60)
+
+    assert limiter.hit("meme", limit, 1, now=0) == 0
+    assert limiter.hit("meme", limit, 1, now=0) > 0
+    assert limiter.hit("meme", limit, 2, now=0) == 0
+    assert limiter.hit("fish", limit, 1, now=0) == 0
+
+    assert limiter.get_statistics()["hits"] == 4
+    assert limiter.get_statistics()["limited"] == 1
+    assert limiter.limited == {"meme": 1}
+
+
+def test_limiter_changed_limit():
+    limiter = Limiter()
+
+    assert limiter.hit("meme", Limit(Scope.USER, 1, 60), 1, now=0) == 0
+    assert limiter.hit("meme", Limit(Scope.USER, 1, 60), 1, now=0) > 0
+    # the bucket is replaced when the guild changes the limit
+    assert limiter.hit("meme", Limit(Scope.USER, 2, 60), 1, now=0) == 0
+
+
+def test_limiter_bounded():
+    limiter = Limiter(maxsize=2)
+    limit = Limit(Scope.USER, 1, 60)
+
+    for user_id in (1, 2, 3):
+        limiter.hit("meme", limit, user_id, now=0)
+
+    assert len(limiter) == 2
+    assert ("meme", "user", 1) not in limiter.buckets
+    assert limiter.get_statistics()["evictions"] == 1
+
+
+def test_limiter_idle():
+    limiter = Limiter(sweep_interval=0)
+    now = time.monotonic()
+    limiter.hit("meme", Limit(Scope.USER, 1, 10), 1, now=now)
+    limiter.hit("meme", Limit(Scope.USER, 1, 60), 2, now=now)
+    limiter.hit("meme", Limit(Scope.USER, 1, 60), 3, now=now + 20)
+
+    assert list(limiter.buckets.keys()) == [("meme", "user", 2), ("meme", "user", 3)]
+    assert limiter.get_statistics()["idle"] == 1
+
+
+def test_guild_limits():
+    default = Limit(Scope.USER, 1, 60)
+
+    assert pie.ratelimit.get_limit(1, "meme", default) == default
+    RateLimit.set(1, "meme", "channel", 5, 30)
+    assert pie.ratelimit.get_limit(1, "meme", default) == Limit(Scope.CHANNEL, 5, 30)
+    assert pie.ratelimit.get_limit(2, "meme", default) == default
+    RateLimit.remove(1, "meme")
+    assert pie.ratelimit.get_limit(1, "meme", default) == default
+
+
+def _context(user_id: int, channel_id: int):
+    return SimpleNamespace(
+        invoked_with="meme",
+        bot=SimpleNamespace(owner_id=0, owner_ids=set()),
+        author=SimpleNamespace(id=user_id),
+        channel=SimpleNamespace(id=channel_id),
+        guild=SimpleNamespace(id=3),
+        command=SimpleNamespace(qualified_name="test ratelimit"),
+    )
+
+
+def test_check():
+    predicate = pie.ratelimit.ratelimit(1, 60, Scope.CHANNEL)(lambda: None)
+    predicate = predicate.__commands_checks__[0]
+
+    assert predicate(_context(1, 30))
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        predicate(_context(2, 30))
+    assert excinfo.value.scope == "channel"
+    assert 0 < excinfo.value.retry_after <= 60
+    assert predicate(_context(2, 31))
+
+
+def test_guild_limit_through_bot():
+    bot = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    pie.ratelimit.setup(bot)
+    invoked = []
+    errors = []
+
+    @bot.command(name="fish")
+    async def fish(ctx):
+        invoked.append(ctx.author.id)
+
+    @fish.error
+    async def on_error(ctx, error):
+        errors.append(error)
+
+    async def invoke(user_id: int):
+        message = SimpleNamespace(
+            content="!fish",
+            author=SimpleNamespace(id=user_id),
+            channel=SimpleNamespace(id=40),
+            guild=SimpleNamespace(id=4),
+            _state=None,
+            attachments=[],
+        )
+        ctx = commands.Context(
+            message=message,
+            bot=bot,
+            view=StringView("fish"),
+            prefix="!",
+            command=fish,
+            invoked_with="fish",
+        )
+        await bot.invoke(ctx)
+
+    async def run():
+        # the bot dispatches events, it needs the running loop
+        async with bot:
+            await invoke(1)
+            await invoke(1)
+            RateLimit.set(4, "fish", "user", 1, 60)
+            await invoke(1)
+            await invoke(1)
+            await invoke(2)
+
+    try:
+        asyncio.run(run())
+    finally:
+        RateLimit.remove(4, "fish")
+
+    # the command has no decorator, only the limit set by the guild applies
+    assert invoked == [1, 1, 1, 2]
+    assert len(errors) == 1
+    assert isinstance(errors[0], RateLimitExceeded)
+    assert errors[0].scope == "user"
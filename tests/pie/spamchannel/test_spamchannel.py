@@ -0,0 +1,108 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+
+import pie.spamchannel
+from pie.spamchannel.database import SpamChannel, SpamLimit
+
+
+def _message(channel_id: int):
+    channel = discord.TextChannel.__new__(discord.TextChannel)
+    channel.id = channel_id
+    return SimpleNamespace(channel=channel)
+
+
+def test_sliding_window():
+    manager = pie.spamchannel._SpamchannelManager()
+    message = _message(1)
+
+    for _ in range(3):
+        assert not manager.block_message(message, message_limit=3, time_limit=0.05)
+    assert manager.block_message(message, message_limit=3, time_limit=0.05)
+    # blocked commands are not counted
+    assert len(manager.windows[1].timestamps) == 3
+
+    time.sleep(0.06)
+    assert not manager.block_message(message, message_limit=3, time_limit=0.05)
+    assert len(manager.windows[1].timestamps) == 1
+
+
+def test_sweep():
+    manager = pie.spamchannel._SpamchannelManager(sweep_interval=0)
+    manager.block_message(_message(1), message_limit=3, time_limit=0.01)
+    time.sleep(0.02)
+    manager.block_message(_message(2), message_limit=3, time_limit=60)
+
+    assert list(manager.windows.keys()) == [2]
+
+
+def test_limits():
+    assert pie.spamchannel.get_limits(1) == (
+        pie.spamchannel.MESSAGE_LIMIT,
+        pie.spamchannel.TIME_LIMIT,
+    )
+    SpamLimit.set(1, 5, 60)
+    assert pie.spamchannel.get_limits(1) == (5, 60)
+    SpamLimit.remove(1)
+    assert pie.spamchannel.get_limits(1) == (
+        pie.spamchannel.MESSAGE_LIMIT,
+        pie.spamchannel.TIME_LIMIT,
+    )
+
+
+def test_channels():
+    assert pie.spamchannel.get_channels(2) == (frozenset(), None)
+
+    SpamChannel.add(2, 20)
+    SpamChannel.add(2, 21)
+    assert pie.spamchannel.get_channels(2) == (frozenset((20, 21)), 20)
+
+    SpamChannel.set_primary(2, 21)
+    assert pie.spamchannel.get_channels(2) == (frozenset((20, 21)), 21)
+
+    SpamChannel.remove(2, 21)
+    SpamChannel.remove(2, 20)
+    assert pie.spamchannel.get_channels(2) == (frozenset(), None)
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, *, content: str):
+        await asyncio.sleep(0.01)
+        self.content = content
+        self.edits += 1
+
+
+class FakeChannel:
+    def __init__(self, idx: int):
+        self.id = idx
+        self.sent = []
+
+    async def send(self, content: str):
+        await asyncio.sleep(0.01)
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+
+def test_redirect_notices():
+    notices = pie.spamchannel._RedirectNotices(window=60)
+    channel = FakeChannel(3)
+
+    async def run():
+        await asyncio.gather(
+            *[notices.send(channel, user_id, 30) for user_id in (1, 2, 3, 4, 2)]
+        )
+        await notices.send(channel, 5, 30)
+
+    asyncio.run(run())
+    assert len(channel.sent) == 1
+    message = channel.sent[0]
+    assert message.content == "<@1> <@2> <@3> <@4> <@5> 👉 <#30>"
+    # the concurrent invocations share one edit
+    assert message.edits == 2
@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import types
+from typing import List
+
+from pie import utils
+
+
+class FakeMessage:
+    def __init__(self, idx: int):
+        self.id = idx
+
+
+class FakeChannel:
+    def __init__(self):
+        self.fetched: List[int] = []
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        self.fetched.append(message_id)
+        await asyncio.sleep(0.01)
+        return FakeMessage(message_id)
+
+
+class FakeGuild:
+    def __init__(self, channel: FakeChannel):
+        self.channel = channel
+        self.threads = []
+
+    def get_channel(self, channel_id: int):
+        return self.channel if channel_id == 1 else None
+
+
+class FakeBot:
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self._connection = types.SimpleNamespace(
+            _messages=collections.deque(maxlen=3), max_messages=3
+        )
+
+    def get_guild(self, guild_id: int):
+        return self.guild
+
+    def get_user(self, user_id: int):
+        return None
+
+
+def test_get_message_coalesces_fetches():
+    channel = FakeChannel()
+    bot = FakeBot(FakeGuild(channel))
+
+    async def burst():
+        return await asyncio.gather(
+            *[utils.discord.get_message(bot, 10, 1, 1001) for _ in range(5)]
+        )
+
+    messages = asyncio.run(burst())
+    assert all(message.id == 1001 for message in messages)
+    assert channel.fetched == [1001]
+
+    # later calls are served from the short-lived cache
+    asyncio.run(utils.discord.get_message(bot, 10, 1, 1001))
+    assert channel.fetched == [1001]
+
+
+def test_get_message_does_not_cache_missing():
+    channel = FakeChannel()
+    bot = FakeBot(FakeGuild(channel))
+
+    assert asyncio.run(utils.discord.get_message(bot, 10, 2, 1002)) is None
+    bot.guild.get_channel = lambda channel_id: channel
+
+    message = asyncio.run(utils.discord.get_message(bot, 10, 2, 1002))
+    assert message.id == 1002
+    assert channel.fetched == [1002]
+
+
+def test_get_message_uses_message_store():
+    channel = FakeChannel()
+    bot = FakeBot(FakeGuild(channel))
+    stored = FakeMessage(1003)
+    bot._connection._messages.append(stored)
+
+    assert asyncio.run(utils.discord.get_message(bot, 10, 1, 1003)) is stored
+    assert channel.fetched == []
+
+
+def test_indexed_messages():
+    messages = [FakeMessage(i) for i in range(5)]
+    store = utils.discord._IndexedMessages(messages[:2], maxlen=3)
+    assert store.get(0) is messages[0]
+
+    store.append(messages[2])
+    store.append(messages[3])
+    assert store.get(0) is None
+    assert store.get(3) is messages[3]
+    assert list(store) == messages[1:4]
+
+    store.remove(messages[2])
+    assert store.get(2) is None
+    assert len(store) == 2
+
+    store.clear()
+    assert store.get(1) is None